@@ -0,0 +1,31 @@
+from double_check.cache import StatementCache
+from double_check.config import default_path
+from double_check.incremental import IncrementalReconciliation
+from double_check.pipeline import write_results
+
+
+def main():
+    columns = [27, 28, 29, 30, 32, 33]
+    names = ['dis', 'date', 'jv number', 'jv', 'credit', 'debit']
+
+    hikma_path = default_path('../data/source/hikma.csv')
+    tawrdat_path = default_path('../data/source/tawrdat.csv')
+
+    cache = StatementCache()
+    _, hikma_df = cache.load(hikma_path, columns, names)
+    _, tawrdat_df = cache.load(tawrdat_path, columns, names)
+
+    # Only rows appended since the last run, and the dates around them, are
+    # matched again; the rest of the month comes from the saved state
+    reconciliation = IncrementalReconciliation(
+        default_path('../data/state/reconciliation.npz'), ('hikma', 'tawrdat'), days_tolerance=4
+    )
+    results = reconciliation.update(hikma_df, tawrdat_df)
+
+    write_results(results, default_path('../data/cleaned/{side}_final_unmatched.csv'))
+
+    print("Updated unmatched data files have been saved.")
+
+
+if __name__ == '__main__':
+    main()
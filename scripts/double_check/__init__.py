@@ -0,0 +1,7 @@
+# Install with pip install -e . and run double_check (or python -m
+# double_check) from anywhere, or run python -m double_check from scripts/.
+# Importing the package loads neither pandas nor any statement; the
+# commands import what they need when called. The matching modules live
+# here too (double_check.pipeline, double_check.matching, ...).
+from .commands import reconcile, read_summary
+from .config import DEFAULT_CONFIG, ConfigError, load_config
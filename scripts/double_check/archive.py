@@ -0,0 +1,201 @@
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from .cache import file_digest, header_from_dict, header_to_dict
+from .config import default_path
+from .ingest import ingest
+from .matching import to_days
+from .statement import AMOUNT_COLUMNS, COLUMNS, NAMES, concat_transactions, load_statement
+
+ARCHIVE_DIR = default_path('../data/archive')
+
+# Statements archived by running this module
+SOURCE_GLOBS = [default_path('../data/source/old/*.csv'), default_path('../data/source/*.csv')]
+
+# Sentinel for missing dates in the int32 day column, and for missing JV
+# numbers in archives written when they were stored as int32
+NO_DAY = np.iinfo('int32').min
+NO_JV_NUMBER = np.iinfo('int32').min
+
+# On-disk name of each column; every file is a .npy array so it can be
+# opened with np.load(mmap_mode='r') and only the pages read are paged in
+FILE_NAMES = {'date': 'date', 'jv number': 'jv_number', 'jv': 'jv', 'dis': 'dis',
+              'credit': 'credit', 'debit': 'debit', 'balance': 'balance'}
+
+
+def period_of(header):
+    # Statements are filed under the month their period starts in
+    return header.from_date.strftime('%Y-%m')
+
+
+def _encode(df):
+    # Column files for a frame in the canonical schema: dates as int32 days,
+    # amounts as int64 cents, 'jv', 'jv number' and 'dis' as codes into a
+    # dictionary stored next to them
+    arrays, dictionaries = {}, {}
+    for column, name in FILE_NAMES.items():
+        if column not in df:
+            continue
+        values = df[column]
+        if column == 'date':
+            days = to_days(values)
+            arrays[name] = np.where(values.isna(), NO_DAY, days).astype('int32')
+        elif column in AMOUNT_COLUMNS:
+            arrays[name] = values.to_numpy(dtype='int64')
+        else:
+            values = values.astype('category')
+            codes = values.cat.codes.to_numpy()
+            arrays[name] = codes.astype('int16' if column == 'jv' else 'int32')
+            dictionaries[name] = [str(category) for category in values.cat.categories]
+    return arrays, dictionaries
+
+
+def _decode(column, values, dictionary=None):
+    values = np.asarray(values)
+    if column == 'date':
+        dates = pd.Series(values.astype('int64').astype('datetime64[D]').astype('datetime64[us]'))
+        return dates.mask(values == NO_DAY)
+    if column == 'jv number' and dictionary is None:
+        numbers = pd.Series(values.astype(str), dtype=str).mask(values == NO_JV_NUMBER)
+        return numbers.astype('category')
+    if dictionary is not None:
+        return pd.Series(pd.Categorical.from_codes(values.astype('int32'), dictionary))
+    return pd.Series(values)
+
+
+class StatementArchive:
+    # One directory per period, one sub-directory per ledger holding a .npy
+    # file per column plus meta.json; index.json lists what each period holds
+    def __init__(self, archive_dir=ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+        self.index_path = os.path.join(archive_dir, 'index.json')
+
+    def ledger_dir(self, period, ledger):
+        return os.path.join(self.archive_dir, period, ledger)
+
+    def read_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def write_index(self, index):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        partial_path = f'{self.index_path}.{os.getpid()}.partial'
+        with open(partial_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2, ensure_ascii=False)
+        os.replace(partial_path, self.index_path)
+
+    def add(self, ledger, header, df, source=None):
+        # Store one statement, replacing whatever the archive held for the
+        # same ledger and period
+        period = period_of(header)
+        arrays, dictionaries = _encode(df)
+        target = self.ledger_dir(period, ledger)
+        partial = f'{target}.{os.getpid()}.partial'
+        shutil.rmtree(partial, ignore_errors=True)
+        os.makedirs(partial)
+        for name, values in arrays.items():
+            np.save(os.path.join(partial, f'{name}.npy'), values)
+        meta = {
+            'rows': len(df),
+            'columns': [column for column in FILE_NAMES if column in df],
+            'dictionaries': dictionaries,
+            'header': header_to_dict(header),
+        }
+        with open(os.path.join(partial, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(partial, target)
+
+        index = self.read_index()
+        index.setdefault(period, {})[ledger] = {
+            'rows': len(df),
+            'from_date': header.from_date.isoformat(),
+            'to_date': header.to_date.isoformat(),
+            'source': source,
+            'digest': file_digest(source) if source else None,
+        }
+        self.write_index(dict(sorted(index.items())))
+        return period
+
+    def add_statement(self, file_path, ledger=None, columns=COLUMNS, names=NAMES):
+        ledger = ledger or os.path.splitext(os.path.basename(file_path))[0]
+        header, df = load_statement(file_path, columns, names)
+        return self.add(ledger, header, df, source=file_path)
+
+    def periods(self, ledger=None):
+        index = self.read_index()
+        return [period for period, ledgers in index.items() if ledger is None or ledger in ledgers]
+
+    def meta(self, period, ledger):
+        with open(os.path.join(self.ledger_dir(period, ledger), 'meta.json'), encoding='utf-8') as f:
+            return json.load(f)
+
+    def header(self, period, ledger):
+        return header_from_dict(self.meta(period, ledger)['header'])
+
+    def columns(self, period, ledger, columns=None):
+        # Memory-mapped column arrays, still encoded; opening them reads
+        # nothing but the .npy headers
+        meta = self.meta(period, ledger)
+        directory = self.ledger_dir(period, ledger)
+        return {
+            column: np.load(os.path.join(directory, f'{FILE_NAMES[column]}.npy'), mmap_mode='r')
+            for column in (columns or meta['columns'])
+        }
+
+    def load(self, period, ledger, columns=None, start=None, end=None):
+        # Decoded transactions of one period, optionally only those dated
+        # between start and end (inclusive); only the date column is scanned
+        # to find them, the others are read at the selected rows
+        meta = self.meta(period, ledger)
+        columns = columns or meta['columns']
+        arrays = self.columns(period, ledger, sorted(set(columns) | {'date'}, key=list(FILE_NAMES).index))
+        rows = slice(None)
+        if start is not None or end is not None:
+            days = arrays['date']
+            keep = days != NO_DAY
+            if start is not None:
+                keep &= days >= to_days(pd.Series([pd.Timestamp(start)]))[0]
+            if end is not None:
+                keep &= days <= to_days(pd.Series([pd.Timestamp(end)]))[0]
+            rows = np.flatnonzero(keep)
+        return pd.DataFrame({
+            column: _decode(column, arrays[column][rows], meta['dictionaries'].get(FILE_NAMES[column]))
+            for column in columns
+        })
+
+    def query(self, ledger, start=None, end=None, columns=None):
+        # Transactions of one ledger across every archived period that
+        # overlaps [start, end], in period order
+        index = self.read_index()
+        frames = []
+        for period, ledgers in index.items():
+            entry = ledgers.get(ledger)
+            if entry is None:
+                continue
+            if start is not None and pd.Timestamp(entry['to_date']) < pd.Timestamp(start):
+                continue
+            if end is not None and pd.Timestamp(entry['from_date']) > pd.Timestamp(end):
+                continue
+            frames.append(self.load(period, ledger, columns, start, end))
+        if not frames:
+            return pd.DataFrame(columns=columns or list(FILE_NAMES))
+        # Each period has its own dictionaries; concat_transactions unions them
+        return concat_transactions(frames)
+
+
+if __name__ == '__main__':
+    archive = StatementArchive()
+    file_paths = [file_path for pattern in SOURCE_GLOBS for file_path in sorted(glob.glob(pattern))]
+    # Files are read and parsed concurrently, and archived in this order
+    for file_path, header, df in ingest(file_paths):
+        ledger = os.path.splitext(os.path.basename(file_path))[0]
+        period = archive.add(ledger, header, df, source=file_path)
+        print(f"Archived {file_path} under {period}")
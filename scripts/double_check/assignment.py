@@ -0,0 +1,239 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from .matching import _greedy_pairs, _window_costs, _window_result, to_days
+from .partition import window_components
+
+# Components with more candidate pairs than this are not solved exactly:
+# shortest augmenting paths cost about rows * candidates Python steps, far
+# too slow for a long run of identical amounts. Their greedy pairs are grown
+# with augmenting paths instead (see _maximum_matching), which still pairs
+# as many rows as possible, though not always at the least total cost.
+MAX_EXACT_EDGES = 20_000
+
+
+def _min_cost_matching(size_1, size_2, left, right, cost):
+    # Largest one-to-one matching of the bipartite graph given by the edges
+    # (left[i], right[i], cost[i]), and among those the cheapest. Successive
+    # shortest augmenting paths: Dijkstra from every free left node over
+    # reduced costs, which the node potentials keep non-negative.
+    edges = [[] for _ in range(size_1)]
+    for u, v, c in zip(left.tolist(), right.tolist(), cost.tolist()):
+        edges[u].append((v, c))
+    match_1 = [-1] * size_1
+    match_2 = [-1] * size_2
+    potential_1 = [0] * size_1
+    potential_2 = [0] * size_2
+    infinity = float('inf')
+
+    while True:
+        dist_1 = [infinity] * size_1
+        dist_2 = [infinity] * size_2
+        came_from_1 = [-1] * size_1  # right node a left node was reached through
+        came_from_2 = [-1] * size_2  # left node a right node was reached from
+        heap = []
+        for u in range(size_1):
+            if match_1[u] == -1:
+                dist_1[u] = 0
+                heap.append((0, 0, u))
+        heapq.heapify(heap)
+
+        end = -1
+        while heap:
+            d, side, node = heapq.heappop(heap)
+            if side == 0:
+                if d > dist_1[node]:
+                    continue
+                for v, c in edges[node]:
+                    if match_1[node] == v:
+                        continue
+                    nd = d + c + potential_1[node] - potential_2[v]
+                    if nd < dist_2[v]:
+                        dist_2[v] = nd
+                        came_from_2[v] = node
+                        heapq.heappush(heap, (nd, 1, v))
+            else:
+                if d > dist_2[node]:
+                    continue
+                if match_2[node] == -1:
+                    end = node
+                    break
+                # The matched edge back to the left side has reduced cost 0
+                u = match_2[node]
+                if d < dist_1[u]:
+                    dist_1[u] = d
+                    came_from_1[u] = node
+                    heapq.heappush(heap, (d, 0, u))
+        if end == -1:
+            break
+
+        limit = dist_2[end]
+        for u in range(size_1):
+            potential_1[u] += min(dist_1[u], limit)
+        for v in range(size_2):
+            potential_2[v] += min(dist_2[v], limit)
+
+        v = end
+        while True:
+            u = came_from_2[v]
+            previous = came_from_1[u]
+            match_1[u] = v
+            match_2[v] = u
+            if previous == -1:
+                break
+            v = previous
+
+    return [(u, v) for u, v in enumerate(match_1) if v != -1]
+
+
+def _maximum_matching(size_1, size_2, left, right, cost, match_1, match_2):
+    # Grow the matching in match_1/match_2 (lists, -1 for free) to a largest
+    # one with Hopcroft-Karp phases: a BFS layers the graph from the free
+    # left nodes, then a DFS along the layers takes disjoint shortest
+    # augmenting paths. Starting from the greedy pairs, a phase or two over
+    # the edges is usually all it takes. Cheaper edges are tried first.
+    order = np.argsort(cost, kind='stable')
+    edges = [[] for _ in range(size_1)]
+    for u, v in zip(left[order].tolist(), right[order].tolist()):
+        edges[u].append(v)
+
+    while True:
+        layer = [-1] * size_1
+        queue = [u for u in range(size_1) if match_1[u] == -1]
+        for u in queue:
+            layer[u] = 0
+        found = False
+        for u in queue:
+            for v in edges[u]:
+                w = match_2[v]
+                if w == -1:
+                    found = True
+                elif layer[w] == -1:
+                    layer[w] = layer[u] + 1
+                    queue.append(w)
+        if not found:
+            return
+
+        next_edge = [0] * size_1
+        for root in range(size_1):
+            if match_1[root] != -1:
+                continue
+            stack = [root]
+            while stack:
+                u = stack[-1]
+                if next_edge[u] == len(edges[u]):
+                    # Dead end for this phase
+                    layer[u] = -1
+                    stack.pop()
+                    continue
+                v = edges[u][next_edge[u]]
+                next_edge[u] += 1
+                w = match_2[v]
+                if w == -1:
+                    # Flip the path: every node on the stack takes the edge
+                    # it was left through
+                    for u in stack:
+                        v = edges[u][next_edge[u] - 1]
+                        match_1[u] = v
+                        match_2[v] = u
+                    break
+                if layer[w] == layer[u] + 1:
+                    stack.append(w)
+
+
+def _row_labels(transactions_1, transactions_2, field_1, field_2, days_tolerance):
+    # Component label of every row (see partition.window_components); rows
+    # without a date or amount get -1
+    valid_1 = transactions_1['date'].notna().to_numpy() & transactions_1[field_1].notna().to_numpy()
+    valid_2 = transactions_2['date'].notna().to_numpy() & transactions_2[field_2].notna().to_numpy()
+    labels_1 = np.full(len(transactions_1), -1)
+    labels_2 = np.full(len(transactions_2), -1)
+    if valid_1.any() and valid_2.any():
+        labels_1[valid_1], labels_2[valid_2] = window_components(
+            to_days(transactions_1['date'][valid_1]), transactions_1[field_1].to_numpy()[valid_1],
+            to_days(transactions_2['date'][valid_2]), transactions_2[field_2].to_numpy()[valid_2],
+            days_tolerance,
+        )
+    return labels_1, labels_2
+
+
+def _edge_components(cand_1, cand_2, size_1, size_2):
+    # Component label of every side 1 row in the candidate graph itself, for
+    # when amounts need not be equal and window_components does not apply.
+    # Every row takes the smallest label among its neighbours' until nothing
+    # changes; following labels to their own label shortcuts long chains.
+    labels_1 = np.arange(size_1)
+    while True:
+        labels_2 = np.full(size_2, size_1)
+        np.minimum.at(labels_2, cand_2, labels_1[cand_1])
+        updated = labels_1.copy()
+        np.minimum.at(updated, cand_1, labels_2[cand_2])
+        updated = updated[updated]
+        if (updated == labels_1).all():
+            return labels_1
+        labels_1 = updated
+
+
+def optimal_pairs(cand_1, cand_2, cost, labels_1, max_exact_edges=MAX_EXACT_EDGES):
+    # Maximum one-to-one matching over the candidate pairs, cheapest first
+    # among equally large ones. Candidates never link two components, so
+    # every component is solved on its own; one-edge components, the vast
+    # majority on real ledgers, are taken as they are. Components with more
+    # than max_exact_edges candidates start from their greedy pairs and only
+    # gain rows through augmenting paths. Returns pos_1, pos_2 and the
+    # number of components and rows handled that way.
+    component = labels_1[cand_1]
+    edges = np.bincount(component)[component]
+    pos_1, pos_2 = [cand_1[edges == 1]], [cand_2[edges == 1]]
+
+    rest = np.flatnonzero(edges > 1)
+    rest = rest[np.argsort(component[rest], kind='stable')]
+    bounds = np.flatnonzero(np.diff(component[rest])) + 1
+    fallback = {'components': 0, 'rows': 0}
+    for group in np.split(rest, bounds) if len(rest) else []:
+        local_1, rows_1 = pd.factorize(cand_1[group])
+        local_2, rows_2 = pd.factorize(cand_2[group])
+        if len(group) <= max_exact_edges:
+            pairs = _min_cost_matching(len(rows_1), len(rows_2), local_1, local_2, cost[group])
+        else:
+            match_1, match_2 = [-1] * len(rows_1), [-1] * len(rows_2)
+            for u, v in zip(*(taken.tolist() for taken in _greedy_pairs(local_1, local_2, cost[group]))):
+                match_1[u], match_2[v] = v, u
+            _maximum_matching(len(rows_1), len(rows_2), local_1, local_2, cost[group], match_1, match_2)
+            pairs = [(u, v) for u, v in enumerate(match_1) if v != -1]
+            fallback['components'] += 1
+            fallback['rows'] += len(rows_1) + len(rows_2)
+        pos_1.append(rows_1[[u for u, _ in pairs]])
+        pos_2.append(rows_2[[v for _, v in pairs]])
+    return np.concatenate(pos_1).astype('int64'), np.concatenate(pos_2).astype('int64'), fallback
+
+
+def match_optimal(transactions_1, transactions_2, field_1, field_2, days_tolerance, tie_break=None,
+                  amount_tolerance=None):
+    # Same candidates and costs as match_window, but instead of pairing the
+    # closest dates first it matches as many rows as possible and, among
+    # those matchings, the one with the least total cost (amount difference,
+    # then date gap). matched.attrs records how many pairs the greedy
+    # match_window would have found, the number of candidate pairs, and how
+    # many components (and rows) were too large to solve exactly (see
+    # MAX_EXACT_EDGES).
+    cand_1, cand_2, cost = _window_costs(
+        transactions_1, transactions_2, field_1, field_2, days_tolerance, tie_break, amount_tolerance
+    )
+    if amount_tolerance:
+        labels_1 = _edge_components(cand_1, cand_2, len(transactions_1), len(transactions_2))
+    else:
+        labels_1, _ = _row_labels(transactions_1, transactions_2, field_1, field_2, days_tolerance)
+    pos_1, pos_2, fallback = optimal_pairs(cand_1, cand_2, cost, labels_1)
+    greedy = len(_greedy_pairs(cand_1, cand_2, cost)[0])
+
+    unmatched_1, unmatched_2, matched = _window_result(
+        transactions_1, transactions_2, field_1, field_2, pos_1, pos_2
+    )
+    matched.attrs.update(
+        greedy_matches=greedy, gain_over_greedy=len(matched) - greedy, candidates=len(cand_1),
+        fallback_components=fallback['components'], fallback_rows=fallback['rows'],
+    )
+    return unmatched_1, unmatched_2, matched
@@ -0,0 +1,78 @@
+# The original per-script implementations of each stage, kept unchanged as
+# benchmark baselines. Amounts are floats here, as they were in the scripts.
+import pandas as pd
+from datetime import timedelta
+
+
+def load_and_clean_data(file_path, columns, names):
+    df = pd.read_csv(file_path, header=None, usecols=columns, names=names)
+    df['credit'] = pd.to_numeric(df['credit'].replace(',', '', regex=True), errors='coerce').fillna(0)
+    df['debit'] = pd.to_numeric(df['debit'].replace(',', '', regex=True), errors='coerce').fillna(0)
+    df['date'] = pd.to_datetime(df['date'], format='%d/%m/%Y')
+    return df
+
+
+def split_credit_debit(df):
+    credit_df = df[df['credit'] != 0]
+    debit_df = df[df['debit'] != 0]
+    return credit_df, debit_df
+
+
+def remove_exact_matched_transactions(hikma_df, tawrdat_df, hikma_field, tawrdat_field):
+    hikma_df = hikma_df.reset_index(drop=True)
+    tawrdat_df = tawrdat_df.reset_index(drop=True)
+
+    matched_hikma_indices = []
+    matched_tawrdat_indices = []
+    matched_tawrdat_set = set()
+
+    for h_idx, h_row in hikma_df.iterrows():
+        matches = tawrdat_df[
+            (tawrdat_df[tawrdat_field] == h_row[hikma_field]) &
+            (tawrdat_df['date'] == h_row['date'])
+        ]
+        for t_idx in matches.index:
+            if t_idx not in matched_tawrdat_set:
+                matched_hikma_indices.append(h_idx)
+                matched_tawrdat_indices.append(t_idx)
+                matched_tawrdat_set.add(t_idx)
+                break
+
+    unmatched_hikma = hikma_df.drop(index=matched_hikma_indices)
+    unmatched_tawrdat = tawrdat_df.drop(index=matched_tawrdat_indices)
+    return unmatched_hikma, unmatched_tawrdat
+
+
+def match_and_remove(transactions_1, transactions_2, days_tolerance):
+    transactions_1['date_start'] = transactions_1['date'] - timedelta(days=days_tolerance)
+    transactions_1['date_end'] = transactions_1['date'] + timedelta(days=days_tolerance)
+
+    matched_indices_1 = set()
+    matched_indices_2 = set()
+
+    for idx1, row1 in transactions_1.iterrows():
+        potential_matches = transactions_2[
+            (transactions_2['date'] >= row1['date_start']) &
+            (transactions_2['date'] <= row1['date_end']) &
+            (transactions_2['debit'] == row1['credit'])
+        ]
+        if not potential_matches.empty:
+            matched_indices_1.add(idx1)
+            matched_indices_2.update(potential_matches.index.tolist())
+
+    unmatched_1 = transactions_1.drop(index=list(matched_indices_1))
+    unmatched_2 = transactions_2.drop(index=list(matched_indices_2))
+    return unmatched_1, unmatched_2
+
+
+def find_and_remove_balanced_dates(df1, df2):
+    summary1 = df1.groupby('date').agg({'credit': 'sum', 'debit': 'sum'}).reset_index()
+    summary2 = df2.groupby('date').agg({'credit': 'sum', 'debit': 'sum'}).reset_index()
+
+    merged = pd.merge(summary1, summary2, on='date', suffixes=('_1', '_2'))
+    balanced_dates = merged[((merged['credit_1'] - merged['debit_2']).abs() < 1e-2) &
+                            ((merged['credit_2'] - merged['debit_1']).abs() < 1e-2)]['date']
+
+    df1_filtered = df1[~df1['date'].isin(balanced_dates)]
+    df2_filtered = df2[~df2['date'].isin(balanced_dates)]
+    return df1_filtered, df2_filtered
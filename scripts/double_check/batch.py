@@ -0,0 +1,115 @@
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from .cache import StatementCache
+from .commands import pipeline_options
+from .config import DEFAULT_CONFIG, default_path
+from .pipeline import DAYS_TOLERANCE, ReconciliationPipeline, write_results
+from .statement import COLUMNS, NAMES
+
+MANIFEST_PATH = default_path('../data/manifest.json')
+SUMMARY_PATH = default_path('../data/cleaned/batch_summary.csv')
+
+# Matching settings an entry can override; the defaults are those of
+# final.py and `python -m double_check reconcile`, so a pair reconciled in
+# a batch gives the same result as when reconciled on its own. Pairs run
+# in parallel, so each one matches on a single worker.
+PIPELINE_KEYS = ('prefilter', 'descriptions', 'assignment', 'contra_days', 'amount_tolerance',
+                 'amount_tolerance_percent', 'references')
+
+# Defaults for every manifest entry; an entry only needs ledger_1 and ledger_2
+ENTRY_DEFAULTS = {
+    'names': ['ledger_1', 'ledger_2'],
+    'columns': COLUMNS,
+    'column_names': NAMES,
+    'days_tolerance': DAYS_TOLERANCE,
+    'output': default_path('../data/cleaned/{pair}/{side}_filtered.csv'),
+    **{key: DEFAULT_CONFIG[key] for key in PIPELINE_KEYS},
+    'workers': 1,
+}
+
+
+def load_manifest(manifest_path):
+    # A JSON list of account pairs, e.g.
+    # [{"pair": "hikma-tawrdat", "ledger_1": "../data/source/hikma.csv",
+    #   "ledger_2": "../data/source/tawrdat.csv", "names": ["hikma", "tawrdat"]}]
+    # Relative paths in it are relative to the manifest
+    with open(manifest_path, encoding='utf-8') as f:
+        entries = json.load(f)
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    work = []
+    for i, entry in enumerate(entries):
+        entry = {**ENTRY_DEFAULTS, **entry}
+        for key in ('ledger_1', 'ledger_2', 'output'):
+            entry[key] = os.path.normpath(os.path.join(base, entry[key]))
+        entry.setdefault('pair', '-'.join(entry['names']))
+        entry['position'] = i
+        work.append(entry)
+    return work
+
+
+def work_size(entry):
+    return os.path.getsize(entry['ledger_1']) + os.path.getsize(entry['ledger_2'])
+
+
+def reconcile_pair(entry):
+    # One work unit: the full load/split/match/filter pipeline for one pair
+    started = time.perf_counter()
+    cache = StatementCache()
+    _, df_1 = cache.load(entry['ledger_1'], entry['columns'], entry['column_names'])
+    _, df_2 = cache.load(entry['ledger_2'], entry['columns'], entry['column_names'])
+
+    # A running balance, when the entry reads one, is not matched on
+    df_1, df_2 = (df.drop(columns='balance', errors='ignore') for df in (df_1, df_2))
+
+    pipeline = ReconciliationPipeline(tuple(entry['names']), days_tolerance=entry['days_tolerance'],
+                                      **pipeline_options(entry))
+    results = pipeline.run(df_1, df_2)
+    write_results(results, entry['output'].replace('{pair}', entry['pair']))
+
+    summary = {
+        'pair': entry['pair'],
+        'position': entry['position'],
+        'rows_1': len(df_1),
+        'rows_2': len(df_2),
+        'unmatched_rows': sum(len(df) for df in results.values()),
+    }
+    for (stage, *_), matched in pipeline.matches.items():
+        summary[f'{stage}_matches'] = summary.get(f'{stage}_matches', 0) + len(matched)
+    for side, df in results.items():
+        summary[f'{side}_unmatched'] = len(df)
+    summary['seconds'] = time.perf_counter() - started
+    return summary
+
+
+def run_batch(entries, max_workers=None):
+    # Largest pairs first, so a big pair never starts last and holds up the
+    # whole batch while the other workers sit idle
+    entries = sorted(entries, key=work_size, reverse=True)
+    summaries = []
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(reconcile_pair, entry): entry for entry in entries}
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                summaries.append(future.result())
+                print(f"Reconciled {entry['pair']}")
+            except Exception as e:
+                print(f"An error occurred while reconciling {entry['pair']}: {e}")
+                summaries.append({'pair': entry['pair'], 'position': entry['position'], 'error': str(e)})
+
+    # Consolidated summary in manifest order
+    summary = pd.DataFrame(summaries).sort_values('position').drop(columns='position')
+    return summary.reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    manifest_path = sys.argv[1] if len(sys.argv) > 1 else MANIFEST_PATH
+    summary = run_batch(load_manifest(manifest_path))
+    summary.to_csv(SUMMARY_PATH, index=False)
+    print(summary)
@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from . import baseline
+from .assignment import match_optimal
+from .config import default_path
+from .matching import match_exact, match_window
+from .pipeline import DAYS_TOLERANCE, remove_balanced_dates, split_credit_debit
+from .statement import COLUMNS, NAMES, load_statement
+from .synthetic import SHIFT_PROBABILITIES, generate_ledger_pair, write_export
+
+RESULTS_DIR = default_path('../data/bench')
+
+# The original scripts compare every row with every other row; above this
+# many rows per ledger they would run for hours, so they are skipped
+BASELINE_LIMIT = 20_000
+
+# A stage counts as regressed when it gets this much slower between runs
+REGRESSION_RATIO = 1.2
+
+# Rows per side of the dense-bucket stages: one amount, every row dated
+# inside one window, so every row is a candidate of every row on the other
+# side. Time per candidate should stay flat from one size to the next. The
+# optimal assignment gets the same rows spread over DENSE_OPTIMAL_DAYS days,
+# one component too large to solve exactly.
+DENSE_BUCKET_ROWS = [500, 2000]
+DENSE_OPTIMAL_DAYS = 30
+
+
+def measure(function, *args, profile_memory=True):
+    # Wall and CPU time of one call, plus its peak traced allocation in a
+    # second call (tracing slows Python-heavy code down, so it would skew
+    # the timings if both were taken from the same call)
+    started_wall, started_cpu = time.perf_counter(), time.process_time()
+    result = function(*args)
+    timings = {
+        'wall_seconds': time.perf_counter() - started_wall,
+        'cpu_seconds': time.process_time() - started_cpu,
+        'peak_bytes': None,
+    }
+    if profile_memory:
+        tracemalloc.start()
+        function(*args)
+        timings['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, timings
+
+
+def _baseline_window(credit_df, debit_df, days_tolerance):
+    # match_and_remove adds helper columns to its first argument
+    return baseline.match_and_remove(credit_df.copy(), debit_df, days_tolerance)
+
+
+def bench_rows(rows, workdir, duplicate_rate, shift_probabilities, split_rate, seed,
+               baseline_limit=BASELINE_LIMIT, profile_memory=True):
+    ledger_1, ledger_2 = generate_ledger_pair(
+        rows, duplicate_rate=duplicate_rate, shift_probabilities=shift_probabilities,
+        split_rate=split_rate, seed=seed,
+    )
+    path_1 = os.path.join(workdir, f'ledger_1_{rows}.csv')
+    path_2 = os.path.join(workdir, f'ledger_2_{rows}.csv')
+    write_export(ledger_1, path_1)
+    write_export(ledger_2, path_2)
+
+    implementations = ['current']
+    if rows <= baseline_limit:
+        implementations.append('baseline')
+
+    results = []
+
+    def record(stage, implementation, timings, rows_in, rows_out, matches=None):
+        results.append({
+            'rows': rows, 'stage': stage, 'implementation': implementation,
+            'rows_in': rows_in, 'rows_out': rows_out, 'matches': matches, **timings,
+        })
+
+    for implementation in implementations:
+        current = implementation == 'current'
+        load = (lambda path: load_statement(path)[1]) if current else (
+            lambda path: baseline.load_and_clean_data(path, COLUMNS, NAMES))
+        split = split_credit_debit if current else baseline.split_credit_debit
+
+        df_1, timings = measure(load, path_1, profile_memory=profile_memory)
+        record('load', implementation, timings, len(df_1), len(df_1))
+        df_2 = load(path_2)
+
+        (credit_1, _), timings = measure(split, df_1, profile_memory=profile_memory)
+        record('split_credit_debit', implementation, timings, len(df_1), len(credit_1))
+        _, debit_2 = split(df_2)
+
+        rows_in = len(credit_1) + len(debit_2)
+        if current:
+            (credit_1, debit_2, matched), timings = measure(
+                match_exact, credit_1, debit_2, 'credit', 'debit', profile_memory=profile_memory)
+        else:
+            (credit_1, debit_2), timings = measure(
+                baseline.remove_exact_matched_transactions, credit_1, debit_2, 'credit', 'debit',
+                profile_memory=profile_memory)
+        rows_out = len(credit_1) + len(debit_2)
+        record('exact', implementation, timings, rows_in, rows_out, (rows_in - rows_out) // 2)
+
+        rows_in = rows_out
+        if current:
+            (credit_1, debit_2, matched), timings = measure(
+                match_window, credit_1, debit_2, 'credit', 'debit', DAYS_TOLERANCE,
+                profile_memory=profile_memory)
+        else:
+            (credit_1, debit_2), timings = measure(
+                _baseline_window, credit_1, debit_2, DAYS_TOLERANCE, profile_memory=profile_memory)
+        rows_out = len(credit_1) + len(debit_2)
+        record('window', implementation, timings, rows_in, rows_out)
+
+        rows_in = rows_out
+        balanced = (lambda a, b: remove_balanced_dates(a, b)[:2]) if current else baseline.find_and_remove_balanced_dates
+        (credit_1, debit_2), timings = measure(balanced, credit_1, debit_2, profile_memory=profile_memory)
+        record('balanced', implementation, timings, rows_in, len(credit_1) + len(debit_2))
+
+    return results
+
+
+def dense_bucket(rows, days, seed=0):
+    # Credit and debit frames of rows rows each, all of one amount, dated
+    # over days days
+    rng = np.random.default_rng(seed)
+    return [
+        pd.DataFrame({
+            'date': pd.Timestamp('2024-03-01') + pd.to_timedelta(rng.integers(0, days, rows), 'D'),
+            field: np.full(rows, 50000, dtype='int64'),
+        })
+        for field in ('credit', 'debit')
+    ]
+
+
+def bench_dense_bucket(rows, seed=0, profile_memory=True):
+    credit, debit = dense_bucket(rows, DAYS_TOLERANCE + 1, seed)
+    (_, _, matched), timings = measure(
+        match_window, credit, debit, 'credit', 'debit', DAYS_TOLERANCE, profile_memory=profile_memory)
+    results = [{
+        'rows': rows, 'stage': 'dense_window', 'implementation': 'current', 'rows_in': 2 * rows,
+        'rows_out': 2 * (rows - len(matched)), 'matches': len(matched), 'candidates': rows * rows, **timings,
+    }]
+
+    credit, debit = dense_bucket(rows, DENSE_OPTIMAL_DAYS, seed)
+    (_, _, matched), timings = measure(
+        match_optimal, credit, debit, 'credit', 'debit', DAYS_TOLERANCE, profile_memory=profile_memory)
+    results.append({
+        'rows': rows, 'stage': 'dense_optimal', 'implementation': 'current', 'rows_in': 2 * rows,
+        'rows_out': 2 * (rows - len(matched)), 'matches': len(matched), 'candidates': matched.attrs['candidates'],
+        **timings,
+    })
+    return results
+
+
+def run_bench(row_counts, duplicate_rate=0.1, shift_probabilities=SHIFT_PROBABILITIES, split_rate=0.02,
+              seed=0, baseline_limit=BASELINE_LIMIT, profile_memory=True, dense_rows=DENSE_BUCKET_ROWS):
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in row_counts:
+            results.extend(bench_rows(
+                rows, workdir, duplicate_rate, shift_probabilities, split_rate, seed,
+                baseline_limit=baseline_limit, profile_memory=profile_memory,
+            ))
+            print(f"Benchmarked {rows} rows")
+    for rows in dense_rows:
+        results.extend(bench_dense_bucket(rows, seed, profile_memory=profile_memory))
+        print(f"Benchmarked a dense bucket of {rows} rows")
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'duplicate_rate': duplicate_rate,
+            'shift_probabilities': list(shift_probabilities),
+            'split_rate': split_rate,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def save_report(report, results_dir=RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    stamp = report['meta']['timestamp'].replace(':', '').replace('-', '')
+    file_path = os.path.join(results_dir, f'bench-{stamp}.json')
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return file_path
+
+
+def compare_reports(previous, current, ratio=REGRESSION_RATIO):
+    # Wall time of every (rows, stage, implementation) present in both runs,
+    # flagged where the current run is more than `ratio` times slower
+    keys = ['rows', 'stage', 'implementation']
+    before = pd.DataFrame(previous['results'])[keys + ['wall_seconds']]
+    after = pd.DataFrame(current['results'])[keys + ['wall_seconds']]
+    merged = pd.merge(before, after, on=keys, suffixes=('_before', '_after'))
+    merged['ratio'] = merged['wall_seconds_after'] / merged['wall_seconds_before']
+    merged['regressed'] = merged['ratio'] > ratio
+    return merged
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Benchmark every reconciliation stage on synthetic ledgers.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--duplicate-rate', type=float, default=0.1)
+    parser.add_argument('--shift-probabilities', type=float, nargs='+', default=list(SHIFT_PROBABILITIES))
+    parser.add_argument('--split-rate', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline-limit', type=int, default=BASELINE_LIMIT)
+    parser.add_argument('--dense-rows', type=int, nargs='*', default=DENSE_BUCKET_ROWS)
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak-memory pass')
+    parser.add_argument('--compare', help='earlier report to check for regressions')
+    parser.add_argument('--output', default=RESULTS_DIR)
+    args = parser.parse_args(argv)
+
+    report = run_bench(
+        args.rows, args.duplicate_rate, args.shift_probabilities, args.split_rate, args.seed,
+        baseline_limit=args.baseline_limit, profile_memory=not args.no_memory, dense_rows=args.dense_rows,
+    )
+    print(f"Saved benchmark report to {save_report(report, args.output)}")
+    print(pd.DataFrame(report['results']).to_string(index=False))
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            comparison = compare_reports(json.load(f), report)
+        print(comparison.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
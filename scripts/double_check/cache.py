@@ -0,0 +1,201 @@
+import dataclasses
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .config import default_path
+from .ingest import ingest
+from .statement import COLUMNS, NAMES, StatementHeader, load_statement
+
+CACHE_DIR = default_path('../data/cache')
+MAX_CACHE_BYTES = 2 * 1024 ** 3
+
+# Bump whenever the parsed schema changes so old entries stop matching
+CACHE_VERSION = 3
+
+
+def file_digest(file_path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def frame_to_arrays(df):
+    # One plain numpy array per column (two for categoricals and nullable
+    # integers), so the whole frame can be stored without pickling
+    arrays, kinds = {}, {}
+    for i, column in enumerate(df.columns):
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            arrays[f'{i}.codes'] = values.cat.codes.to_numpy()
+            arrays[f'{i}.categories'] = np.asarray(values.cat.categories, dtype=str)
+            kinds[column] = 'category'
+        elif isinstance(values.dtype, pd.api.extensions.ExtensionDtype) and values.dtype.kind in 'iu':
+            arrays[f'{i}.values'] = values.fillna(0).to_numpy(dtype=values.dtype.numpy_dtype)
+            arrays[f'{i}.mask'] = values.isna().to_numpy()
+            kinds[column] = str(values.dtype)
+        elif values.dtype.kind in 'biufmM':
+            arrays[f'{i}.values'] = values.to_numpy()
+            kinds[column] = 'numpy'
+        else:
+            arrays[f'{i}.values'] = np.asarray(values, dtype=str)
+            kinds[column] = 'str'
+    return arrays, kinds
+
+
+def arrays_to_frame(arrays, columns, kinds):
+    data = {}
+    for i, column in enumerate(columns):
+        kind = kinds[column]
+        if kind == 'category':
+            data[column] = pd.Categorical.from_codes(arrays[f'{i}.codes'], arrays[f'{i}.categories'])
+        elif kind == 'numpy':
+            data[column] = arrays[f'{i}.values']
+        elif kind == 'str':
+            data[column] = pd.Series(arrays[f'{i}.values'], dtype=str)
+        else:
+            data[column] = pd.arrays.IntegerArray(arrays[f'{i}.values'], arrays[f'{i}.mask']).astype(kind)
+    return pd.DataFrame(data, columns=columns)
+
+
+def header_to_dict(header):
+    return {
+        field: value.isoformat() if isinstance(value, pd.Timestamp) else value
+        for field, value in dataclasses.asdict(header).items()
+    }
+
+
+def header_from_dict(values):
+    return StatementHeader(**{
+        field: pd.Timestamp(value) if field.endswith('_date') else value
+        for field, value in values.items()
+    })
+
+
+class StatementCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, 'index.json')
+
+    def load(self, file_path, columns=COLUMNS, names=NAMES):
+        # Parsed (header, transactions) for file_path, from the cache when the
+        # file content and column mapping are unchanged
+        entry_path = self.entry_path(file_path, columns, names)
+        if os.path.exists(entry_path):
+            # Touch the entry so eviction sees it as recently used
+            os.utime(entry_path)
+            return self.read_entry(entry_path)
+
+        header, df = load_statement(file_path, columns, names)
+        self.write_entry(entry_path, header, df)
+        self.evict()
+        return header, df
+
+    def load_many(self, file_paths, columns=COLUMNS, names=NAMES, **ingest_options):
+        # load() for several files, in the order given; the ones not cached
+        # yet are read and parsed concurrently (see ingest.ingest)
+        file_paths = list(file_paths)
+        loaded = {}
+        misses = []
+        for file_path in file_paths:
+            entry_path = self.entry_path(file_path, columns, names)
+            if os.path.exists(entry_path):
+                os.utime(entry_path)
+                loaded[file_path] = self.read_entry(entry_path)
+            else:
+                misses.append(file_path)
+        for file_path, header, df in ingest(misses, columns, names, **ingest_options):
+            self.write_entry(self.entry_path(file_path, columns, names), header, df)
+            loaded[file_path] = header, df
+        if misses:
+            self.evict()
+        return [loaded[file_path] for file_path in file_paths]
+
+    def key(self, file_path, columns=COLUMNS, names=NAMES):
+        mapping = json.dumps([CACHE_VERSION, list(columns), list(names)])
+        digest = hashlib.sha256(mapping.encode('utf-8'))
+        digest.update(self.content_digest(file_path).encode('ascii'))
+        return digest.hexdigest()
+
+    def entry_path(self, file_path, columns=COLUMNS, names=NAMES):
+        return os.path.join(self.cache_dir, f'{self.key(file_path, columns, names)}.npz')
+
+    def content_digest(self, file_path):
+        # Hashing a multi-GB export on every run would defeat the cache, so
+        # the digest is remembered per (path, size, mtime) and recomputed only
+        # when the file has been touched
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        index = self.read_index()
+        known = index.get(file_path)
+        if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+            return known['digest']
+
+        digest = file_digest(file_path)
+        index[file_path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': digest}
+        self.write_index(index)
+        return digest
+
+    def read_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def write_index(self, index):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        partial_path = f'{self.index_path}.{os.getpid()}.partial'
+        with open(partial_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(partial_path, self.index_path)
+
+    def read_entry(self, entry_path):
+        with np.load(entry_path, allow_pickle=False) as entry:
+            meta = json.loads(str(entry['meta']))
+            header = header_from_dict(meta['header'])
+            df = arrays_to_frame(entry, meta['columns'], meta['kinds'])
+        return header, df
+
+    def write_entry(self, entry_path, header, df):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        arrays, kinds = frame_to_arrays(df)
+        meta = json.dumps({'columns': list(df.columns), 'kinds': kinds, 'header': header_to_dict(header)})
+        # Write under a temporary name first so a crash, or another process
+        # filling the same entry, never leaves a torn entry
+        partial_path = f'{entry_path}.{os.getpid()}.partial'
+        with open(partial_path, 'wb') as f:
+            np.savez(f, meta=np.array(meta), **arrays)
+        os.replace(partial_path, entry_path)
+
+    def entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        paths = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith('.npz')]
+        return sorted(paths, key=os.path.getmtime)
+
+    def evict(self):
+        # Drop the least recently used entries until the cache fits max_bytes
+        entries = self.entries()
+        total = sum(os.path.getsize(path) for path in entries)
+        for path in entries:
+            if total <= self.max_bytes:
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
+
+    def invalidate(self, file_path, columns=COLUMNS, names=NAMES):
+        entry_path = self.entry_path(file_path, columns, names)
+        if os.path.exists(entry_path):
+            os.remove(entry_path)
+
+    def clear(self):
+        for path in self.entries():
+            os.remove(path)
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
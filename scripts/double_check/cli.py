@@ -0,0 +1,113 @@
+import argparse
+import json
+import sys
+
+from .commands import format_summary, read_summary, reconcile
+from .config import ASSIGNMENTS, ENGINES, ConfigError, merge_config, validate
+
+
+def _ledgers(values):
+    # ['hikma=../a.csv', 'tawrdat=../b.csv'] -> {'hikma': '../a.csv', ...}
+    if not values:
+        return None
+    ledgers = {}
+    for value in values:
+        name, separator, path = value.partition('=')
+        if not separator:
+            raise ConfigError(f"--ledger expects NAME=PATH, got {value!r}")
+        ledgers[name] = path
+    return ledgers
+
+
+def _config(args):
+    config = merge_config(
+        args.config,
+        ledgers=_ledgers(getattr(args, 'ledger', None)),
+        days_tolerance=getattr(args, 'days_tolerance', None),
+        engine=getattr(args, 'engine', None),
+        assignment=getattr(args, 'assignment', None),
+        workers=getattr(args, 'workers', None),
+        output=getattr(args, 'output', None),
+        reports_dir=getattr(args, 'reports_dir', None),
+        prefilter=False if getattr(args, 'no_prefilter', False) else None,
+        descriptions=False if getattr(args, 'no_descriptions', False) else None,
+        cache=False if getattr(args, 'no_cache', False) else None,
+        contra_days=getattr(args, 'contra_days', None),
+        amount_tolerance=getattr(args, 'amount_tolerance', None),
+        amount_tolerance_percent=getattr(args, 'amount_tolerance_percent', None),
+        open_items=getattr(args, 'open_items', None),
+        horizon_days=getattr(args, 'horizon_days', None),
+    )
+    if getattr(args, 'no_contra', False):
+        config['contra_days'] = None
+    if getattr(args, 'no_open_items', False):
+        config['open_items'] = None
+    return validate(config)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='double_check', description='Reconcile two ledger statements.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def with_config(command):
+        command.add_argument('--config', help='JSON file overriding the default settings')
+        command.add_argument('--reports-dir', help='where reports are written and read')
+        return command
+
+    run = with_config(commands.add_parser('reconcile', help='match the two ledgers and save what is left'))
+    run.add_argument('--ledger', action='append', metavar='NAME=PATH', help='a statement to reconcile (twice)')
+    run.add_argument('--days-tolerance', type=int)
+    run.add_argument('--engine', choices=ENGINES)
+    run.add_argument('--assignment', choices=ASSIGNMENTS)
+    run.add_argument('--workers', type=int)
+    run.add_argument('--output', help='path template for the unmatched rows, with {side}')
+    run.add_argument('--no-prefilter', action='store_true', help='match every date, not only divergent ones')
+    run.add_argument('--no-descriptions', action='store_true', help='do not break ties by description')
+    run.add_argument('--amount-tolerance', type=float, help='largest amount difference to pair, e.g. 0.50')
+    run.add_argument('--amount-tolerance-percent', type=float, help='same, as a percentage of the amount')
+    run.add_argument('--contra-days', type=int, help='window for offsetting pairs inside one ledger')
+    run.add_argument('--no-contra', action='store_true', help='keep offsetting pairs inside a ledger')
+    run.add_argument('--open-items', help='index of rows left open by earlier runs')
+    run.add_argument('--horizon-days', type=int, help='how long an open item is carried')
+    run.add_argument('--no-open-items', action='store_true', help='do not carry rows between runs')
+    run.add_argument('--no-cache', action='store_true', help='parse the statements even when cached')
+
+    summarize = with_config(commands.add_parser('summarize', help="print the last reconcile's results"))
+    summarize.add_argument('--json', action='store_true', help='print the raw summary')
+
+    with_config(commands.add_parser('config', help='validate and print the effective settings'))
+
+    # Listed for --help only; main() hands everything after 'bench' to
+    # bench.py's own parser
+    commands.add_parser('bench', help='benchmark the stages on synthetic ledgers (see bench --help)')
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ['bench']:
+        from . import bench
+
+        bench.main(argv[1:], prog='double_check bench')
+        return 0
+
+    args = build_parser().parse_args(argv)
+
+    try:
+        config = _config(args)
+    except (ConfigError, OSError, json.JSONDecodeError) as e:
+        print(f"Invalid configuration: {e}", file=sys.stderr)
+        return 2
+
+    if args.command == 'config':
+        print(json.dumps(config, indent=2, ensure_ascii=False))
+    elif args.command == 'reconcile':
+        reconcile(config)
+    elif args.command == 'summarize':
+        try:
+            summary = read_summary(config)
+        except FileNotFoundError:
+            print(f"No results in {config['reports_dir']}; run reconcile first", file=sys.stderr)
+            return 1
+        print(json.dumps(summary, indent=2, ensure_ascii=False) if args.json else format_summary(summary))
+    return 0
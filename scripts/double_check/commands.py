@@ -0,0 +1,150 @@
+import json
+import os
+
+# The reconciliation modules (and pandas with them) are imported inside the
+# commands that need them, so importing this module stays cheap
+
+STAGES_REPORT = 'final_stages.json'
+SUMMARY_REPORT = 'summary.json'
+MATCH_LEDGER = 'match_ledger.npz'
+
+
+def pipeline_options(config, **extra):
+    # ReconciliationPipeline keyword arguments for the matching settings of
+    # a config (or of a batch manifest entry, which uses the same keys)
+    options = {
+        'workers': config['workers'], 'prefilter': config['prefilter'], 'descriptions': config['descriptions'],
+        'assignment': config['assignment'], 'contra_days': config['contra_days'],
+        'references': config['references'], **extra,
+    }
+    if config['amount_tolerance'] or config['amount_tolerance_percent']:
+        from .matching import AmountTolerance
+
+        options['amount_tolerance'] = AmountTolerance(
+            round((config['amount_tolerance'] or 0) * 100), config['amount_tolerance_percent'] or 0
+        )
+    return options
+
+
+def reconcile(config, log=print):
+    # final.py driven by a validated config (see config.load_config): load
+    # both statements, check their running balances, run the pipeline, and
+    # write the unmatched rows, the stage report, the match ledger and a
+    # summary that `summarize` reads back. With 'open_items' set, what is
+    # left is first settled against rows earlier runs left open, and the
+    # rest is carried forward. Returns the unmatched frames.
+    from .divergence import check_running_balance
+    from .instrument import Instrumentation, JsonSink
+    from .pipeline import ReconciliationPipeline, write_results
+
+    (name_1, path_1), (name_2, path_2) = config['ledgers'].items()
+    names = (name_1, name_2)
+    reports_dir = config['reports_dir']
+    instrumentation = Instrumentation(JsonSink(os.path.join(reports_dir, STAGES_REPORT)))
+    options = pipeline_options(config, instrumentation=instrumentation)
+
+    breaks = {}
+    if config['engine'] == 'polars':
+        from .engine import PolarsEngine
+
+        # The running balance is only checked on the pandas path; leave it
+        # out of the scan so both engines write the same columns
+        columns = [(column, name) for column, name in zip(config['columns'], config['names']) if name != 'balance']
+        engine = PolarsEngine(names, config['days_tolerance'], *map(list, zip(*columns)), **options)
+        results = engine.reconcile(path_1, path_2)
+        pipeline = engine.pipeline
+    else:
+        if config['cache']:
+            from .cache import StatementCache
+
+            cache = StatementCache()
+            loaded = cache.load_many([path_1, path_2], config['columns'], config['names'])
+        else:
+            from .statement import load_statement
+
+            loaded = [load_statement(path, config['columns'], config['names']) for path in (path_1, path_2)]
+
+        frames = []
+        for name, (header, df) in zip(names, loaded):
+            if 'balance' in df:
+                broken = check_running_balance(df, header.opening_balance)
+                breaks[name] = len(broken)
+                if len(broken):
+                    log(f"{name}: running balance breaks on {len(broken)} rows, first at line {broken.index[0] + 1}")
+                df = df.drop(columns='balance')
+            frames.append(df)
+
+        pipeline = ReconciliationPipeline(names, config['days_tolerance'], **options)
+        results = pipeline.run(*frames)
+
+    carried = 0
+    if config['open_items']:
+        from .archive import period_of
+        from .open_items import CARRY_STAGE, OpenItems
+        from .statement import read_statement_header
+
+        header = read_statement_header(path_1)
+        open_items = OpenItems(config['open_items'], names, config['horizon_days'])
+        with instrumentation.stage(CARRY_STAGE) as record:
+            record['rows_in'] = {side: len(df) for side, df in results.items()}
+            results, settled = open_items.carry(results, period_of(header), header.to_date, config['days_tolerance'],
+                                                pipeline.match_ledger)
+            record['rows_out'] = {side: len(df) for side, df in results.items()}
+            record['matches'] = record['rows_matched'] = carried = len(settled)
+        log(f"{carried} rows matched items left open by earlier runs")
+
+    # After the open items, so the ledger also holds the pairs they settled
+    instrumentation.close()
+    pipeline.match_ledger.save(os.path.join(reports_dir, MATCH_LEDGER))
+    write_results(results, config['output'])
+
+    matches = {}
+    for (stage, *_), matched in pipeline.matches.items():
+        matches[stage] = matches.get(stage, 0) + len(matched)
+    summary = {
+        'config': config,
+        'running_balance_breaks': breaks,
+        'matches': matches,
+        'carried': carried,
+        'unmatched': {
+            side: {'rows': len(df), 'credit': int(df['credit'].sum()), 'debit': int(df['debit'].sum())}
+            for side, df in results.items()
+        },
+    }
+    with open(os.path.join(reports_dir, SUMMARY_REPORT), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    log(f"Unmatched rows saved to {config['output']}")
+    return results
+
+
+def read_summary(config):
+    # The last reconcile's summary and stage records, straight from the
+    # JSON reports; no statement is read and nothing is recomputed
+    reports_dir = config['reports_dir']
+    with open(os.path.join(reports_dir, SUMMARY_REPORT), encoding='utf-8') as f:
+        summary = json.load(f)
+    stages_path = os.path.join(reports_dir, STAGES_REPORT)
+    if os.path.exists(stages_path):
+        with open(stages_path, encoding='utf-8') as f:
+            summary['stages'] = json.load(f)['stages']
+    return summary
+
+
+def format_summary(summary):
+    lines = []
+    for name, count in summary['running_balance_breaks'].items():
+        if count:
+            lines.append(f"{name}: running balance breaks on {count} rows")
+    lines.append('Matches per stage:')
+    for stage, count in summary['matches'].items():
+        seconds = sum(record['wall_seconds'] for record in summary.get('stages', []) if record['stage'] == stage)
+        lines.append(f"  {stage:<16}{count:>8}{seconds:>10.3f}s")
+    if summary.get('carried'):
+        lines.append(f"  {'open items':<16}{summary['carried']:>8}")
+    lines.append('Unmatched:')
+    for side, totals in summary['unmatched'].items():
+        lines.append(
+            f"  {side:<24}{totals['rows']:>8} rows  credit {totals['credit'] / 100:>16,.2f}"
+            f"  debit {totals['debit'] / 100:>16,.2f}"
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,146 @@
+import json
+import os
+
+# Only the standard library is imported here, so configs can be loaded and
+# checked without paying for pandas.
+
+# Relative paths in DEFAULT_CONFIG, and the default paths of the modules
+# (see default_path), are relative to scripts/, the directory holding this
+# package, so they work from any working directory
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Defaults match final.py: columns and names mirror statement.BALANCE_COLUMNS
+# and statement.BALANCE_NAMES (the running balance is validated whenever
+# 'balance' is read), days_tolerance pipeline.DAYS_TOLERANCE
+DEFAULT_CONFIG = {
+    'ledgers': {
+        'hikma': '../data/source/hikma.csv',
+        'tawrdat': '../data/source/tawrdat.csv',
+    },
+    'columns': [27, 28, 29, 30, 31, 32, 33],
+    'names': ['dis', 'date', 'jv number', 'jv', 'balance', 'credit', 'debit'],
+    'days_tolerance': 4,
+    'engine': 'pandas',
+    'prefilter': True,
+    'descriptions': True,
+    'assignment': 'optimal',
+    'contra_days': 4,
+    # Largest amount difference the exact and window stages still pair: in
+    # currency units, or as a percentage of the amount; null for none
+    'amount_tolerance': None,
+    'amount_tolerance_percent': None,
+    # Columns (from 'names') holding a reference both companies book on the
+    # same entry, paired on right after the exact stage; null for none. The
+    # statement exports carry none: JV numbers are numbered by each company
+    # on its own and match only by coincidence (see references.py).
+    'references': None,
+    # Unmatched rows carried between monthly runs (see open_items.py): the
+    # index file, null to reconcile each month on its own, and how many
+    # days before the period end an open item is still looked up
+    'open_items': '../data/state/open_items.npz',
+    'horizon_days': 90,
+    'workers': 1,
+    'cache': True,
+    'output': '../data/cleaned/final/{side}_filtered.csv',
+    'reports_dir': '../data/reports',
+}
+
+# Keys holding paths; relative ones in a config file are relative to it
+PATH_KEYS = ('output', 'reports_dir', 'open_items')
+
+REQUIRED_NAMES = ('date', 'credit', 'debit')
+ENGINES = ('pandas', 'polars')
+ASSIGNMENTS = ('greedy', 'optimal')
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def load_config(file_path=None, **overrides):
+    return validate(merge_config(file_path, **overrides))
+
+
+def resolve_paths(values, base):
+    # values with its relative paths made relative to base instead of the
+    # working directory
+    values = dict(values)
+    for key in PATH_KEYS:
+        if isinstance(values.get(key), str):
+            values[key] = os.path.normpath(os.path.join(base, values[key]))
+    if isinstance(values.get('ledgers'), dict):
+        values['ledgers'] = {
+            name: os.path.normpath(os.path.join(base, path)) for name, path in values['ledgers'].items()
+        }
+    return values
+
+
+def default_path(path):
+    # A path such as '../data/cache' made relative to scripts/ instead of the
+    # working directory
+    return os.path.normpath(os.path.join(SCRIPTS_DIR, path))
+
+
+def merge_config(file_path=None, **overrides):
+    # DEFAULT_CONFIG, updated from a JSON file and then from overrides
+    # (None values are ignored); not validated yet. Relative paths in the
+    # file are relative to the file, those in overrides to the working
+    # directory.
+    config = resolve_paths(json.loads(json.dumps(DEFAULT_CONFIG)), SCRIPTS_DIR)
+    if file_path is not None:
+        with open(file_path, encoding='utf-8') as f:
+            values = json.load(f)
+        if not isinstance(values, dict):
+            raise ConfigError(f"{file_path}: expected a JSON object")
+        config.update(resolve_paths(values, os.path.dirname(os.path.abspath(file_path))))
+    config.update({key: value for key, value in overrides.items() if value is not None})
+    return config
+
+
+def validate(config):
+    unknown = set(config) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ConfigError(f"Unknown config keys: {', '.join(sorted(unknown))}")
+
+    ledgers = config['ledgers']
+    if not isinstance(ledgers, dict) or len(ledgers) != 2:
+        raise ConfigError("'ledgers' must map exactly two ledger names to statement files")
+    columns, names = config['columns'], config['names']
+    if not all(isinstance(column, int) and column >= 0 for column in columns):
+        raise ConfigError("'columns' must be column positions")
+    if len(columns) != len(names) or list(columns) != sorted(set(columns)):
+        # read_csv names the columns it reads in file order
+        raise ConfigError("'columns' must be distinct and in file order, with one entry of 'names' each")
+    missing = [name for name in REQUIRED_NAMES if name not in names]
+    if missing:
+        raise ConfigError(f"'names' lacks {', '.join(missing)}")
+
+    if not isinstance(config['days_tolerance'], int) or config['days_tolerance'] < 0:
+        raise ConfigError("'days_tolerance' must be a whole number of days, 0 or more")
+    contra_days = config['contra_days']
+    if contra_days is not None and (not isinstance(contra_days, int) or contra_days < 0):
+        raise ConfigError("'contra_days' must be a whole number of days, 0 or more, or null to keep contras")
+    references = config['references']
+    if references is not None and (
+        not isinstance(references, list) or not all(isinstance(name, str) and name in names for name in references)
+    ):
+        raise ConfigError("'references' must list columns from 'names', or be null")
+    for key in ('amount_tolerance', 'amount_tolerance_percent'):
+        value = config[key]
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0):
+            raise ConfigError(f"'{key}' must be a number, 0 or more, or null")
+    if config['open_items'] is not None and not isinstance(config['open_items'], str):
+        raise ConfigError("'open_items' must be a file path, or null to not carry rows between runs")
+    if isinstance(config['horizon_days'], bool) or not isinstance(config['horizon_days'], int) \
+            or config['horizon_days'] < 0:
+        raise ConfigError("'horizon_days' must be a whole number of days, 0 or more")
+    if not isinstance(config['workers'], int) or config['workers'] < 1:
+        raise ConfigError("'workers' must be 1 or more")
+    if config['engine'] not in ENGINES:
+        raise ConfigError(f"'engine' must be one of {', '.join(ENGINES)}")
+    if config['assignment'] not in ASSIGNMENTS:
+        raise ConfigError(f"'assignment' must be one of {', '.join(ASSIGNMENTS)}")
+    if '{side}' not in config['output']:
+        raise ConfigError("'output' must contain {side}")
+    return config
+
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+
+from .matching import to_days
+
+FIELDS = ['rows', 'credit', 'debit']
+
+# to_days gives missing dates this day number
+_NO_DATE = np.iinfo('int64').min
+
+
+class DailyTotals:
+    # Row count and credit/debit totals per date for two ledgers (sides 1
+    # and 2), held as one int64 array with a row per date. The totals are
+    # built in one pass over each ledger and afterwards only adjusted by the
+    # rows that are added or matched away, so balanced dates, discrepancies
+    # and date filters never need to group the frames again.
+    def __init__(self, df_1, df_2):
+        days_1 = to_days(df_1['date'])
+        days_2 = to_days(df_2['date'])
+        days = np.concatenate([days_1, days_2])
+        self.days = np.unique(days[days != _NO_DATE])
+        self.values = np.zeros((len(self.days), 2 * len(FIELDS)), dtype='int64')
+        self._apply(1, df_1, 1, days_1)
+        self._apply(2, df_2, 1, days_2)
+
+    def _positions(self, days):
+        # Row of each day in self.days, or -1 for days that have no row
+        if len(self.days) == 0:
+            return np.full(len(days), -1)
+        positions = np.searchsorted(self.days, days).clip(max=len(self.days) - 1)
+        return np.where(self.days[positions] == days, positions, -1)
+
+    def _apply(self, side, df, sign, days=None):
+        positions = self._positions(to_days(df['date']) if days is None else days)
+        known = positions >= 0
+        positions = positions[known]
+        offset = (side - 1) * len(FIELDS)
+        np.add.at(self.values[:, offset], positions, sign)
+        for field in ('credit', 'debit'):
+            amounts = df[field].to_numpy(dtype='int64')[known]
+            np.add.at(self.values[:, offset + FIELDS.index(field)], positions, sign * amounts)
+
+    def add(self, side, df):
+        # Rows of df added to ledger `side`; their dates must already be known
+        self._apply(side, df, 1)
+
+    def remove(self, side, df):
+        # Rows of df matched away from ledger `side`
+        self._apply(side, df, -1)
+
+    def column(self, side, field):
+        return self.values[:, (side - 1) * len(FIELDS) + FIELDS.index(field)]
+
+    def in_both(self):
+        return (self.column(1, 'rows') > 0) & (self.column(2, 'rows') > 0)
+
+    def balanced(self, directions=((1, 2), (2, 1))):
+        # Flags for the dates present on both ledgers where, for every
+        # (credit side, debit side) direction, credits equal the debits
+        flags = self.in_both()
+        for credit_side, debit_side in directions:
+            flags &= self.column(credit_side, 'credit') == self.column(debit_side, 'debit')
+        return flags
+
+    def unbalanced(self, directions=((1, 2), (2, 1))):
+        # Flags for the dates present on both ledgers where some direction differs
+        return self.in_both() & ~self.balanced(directions)
+
+    def dates(self, flags=None):
+        days = self.days if flags is None else self.days[flags]
+        return pd.Series(pd.to_datetime(days.astype('datetime64[D]')), name='date')
+
+    def rows_on(self, df, flags):
+        # Boolean mask of the rows of df whose date is flagged
+        positions = self._positions(to_days(df['date']))
+        known = positions >= 0
+        mask = np.zeros(len(positions), dtype=bool)
+        mask[known] = flags[positions[known]]
+        return mask
+
+    def summary(self):
+        # Every date that still has rows on either ledger
+        frame = pd.DataFrame(self.values, columns=[f'{field}_{side}' for side in (1, 2) for field in FIELDS])
+        frame.insert(0, 'date', self.dates())
+        return frame[(frame['rows_1'] > 0) | (frame['rows_2'] > 0)].reset_index(drop=True)
+
+    def differences(self, credit_side=1):
+        # Credits of one ledger against debits of the other for every date
+        # either ledger has rows on
+        debit_side = 3 - credit_side
+        frame = pd.DataFrame({
+            'date': self.dates(),
+            'credit': self.column(credit_side, 'credit'),
+            'debit': self.column(debit_side, 'debit'),
+        })
+        frame['difference'] = frame['credit'] - frame['debit']
+        present = (self.column(1, 'rows') > 0) | (self.column(2, 'rows') > 0)
+        return frame[present].reset_index(drop=True)
@@ -0,0 +1,111 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+NGRAM_SIZE = 3
+
+# Harakat, superscript alef and tatweel carry no meaning for matching
+_DIACRITICS = re.compile('[\u064b-\u0652\u0670\u0640]')
+_FOLD = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+})
+_NON_WORD = re.compile(r'[^\w]+')
+
+
+def normalize_arabic(text):
+    # "دفعة للتوريدات" and "دفعه للتوريدات" both become "دفعه للتوريدات"
+    text = _DIACRITICS.sub('', str(text)).translate(_FOLD).lower()
+    return _NON_WORD.sub(' ', text).strip()
+
+
+def ngrams(text, n=NGRAM_SIZE):
+    # Character n-grams of every word, padded so short words and word
+    # boundaries still produce grams
+    grams = set()
+    for word in text.split():
+        padded = f' {word} '
+        grams.update(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+    return grams
+
+
+class DescriptionIndex:
+    # Character n-gram inverted index over the distinct descriptions of one
+    # ledger. Descriptions repeat a lot, so each is tokenized once however
+    # many rows carry it.
+    def __init__(self, descriptions, n=NGRAM_SIZE):
+        descriptions = pd.Series(descriptions)
+        if isinstance(descriptions.dtype, pd.CategoricalDtype):
+            descriptions = descriptions.cat.categories.to_series()
+        self.descriptions = pd.Index(descriptions.dropna().astype(str).unique())
+        grams = [sorted(ngrams(normalize_arabic(text), n)) for text in self.descriptions]
+        self.sizes = np.array([len(g) for g in grams], dtype='int64')
+        self.offsets = np.concatenate([[0], np.cumsum(self.sizes)])
+
+        # Forward lists (description -> gram ids) and postings (gram id ->
+        # descriptions) share one vocabulary; postings are kept as sorted
+        # gram_id * len(descriptions) + description keys for vectorized lookups
+        gram_ids, vocabulary = pd.factorize(np.array([g for row in grams for g in row], dtype=object))
+        self.gram_ids = gram_ids.astype('int64')
+        self.vocabulary = pd.Index(vocabulary)
+        owners = np.repeat(np.arange(len(self.descriptions)), self.sizes)
+        self.postings = np.sort(self.gram_ids * len(self.descriptions) + owners)
+
+    def codes(self, values):
+        # Position of every value in self.descriptions, -1 when it is unknown
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # The extra trailing -1 is what missing values (code -1) pick up
+            lookup = np.append(self.descriptions.get_indexer(values.cat.categories.astype(str)), -1)
+            return lookup[values.cat.codes.to_numpy()]
+        return self.descriptions.get_indexer(values.astype(str))
+
+    def has_grams(self, codes, gram_ids):
+        # Whether each gram id (of this vocabulary, -1 for unknown grams) is
+        # posted for the description at the same position of codes
+        keys = gram_ids * len(self.descriptions) + codes
+        found = np.searchsorted(self.postings, keys).clip(max=max(len(self.postings) - 1, 0))
+        return (gram_ids >= 0) & (len(self.postings) > 0) & (self.postings[found] == keys)
+
+    def similarity(self, other, codes_self, codes_other):
+        # Jaccard similarity of the n-gram sets for each (codes_self[i],
+        # codes_other[i]) pair. Every distinct pair is scored once, by looking
+        # its grams up in the other index's postings.
+        scores = np.zeros(len(codes_self))
+        known = (codes_self >= 0) & (codes_other >= 0)
+        if not known.any():
+            return scores
+        pairs, inverse = np.unique(
+            codes_self[known] * len(other.descriptions) + codes_other[known], return_inverse=True
+        )
+        left, right = np.divmod(pairs, len(other.descriptions))
+
+        # Expand every pair into the grams of its left description
+        counts = self.sizes[left]
+        pair = np.repeat(np.arange(len(pairs)), counts)
+        starts = np.repeat(self.offsets[left] - np.cumsum(counts) + counts, counts)
+        grams = self.gram_ids[np.arange(counts.sum()) + starts]
+        # Translate gram ids into the other index's vocabulary
+        grams = np.append(other.vocabulary.get_indexer(self.vocabulary), -1)[grams]
+
+        shared = np.bincount(pair, weights=other.has_grams(right[pair], grams), minlength=len(pairs))
+        union = self.sizes[left] + other.sizes[right] - shared
+        pair_scores = np.divide(shared, union, out=np.zeros(len(pairs)), where=union > 0)
+        scores[known] = pair_scores[inverse.ravel()]
+        return scores
+
+
+class DescriptionScorer:
+    # Tie-breaker for the matchers: scores candidate pairs by how similar
+    # their descriptions are, 0 to 1
+    def __init__(self, index_1, index_2, column='dis'):
+        self.index_1 = index_1
+        self.index_2 = index_2
+        self.column = column
+
+    def __call__(self, transactions_1, transactions_2, pos_1, pos_2):
+        codes_1 = self.index_1.codes(transactions_1[self.column])[pos_1]
+        codes_2 = self.index_2.codes(transactions_2[self.column])[pos_2]
+        return self.index_1.similarity(self.index_2, codes_1, codes_2)
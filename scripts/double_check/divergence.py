@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+from .daily_totals import DailyTotals
+
+
+def check_running_balance(df, opening_balance):
+    # Rows, in export order, whose exported balance is not the opening
+    # balance plus the running debits minus credits; expected_balance holds
+    # what it should have been. opening_balance is in currency units, as in
+    # the statement header.
+    opening = int(round(opening_balance * 100))
+    expected = opening + np.cumsum(df['debit'].to_numpy(dtype='int64') - df['credit'].to_numpy(dtype='int64'))
+    broken = expected != df['balance'].to_numpy(dtype='int64')
+    return df[broken].assign(expected_balance=expected[broken])
+
+
+def net_flow_profile(totals):
+    # Cumulative divergence between the ledgers at the end of every date:
+    # ledger 1 credits minus ledger 2 debits, and ledger 2 credits minus
+    # ledger 1 debits. Both stay at zero while every day reconciles.
+    return pd.DataFrame({
+        'date': totals.dates(),
+        'divergence_1': np.cumsum(totals.column(1, 'credit') - totals.column(2, 'debit')),
+        'divergence_2': np.cumsum(totals.column(2, 'credit') - totals.column(1, 'debit')),
+    })
+
+
+def divergence_windows(totals, days_tolerance):
+    # Date ranges the matching stages still have to look at. A window opens
+    # on the date the cumulative divergence leaves its resting level and
+    # closes on the date it returns to it, so differences that offset each
+    # other (a credit on 31/03, its debit on 02/04) fall in one window.
+    # Rows more than days_tolerance days apart never pair, so a level held
+    # unchanged for longer than that becomes the new resting level: an
+    # unmatched row closes its window instead of keeping every later date
+    # open. Windows start days_tolerance days early and end as late, so
+    # every row inside one keeps all of its candidate counterparts.
+    profile = net_flow_profile(totals)
+    levels = profile[['divergence_1', 'divergence_2']].to_numpy()
+    days = totals.days
+    spans = []
+    resting, opened, last_move, moves = (0, 0), None, None, 0
+    for day, level in zip(days, map(tuple, levels)):
+        if opened is not None and level != previous and day - last_move > days_tolerance:
+            # The open window settled at its last level before this move
+            spans.append((opened, last_move, moves, False))
+            resting, opened = previous, None
+        if opened is None:
+            if level != resting:
+                opened, last_move, moves = day, day, 1
+        elif level == resting:
+            spans.append((opened, day, moves + 1, True))
+            opened = None
+        elif level != previous:
+            last_move, moves = day, moves + 1
+        previous = level
+    if opened is not None:
+        spans.append((opened, last_move, moves, False))
+    if not spans:
+        return pd.DataFrame({
+            'start': pd.Series(dtype='datetime64[s]'), 'end': pd.Series(dtype='datetime64[s]'),
+            'moved_dates': pd.Series(dtype='int64'), 'converged': pd.Series(dtype=bool),
+        })
+    opened, closed, moved, converged = (np.array(column) for column in zip(*spans))
+    starts = opened - days_tolerance
+    ends = closed + days_tolerance
+    # Merge overlapping ranges: a new window starts where the previous
+    # range ended before this one begins
+    new_window = np.concatenate([[True], starts[1:] > ends[:-1]])
+    first = np.flatnonzero(new_window)
+    return pd.DataFrame({
+        'start': pd.to_datetime(starts[new_window].astype('datetime64[D]')),
+        'end': pd.to_datetime(np.maximum.reduceat(ends, first).astype('datetime64[D]')),
+        'moved_dates': np.add.reduceat(moved, first),
+        'converged': np.logical_and.reduceat(converged, first),
+    })
+
+
+def in_windows(df, windows):
+    # Boolean mask of the rows of df dated inside one of the windows. Rows
+    # without a date count as inside: no stage can settle them.
+    dates = df['date'].to_numpy()
+    starts = windows['start'].to_numpy().astype(dates.dtype)
+    ends = windows['end'].to_numpy().astype(dates.dtype)
+    position = np.searchsorted(starts, dates, side='right') - 1
+    inside = position >= 0
+    inside[inside] = dates[inside] <= ends[position[inside]]
+    return inside | np.isnat(dates)
+
+
+def divergent_rows(df_1, df_2, days_tolerance, totals=None):
+    # Keep only the rows inside divergence windows. Everything else sits on
+    # dates where both ledgers agree day by day, and is returned as settled.
+    if totals is None:
+        totals = DailyTotals(df_1, df_2)
+    windows = divergence_windows(totals, days_tolerance)
+    keep_1 = in_windows(df_1, windows)
+    keep_2 = in_windows(df_2, windows)
+    return df_1[keep_1], df_2[keep_2], windows
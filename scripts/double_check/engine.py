@@ -0,0 +1,257 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from .config import default_path
+from .instrument import logger
+from .matching import _drop_positions, match_exact
+from .pipeline import DAYS_TOLERANCE, ReconciliationPipeline, _ledger_of
+from .statement import CATEGORY_COLUMNS, COLUMNS, NAMES, load_statement
+
+# Pipeline options the Polars exact join cannot honour: an amount tolerance
+# pairs same-date rows on the closest amounts, which is no join. With one
+# set the statements are still loaded by Polars, and every stage runs in
+# pandas.
+PANDAS_ONLY_OPTIONS = ('amount_tolerance',)
+
+# Options that put pandas work before the exact stage: contras and the
+# divergence prefilter remove rows first, descriptions decide which rows of
+# a bucket pair up. With any of them set the exact join runs on the frames
+# the stages before it leave (see PolarsEngine.exact_stage) instead of in
+# the plan that loads the statements.
+STAGED_OPTIONS = ('prefilter', 'descriptions', 'contra_days')
+
+
+class PandasEngine:
+    # The reference: eager pandas load, then ReconciliationPipeline
+    def __init__(self, names=('hikma', 'tawrdat'), days_tolerance=DAYS_TOLERANCE, columns=COLUMNS,
+                 column_names=NAMES, **pipeline_options):
+        self.names = names
+        self.columns = columns
+        self.column_names = column_names
+        self.pipeline = ReconciliationPipeline(names, days_tolerance, **pipeline_options)
+
+    @property
+    def matches(self):
+        return self.pipeline.matches
+
+    def reconcile(self, path_1, path_2):
+        # Unmatched rows of every side, keyed by side name as in pipeline.run
+        _, df_1 = load_statement(path_1, self.columns, self.column_names)
+        _, df_2 = load_statement(path_2, self.columns, self.column_names)
+        return self.pipeline.run(df_1, df_2)
+
+
+class PolarsEngine:
+    # Load, credit/debit split and the exact stage as one lazy Polars plan:
+    # both files are scanned once, only the transaction columns are parsed,
+    # and the four exact joins run multi-threaded in a single collect. The
+    # leftovers are handed to the pandas stages after 'exact', so the
+    # unmatched sets are the reference engine's. The window, split payment
+    # and balanced stages always run in pandas. Options in STAGED_OPTIONS
+    # split the plan around the pandas stages before 'exact', and options in
+    # PANDAS_ONLY_OPTIONS leave Polars only the load (see reconcile).
+    def __init__(self, names=('hikma', 'tawrdat'), days_tolerance=DAYS_TOLERANCE, columns=COLUMNS,
+                 column_names=NAMES, **pipeline_options):
+        try:
+            import polars
+        except ImportError as e:
+            raise ImportError("The polars engine needs the polars package (pip install polars)") from e
+        self.pl = polars
+        self.names = names
+        self.columns = columns
+        self.column_names = column_names
+        self.pipeline = ReconciliationPipeline(names, days_tolerance, **pipeline_options)
+
+    @property
+    def matches(self):
+        return self.pipeline.matches
+
+    def scan(self, file_path):
+        # Lazy frame of one export in the canonical schema, plus 'row', the
+        # row's position in the file (the pandas engine's index)
+        pl = self.pl
+        # read_csv names usecols in file order, and so does this
+        names = dict(zip(sorted(self.columns), self.column_names))
+        frame = pl.scan_csv(file_path, has_header=False, infer_schema=False).select(
+            pl.nth(position).alias(name) for position, name in names.items()
+        )
+        casts = []
+        for name in self.column_names:
+            column = pl.col(name)
+            if name in ('credit', 'debit', 'balance'):
+                amount = (
+                    column.str.replace_all(',', '', literal=True).str.replace(r'^\((.*)\)$', '-${1}')
+                    .cast(pl.Float64, strict=False).fill_null(0)
+                )
+                casts.append((amount * 100).round().cast(pl.Int64).alias(name))
+            elif name == 'date':
+                casts.append(column.str.strptime(pl.Datetime('us'), '%d/%m/%Y').alias(name))
+            elif name == 'jv number':
+                number = column.str.strip_chars()
+                casts.append(pl.when(number != '').then(number).alias(name))
+        return frame.with_columns(casts).with_row_index('row')
+
+    def pairs(self, credit, debit, sole=False):
+        # match_exact as a join: the n-th row of a (date, amount) bucket on
+        # one side pairs with the n-th row of the same bucket on the other.
+        # With sole, only buckets holding a single row on each side.
+        pl = self.pl
+
+        def keys(frame, field, row):
+            bucket = ('date', field)
+            return frame.filter(pl.col('date').is_not_null()).select(
+                pl.col('row').alias(row), 'date', pl.col(field).alias('amount'),
+                pl.int_range(pl.len()).over(bucket).alias('rank'), pl.len().over(bucket).alias(f'{row}_size'),
+            )
+
+        pairs = keys(credit, 'credit', 'index_1').join(keys(debit, 'debit', 'index_2'), on=['date', 'amount', 'rank'])
+        if sole:
+            pairs = pairs.filter((pl.col('index_1_size') == 1) & (pl.col('index_2_size') == 1))
+        return pairs.sort('index_1').select('index_1', 'index_2', 'date', 'amount')
+
+    def exact(self, credit, debit):
+        pairs = self.pairs(credit, debit)
+        left_credit = credit.join(pairs, left_on='row', right_on='index_1', how='anti').sort('row')
+        left_debit = debit.join(pairs, left_on='row', right_on='index_2', how='anti').sort('row')
+        # The matched rows themselves, for the match ledger
+        taken_credit = credit.join(pairs, left_on='row', right_on='index_1', how='semi').sort('row')
+        taken_debit = debit.join(pairs, left_on='row', right_on='index_2', how='semi').sort('row')
+        return left_credit, left_debit, pairs, taken_credit, taken_debit
+
+    def exact_stage(self, credit_df, debit_df, days_tolerance, workers=1, totals=None, tie_break=None,
+                    amount_tolerance=None):
+        # pipeline.exact_stage with the join run by Polars, for when pandas
+        # stages run before it. A tie_break can only change the pairs of a
+        # bucket with more than one row on a side, so Polars pairs the other
+        # buckets and match_exact the rest; buckets never share a row, so the
+        # pairs are the same as match_exact's over all rows.
+        pl = self.pl
+
+        def keys(df, field):
+            return pl.LazyFrame({
+                'row': np.arange(len(df)), 'date': df['date'].to_numpy(), field: df[field].to_numpy(),
+            })
+
+        pairs = self.pairs(keys(credit_df, 'credit'), keys(debit_df, 'debit'), sole=tie_break is not None).collect()
+        pos_1, pos_2 = pairs['index_1'].to_numpy(), pairs['index_2'].to_numpy()
+        matched = pd.DataFrame({
+            'index_1': credit_df.index[pos_1], 'index_2': debit_df.index[pos_2],
+            'date': pairs['date'].to_numpy(), 'amount': pairs['amount'].to_numpy(),
+        })
+        credit_left, debit_left = _drop_positions(credit_df, pos_1), _drop_positions(debit_df, pos_2)
+        if tie_break is not None:
+            credit_left, debit_left, rest = match_exact(credit_left, debit_left, 'credit', 'debit', tie_break)
+            matched = pd.concat([matched, rest], ignore_index=True)
+        # Reaches the stage report: how many of the pairs the join found
+        matched.attrs = {'polars_pairs': len(pairs)}
+        return credit_left, debit_left, matched
+
+    def pandas_only_options(self):
+        # Read off the pipeline, so an amount tolerance counts however it was
+        # given (absolute, percentage or both) and an empty one does not
+        return [option for option in PANDAS_ONLY_OPTIONS if getattr(self.pipeline, option)]
+
+    def staged_options(self):
+        return [option for option in STAGED_OPTIONS if getattr(self.pipeline, option) not in (None, False)]
+
+    def reconcile(self, path_1, path_2):
+        pl = self.pl
+        name_1, name_2 = self.names
+        frame_1, frame_2 = self.scan(path_1), self.scan(path_2)
+
+        pandas_only = self.pandas_only_options()
+        if pandas_only:
+            logger.warning("polars engine: %s run in pandas; Polars only loads the statements",
+                           ', '.join(pandas_only))
+            frame_1, frame_2 = pl.collect_all([frame_1, frame_2])
+            return self.pipeline.run(_to_pandas(frame_1), _to_pandas(frame_2))
+        if self.staged_options():
+            frame_1, frame_2 = pl.collect_all([frame_1, frame_2])
+            stages = {**self.pipeline.stages(), 'exact': self.exact_stage}
+            return self.pipeline.run(_to_pandas(frame_1), _to_pandas(frame_2), stages)
+
+        credit_1, debit_1 = frame_1.filter(pl.col('credit') != 0), frame_1.filter(pl.col('debit') != 0)
+        credit_2, debit_2 = frame_2.filter(pl.col('credit') != 0), frame_2.filter(pl.col('debit') != 0)
+        keys = [(f'{name_1}_credit', f'{name_2}_debit'), (f'{name_2}_credit', f'{name_1}_debit')]
+        plans = [self.exact(credit_1, debit_2), self.exact(credit_2, debit_1)]
+
+        # One collect for everything, so the shared scans run once
+        collected = iter(pl.collect_all([frame for plan in plans for frame in plan]))
+        pairs = {}
+        for key in keys:
+            credit, debit, matched, taken_credit, taken_debit = (next(collected) for _ in range(5))
+            pairs[key] = (_to_pandas(credit), _to_pandas(debit))
+            matched = pd.DataFrame({column: matched[column].to_numpy() for column in matched.columns})
+            self.pipeline.matches[('exact',) + key] = matched
+            self.pipeline.match_ledger.record(
+                'exact', tuple(_ledger_of(side) for side in key), _to_pandas(taken_credit), _to_pandas(taken_debit),
+                matched,
+            )
+
+        stages = {stage: run_stage for stage, run_stage in self.pipeline.stages().items() if stage != 'exact'}
+        return self.pipeline.run_stages(pairs, stages)
+
+
+def _to_pandas(frame):
+    # Polars frame -> the canonical pandas schema, indexed by 'row'. Built
+    # column by column so pyarrow is not needed.
+    data = {}
+    for column in frame.columns:
+        if column == 'row':
+            continue
+        values = frame[column]
+        if column in CATEGORY_COLUMNS:
+            data[column] = pd.Categorical(values.to_list())
+        else:
+            data[column] = values.to_numpy()
+    return pd.DataFrame(data, index=pd.Index(frame['row'].to_numpy().astype('int64')))
+
+
+ENGINES = {
+    'pandas': PandasEngine,
+    'polars': PolarsEngine,
+}
+
+
+def get_engine(name, **options):
+    return ENGINES[name](**options)
+
+
+def _comparable(results):
+    # Category sets depend on how each engine read the file; compare values
+    return {
+        side: df.astype({column: str for column in CATEGORY_COLUMNS if column in df})
+        for side, df in results.items()
+    }
+
+
+def check_parity(path_1, path_2, engines=('pandas', 'polars'), **options):
+    # Reconcile the same files with every engine and raise AssertionError
+    # unless each side ends up with the same unmatched rows (index included)
+    results = {name: _comparable(get_engine(name, **options).reconcile(path_1, path_2)) for name in engines}
+    reference, *others = engines
+    for name in others:
+        assert results[name].keys() == results[reference].keys(), name
+        for side, df in results[reference].items():
+            pd.testing.assert_frame_equal(results[name][side], df, check_index_type=False, obj=f'{name} {side}')
+    return results[reference]
+
+
+if __name__ == '__main__':
+    from .synthetic import generate_ledger_pair, write_export
+
+    check_parity(default_path('../data/source/hikma.csv'), default_path('../data/source/tawrdat.csv'))
+    print("Engines agree on the source statements")
+    rows = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    with tempfile.TemporaryDirectory() as workdir:
+        for count in rows:
+            ledger_1, ledger_2 = generate_ledger_pair(count, seed=count)
+            path_1, path_2 = os.path.join(workdir, 'ledger_1.csv'), os.path.join(workdir, 'ledger_2.csv')
+            write_export(ledger_1, path_1)
+            write_export(ledger_2, path_2)
+            check_parity(path_1, path_2, names=('ledger_1', 'ledger_2'))
+            print(f"Engines agree on {count} synthetic rows")
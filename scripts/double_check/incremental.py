@@ -0,0 +1,161 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .cache import arrays_to_frame, frame_to_arrays
+from .config import default_path
+from .matching import to_days
+from .pipeline import DAYS_TOLERANCE, exact_stage, split_credit_debit, window_stage
+
+STATE_PATH = default_path('../data/state/reconciliation.npz')
+
+# The stages an incremental run re-applies to the affected dates
+INCREMENTAL_STAGES = {
+    'exact': exact_stage,
+    'window': window_stage,
+}
+
+
+def empty_pairs():
+    return pd.DataFrame({
+        'stage': pd.Series(dtype=str),
+        'credit_side': pd.Series(dtype=str),
+        'credit_row': pd.Series(dtype='int64'),
+        'debit_row': pd.Series(dtype='int64'),
+    })
+
+
+def fingerprint(df):
+    # Cheap content hash of the rows already reconciled, to detect exports
+    # that were edited rather than appended to
+    if df.empty:
+        return '0'
+    hashed = pd.util.hash_pandas_object(df[['date', 'jv number', 'credit', 'debit']], index=False)
+    return str(int(hashed.to_numpy().sum(dtype='uint64')))
+
+
+def _near(days, centers, distance):
+    # True where a day lies within distance of any of the (sorted) center days
+    if len(centers) == 0:
+        return np.zeros(len(days), dtype=bool)
+    right = np.searchsorted(centers, days, side='left').clip(max=len(centers) - 1)
+    left = (right - 1).clip(min=0)
+    return np.minimum(np.abs(centers[right] - days), np.abs(days - centers[left])) <= distance
+
+
+class IncrementalReconciliation:
+    def __init__(self, state_path=STATE_PATH, names=('hikma', 'tawrdat'), days_tolerance=DAYS_TOLERANCE):
+        self.state_path = state_path
+        self.names = names
+        self.days_tolerance = days_tolerance
+        self.seen = {name: 0 for name in names}
+        self.fingerprints = {name: '0' for name in names}
+        self.pairs = empty_pairs()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.state_path):
+            return
+        with np.load(self.state_path, allow_pickle=False) as state:
+            meta = json.loads(str(state['meta']))
+            pairs = arrays_to_frame(state, meta['columns'], meta['kinds'])
+        # A state built for other ledgers or another tolerance cannot be extended
+        if meta['names'] != list(self.names) or meta['days_tolerance'] != self.days_tolerance:
+            return
+        self.seen = meta['seen']
+        self.fingerprints = meta['fingerprints']
+        self.pairs = pairs
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        arrays, kinds = frame_to_arrays(self.pairs)
+        meta = json.dumps({
+            'names': list(self.names),
+            'days_tolerance': self.days_tolerance,
+            'seen': self.seen,
+            'fingerprints': self.fingerprints,
+            'columns': list(self.pairs.columns),
+            'kinds': kinds,
+        })
+        partial_path = self.state_path + '.partial'
+        with open(partial_path, 'wb') as f:
+            np.savez(f, meta=np.array(meta), **arrays)
+        os.replace(partial_path, self.state_path)
+
+    def update(self, df_1, df_2):
+        # df_1 and df_2 are the full current exports, indexed by row number.
+        # Rows past what the saved state has seen are new; if anything before
+        # that changed, everything is re-matched from scratch.
+        ledgers = dict(zip(self.names, (df_1, df_2)))
+        for name, df in ledgers.items():
+            seen = self.seen[name]
+            if seen > len(df) or fingerprint(df.iloc[:seen]) != self.fingerprints[name]:
+                self.seen = {name: 0 for name in self.names}
+                self.pairs = empty_pairs()
+                break
+
+        name_1, name_2 = self.names
+        for credit_side, debit_side in ((name_1, name_2), (name_2, name_1)):
+            credit_df, _ = split_credit_debit(ledgers[credit_side])
+            _, debit_df = split_credit_debit(ledgers[debit_side])
+            self.update_direction(credit_side, credit_df, debit_df, self.seen[credit_side], self.seen[debit_side])
+
+        for name, df in ledgers.items():
+            self.seen[name] = len(df)
+            self.fingerprints[name] = fingerprint(df)
+        self.save()
+        return self.unmatched(ledgers)
+
+    def update_direction(self, credit_side, credit_df, debit_df, seen_credit, seen_debit):
+        credit_days = to_days(credit_df['date'])
+        debit_days = to_days(debit_df['date'])
+        new_days = np.unique(np.concatenate([
+            credit_days[credit_df.index >= seen_credit],
+            debit_days[debit_df.index >= seen_debit],
+        ]))
+        if len(new_days) == 0:
+            return
+
+        # Pairs touching a date within the tolerance of a new row are undone;
+        # their rows and every open row within twice the tolerance (the
+        # furthest a released row can sit) are matched again
+        tolerance = self.days_tolerance
+        in_window_credit = credit_df.index[_near(credit_days, new_days, tolerance)]
+        in_window_debit = debit_df.index[_near(debit_days, new_days, tolerance)]
+        pairs = self.pairs
+        direction = pairs['credit_side'] == credit_side
+        undone = direction & (
+            pairs['credit_row'].isin(in_window_credit) | pairs['debit_row'].isin(in_window_debit)
+        )
+        kept = pairs[direction & ~undone]
+
+        rerun_credit = credit_df[
+            _near(credit_days, new_days, 2 * tolerance) & ~credit_df.index.isin(kept['credit_row'])
+        ]
+        rerun_debit = debit_df[
+            _near(debit_days, new_days, 2 * tolerance) & ~debit_df.index.isin(kept['debit_row'])
+        ]
+
+        found = []
+        for stage, run_stage in INCREMENTAL_STAGES.items():
+            rerun_credit, rerun_debit, matched = run_stage(rerun_credit, rerun_debit, tolerance)
+            found.append(pd.DataFrame({
+                'stage': stage,
+                'credit_side': credit_side,
+                'credit_row': matched['index_1'].to_numpy(dtype='int64'),
+                'debit_row': matched['index_2'].to_numpy(dtype='int64'),
+            }))
+        self.pairs = pd.concat([pairs[~undone]] + found, ignore_index=True)
+
+    def unmatched(self, ledgers):
+        # Open rows per side, in the same {side: frame} shape as the pipeline
+        results = {}
+        for credit_side, debit_side in (self.names, self.names[::-1]):
+            pairs = self.pairs[self.pairs['credit_side'] == credit_side]
+            credit_df, _ = split_credit_debit(ledgers[credit_side])
+            _, debit_df = split_credit_debit(ledgers[debit_side])
+            results[f'{credit_side}_credit'] = credit_df[~credit_df.index.isin(pairs['credit_row'])]
+            results[f'{debit_side}_debit'] = debit_df[~debit_df.index.isin(pairs['debit_row'])]
+        return results
@@ -0,0 +1,49 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .statement import COLUMNS, NAMES, load_statement
+
+# Below this many files they are parsed in this process: starting worker
+# processes, each importing pandas, costs more than parsing a few exports
+MIN_POOL_FILES = 4
+
+
+def parse_statement(file_path, columns=COLUMNS, names=NAMES):
+    # Runs in a worker process: a path in, typed (header, frame) out. The
+    # worker streams the file through load_statement's chunked reader, so
+    # the raw export is never held whole, here or in the caller.
+    return load_statement(file_path, columns, names)
+
+
+def ingest(file_paths, columns=COLUMNS, names=NAMES, parse_workers=None, max_in_flight=None):
+    # Yields (file_path, header, df) for every file, in the order given.
+    # Files are read and parsed on a process pool, so the next files are
+    # parsed while the caller works on this one. At most max_in_flight files
+    # are in a worker or parsed but not yet handed over, which bounds memory
+    # however long the list is. A file is yielded as soon as it and every
+    # file before it is ready.
+    file_paths = list(file_paths)
+    parse_workers = min(parse_workers or os.cpu_count() or 1, len(file_paths))
+    if len(file_paths) < MIN_POOL_FILES or parse_workers <= 1:
+        for file_path in file_paths:
+            yield (file_path, *load_statement(file_path, columns, names))
+        return
+    max_in_flight = max_in_flight or 2 * parse_workers
+
+    with ProcessPoolExecutor(parse_workers) as parsers:
+        remaining = iter(file_paths)
+        pending = deque()
+        for file_path in remaining:
+            pending.append((file_path, parsers.submit(parse_statement, file_path, columns, names)))
+            if len(pending) >= max_in_flight:
+                break
+        while pending:
+            file_path, parsed = pending.popleft()
+            header, df = parsed.result()
+            # Free the slot before handing the frame over, so the pool keeps
+            # working while the caller does
+            next_path = next(remaining, None)
+            if next_path is not None:
+                pending.append((next_path, parsers.submit(parse_statement, next_path, columns, names)))
+            yield file_path, header, df
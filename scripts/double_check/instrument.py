@@ -0,0 +1,73 @@
+import json
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger('double_check')
+
+
+class NullSink:
+    def write(self, records):
+        pass
+
+
+class JsonSink:
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def write(self, records):
+        os.makedirs(os.path.dirname(self.file_path) or '.', exist_ok=True)
+        with open(self.file_path, 'w', encoding='utf-8') as f:
+            json.dump({'stages': records}, f, indent=2, default=str)
+
+
+class LoggingSink:
+    def __init__(self, level=logging.INFO):
+        self.level = level
+
+    def write(self, records):
+        for record in records:
+            logger.log(self.level, '%s %s: %.3fs, rows %s -> %s, %s matches',
+                       record['stage'], record.get('pair', ''), record['wall_seconds'],
+                       record.get('rows_in'), record.get('rows_out'), record.get('matches'))
+
+
+class Instrumentation:
+    def __init__(self, sink=None, profile_memory=False):
+        self.sink = sink or NullSink()
+        self.profile_memory = profile_memory
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, **context):
+        # Time a stage; the caller fills rows_in and rows_out (row counts per
+        # side), matches and rows_matched (rows paired away) in the yielded
+        # record
+        record = {'stage': name, **context}
+        if self.profile_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        started_wall, started_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_seconds'] = time.perf_counter() - started_wall
+            record['cpu_seconds'] = time.process_time() - started_cpu
+            record['peak_bytes'] = tracemalloc.get_traced_memory()[1] if self.profile_memory else None
+            # Share of the incoming rows the stage paired, and how many it
+            # removed without pairing them (balanced dates, rows outside the
+            # divergence windows)
+            if 'rows_matched' in record:
+                rows_in = sum(record.get('rows_in', {}).values())
+                rows_out = sum(record.get('rows_out', {}).values())
+                record['match_rate'] = record['rows_matched'] / rows_in if rows_in else None
+                record['rows_dropped'] = rows_in - rows_out - record['rows_matched']
+            self.records.append(record)
+
+    def close(self):
+        if self.profile_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.sink.write(self.records)
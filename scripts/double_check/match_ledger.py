@@ -0,0 +1,246 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from .archive import NO_DAY
+from .config import default_path
+from .matching import to_days
+
+MATCH_LEDGER_PATH = default_path('../data/reports/match_ledger.npz')
+
+# Placeholder for the missing side of an entry: rows a stage removed
+# without pairing them (balanced dates, rows outside divergence windows)
+NO_ROW = -1
+NO_GROUP = -1
+NO_JV_NUMBER = -1
+
+# Entry columns and their on-disk dtypes. Side 1 is always the credit row,
+# side 2 the debit row of the other ledger; rows are the index labels of
+# the loaded statements, i.e. their position in the export. JV numbers are
+# codes into MatchLedger.jv_numbers.
+FIELDS = {
+    'stage': 'int8',
+    'ledger_1': 'int8', 'row_1': 'int64', 'jv_number_1': 'int32', 'day_1': 'int32', 'amount_1': 'int64',
+    'ledger_2': 'int8', 'row_2': 'int64', 'jv_number_2': 'int32', 'day_2': 'int32', 'amount_2': 'int64',
+    'gap_days': 'int32',
+    'group': 'int32',
+}
+
+
+def _take(values, positions, missing):
+    # values[positions], with missing wherever a position is -1
+    values = np.asarray(values)
+    if len(values) == 0:
+        return np.full(len(positions), missing)
+    return np.where(positions >= 0, values[positions.clip(min=0)], missing)
+
+
+def _row_columns(df, field, jv_codes):
+    # Entry columns of one side, for every row of df
+    if 'jv number' in df:
+        jv_numbers = jv_codes(df['jv number'])
+    else:
+        jv_numbers = np.full(len(df), NO_JV_NUMBER)
+    dates = df['date']
+    days = np.where(dates.isna().to_numpy(), NO_DAY, to_days(dates)) if len(df) else np.empty(0, 'int64')
+    return {
+        'row': df.index.to_numpy(dtype='int64'),
+        'jv_number': jv_numbers,
+        'day': days,
+        'amount': df[field].to_numpy(dtype='int64'),
+    }
+
+
+def _hash_index(keys_1, keys_2):
+    # Key -> entries holding it on either side: a dict from key to a slot,
+    # and the entries of slot i at entries[starts[i]:starts[i + 1]]
+    keys = np.concatenate([keys_1, keys_2])
+    entries = np.concatenate([np.arange(len(keys_1)), np.arange(len(keys_2))])
+    valid = keys >= 0
+    keys, entries = keys[valid], entries[valid]
+    order = np.argsort(keys, kind='stable')
+    keys, entries = keys[order], entries[order]
+    unique, starts = np.unique(keys, return_index=True)
+    slots = dict(zip(unique.tolist(), range(len(unique))))
+    return slots, np.append(starts, len(keys)), entries
+
+
+class MatchLedger:
+    # Every pairing (and every unpaired removal) the pipeline made, one
+    # entry per pair, as compact columns. Hash indexes on (ledger, row) and
+    # (ledger, JV number) answer "what happened to this row" without running
+    # the reconciliation again.
+    def __init__(self):
+        self.stages = []
+        self.ledgers = []
+        self.jv_numbers = []
+        self._jv_codes = {}
+        self.chunks = []
+        self._columns = None
+        self._indexes = None
+
+    def __len__(self):
+        return len(self.columns()['stage'])
+
+    def _code(self, names, name):
+        if name not in names:
+            names.append(name)
+        return names.index(name)
+
+    def jv_codes(self, values):
+        # Codes into self.jv_numbers for a column of JV numbers, adding the
+        # ones not seen yet; NO_JV_NUMBER where the number is missing
+        values = values.astype('category').cat.remove_unused_categories()
+        for jv_number in map(str, values.cat.categories):
+            if jv_number not in self._jv_codes:
+                self._jv_codes[jv_number] = len(self.jv_numbers)
+                self.jv_numbers.append(jv_number)
+        lookup = np.array(
+            [self._jv_codes[str(jv_number)] for jv_number in values.cat.categories] + [NO_JV_NUMBER], dtype='int64'
+        )
+        return lookup[values.cat.codes.to_numpy()]
+
+    def record(self, stage, ledgers, credit_removed, debit_removed, matched):
+        # One stage's work on one pair: credit_removed and debit_removed are
+        # the rows it took from each side, matched the frame it returned
+        # (pairs when it has index_1 and index_2 columns)
+        if 'index_1' in matched and 'index_2' in matched:
+            pos_1 = credit_removed.index.get_indexer(matched['index_1'])
+            pos_2 = debit_removed.index.get_indexer(matched['index_2'])
+            paired = (pos_1 >= 0) & (pos_2 >= 0)
+            pos_1, pos_2 = pos_1[paired], pos_2[paired]
+            groups = matched['group'].to_numpy()[paired] if 'group' in matched else np.full(len(pos_1), NO_GROUP)
+        else:
+            pos_1 = pos_2 = groups = np.empty(0, dtype='int64')
+        alone_1 = np.setdiff1d(np.arange(len(credit_removed)), pos_1)
+        alone_2 = np.setdiff1d(np.arange(len(debit_removed)), pos_2)
+        pos_1 = np.concatenate([pos_1, alone_1, np.full(len(alone_2), NO_ROW)]).astype('int64')
+        pos_2 = np.concatenate([pos_2, np.full(len(alone_1), NO_ROW), alone_2]).astype('int64')
+        groups = np.concatenate([groups, np.full(len(alone_1) + len(alone_2), NO_GROUP)])
+        if len(pos_1) == 0:
+            return
+
+        side_1 = _row_columns(credit_removed, 'credit', self.jv_codes)
+        side_2 = _row_columns(debit_removed, 'debit', self.jv_codes)
+        missing = {'row': NO_ROW, 'jv_number': NO_JV_NUMBER, 'day': NO_DAY, 'amount': 0}
+        chunk = {'stage': np.full(len(pos_1), self._code(self.stages, stage))}
+        for suffix, side, positions, ledger in (('1', side_1, pos_1, ledgers[0]), ('2', side_2, pos_2, ledgers[1])):
+            chunk[f'ledger_{suffix}'] = np.full(len(positions), self._code(self.ledgers, ledger))
+            for name, values in side.items():
+                chunk[f'{name}_{suffix}'] = _take(values, positions, missing[name])
+        both = (chunk['day_1'] != NO_DAY) & (chunk['day_2'] != NO_DAY)
+        chunk['gap_days'] = np.where(both, chunk['day_2'] - chunk['day_1'], NO_DAY)
+        chunk['group'] = groups
+        self.chunks.append({name: chunk[name].astype(dtype) for name, dtype in FIELDS.items()})
+        self._columns = self._indexes = None
+
+    def columns(self):
+        if self._columns is None:
+            self._columns = {
+                name: np.concatenate([chunk[name] for chunk in self.chunks]) if self.chunks else np.empty(0, dtype)
+                for name, dtype in FIELDS.items()
+            }
+            self.chunks = [self._columns] if self.chunks else []
+        return self._columns
+
+    def indexes(self):
+        # Built on the first lookup and reused for every later one
+        if self._indexes is None:
+            columns = self.columns()
+
+            def row_keys(suffix):
+                rows = columns[f'row_{suffix}']
+                return np.where(rows >= 0, columns[f'ledger_{suffix}'].astype('int64') << 40 | rows, -1)
+
+            def jv_keys(suffix):
+                jv_numbers = columns[f'jv_number_{suffix}'].astype('int64')
+                keys = columns[f'ledger_{suffix}'].astype('int64') << 32 | jv_numbers
+                return np.where(jv_numbers != NO_JV_NUMBER, keys, -1)
+
+            self._indexes = {
+                'row': _hash_index(row_keys('1'), row_keys('2')),
+                'jv number': _hash_index(jv_keys('1'), jv_keys('2')),
+            }
+        return self._indexes
+
+    def _lookup(self, index, key):
+        slots, starts, entries = self.indexes()[index]
+        slot = slots.get(key)
+        if slot is None:
+            return np.empty(0, dtype='int64')
+        return entries[starts[slot]:starts[slot + 1]]
+
+    def find_row(self, ledger, row):
+        # Entries of one row of one ledger (a split payment has several)
+        if ledger not in self.ledgers:
+            return self.entries([])
+        return self.entries(self._lookup('row', self.ledgers.index(ledger) << 40 | int(row)))
+
+    def find_jv_number(self, jv_number, ledger=None):
+        # Entries of every row carrying the JV number, in one or all ledgers
+        code = self._jv_codes.get(str(jv_number).strip())
+        if code is None:
+            return self.entries([])
+        ledgers = [ledger] if ledger is not None else self.ledgers
+        positions = [
+            self._lookup('jv number', self.ledgers.index(name) << 32 | code)
+            for name in ledgers if name in self.ledgers
+        ]
+        return self.entries(np.unique(np.concatenate(positions)) if positions else [])
+
+    def entries(self, positions=None):
+        # Readable frame of the given entries (all of them by default)
+        columns = self.columns()
+        positions = slice(None) if positions is None else np.asarray(positions, dtype='int64')
+        data = {'stage': pd.Categorical.from_codes(columns['stage'][positions], self.stages)}
+        for suffix in ('1', '2'):
+            rows = columns[f'row_{suffix}'][positions]
+            days = columns[f'day_{suffix}'][positions]
+            jv_numbers = columns[f'jv_number_{suffix}'][positions]
+            data[f'ledger_{suffix}'] = pd.Categorical.from_codes(columns[f'ledger_{suffix}'][positions], self.ledgers)
+            data[f'row_{suffix}'] = pd.Series(rows).astype('Int64').mask(rows == NO_ROW)
+            data[f'jv_number_{suffix}'] = pd.Categorical.from_codes(jv_numbers, self.jv_numbers)
+            data[f'date_{suffix}'] = pd.Series(
+                days.astype('int64').astype('datetime64[D]').astype('datetime64[us]')
+            ).mask(days == NO_DAY)
+            data[f'amount_{suffix}'] = columns[f'amount_{suffix}'][positions]
+        gap_days = columns['gap_days'][positions]
+        data['gap_days'] = pd.Series(gap_days).astype('Int32').mask(gap_days == NO_DAY)
+        data['group'] = columns['group'][positions]
+        return pd.DataFrame(data)
+
+    def save(self, file_path=MATCH_LEDGER_PATH):
+        # Written next to the target and moved into place, so an interrupted
+        # run leaves the previous ledger readable
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        columns = self.columns()
+        partial_path = file_path + '.partial'
+        with open(partial_path, 'wb') as f:
+            np.savez(
+                f, stages=np.array(self.stages, dtype=str), ledgers=np.array(self.ledgers, dtype=str),
+                jv_numbers=np.array(self.jv_numbers, dtype=str), **columns,
+            )
+        os.replace(partial_path, file_path)
+
+    @classmethod
+    def load(cls, file_path=MATCH_LEDGER_PATH):
+        ledger = cls()
+        with np.load(file_path, allow_pickle=False) as stored:
+            ledger.stages = stored['stages'].tolist()
+            ledger.ledgers = stored['ledgers'].tolist()
+            ledger.jv_numbers = stored['jv_numbers'].tolist()
+            ledger._jv_codes = {jv_number: code for code, jv_number in enumerate(ledger.jv_numbers)}
+            ledger.chunks = [{name: stored[name] for name in FIELDS}]
+        return ledger
+
+
+if __name__ == '__main__':
+    # python -m double_check.match_ledger <jv number> [ledger]
+    ledger = MatchLedger.load()
+    found = ledger.find_jv_number(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    if len(found):
+        print(found.to_string(index=False))
+    else:
+        print(f"JV {sys.argv[1]} was not matched or removed by any stage")
@@ -0,0 +1,356 @@
+import numpy as np
+import pandas as pd
+
+MAX_SPLIT_PARTS = 4
+MAX_SPLIT_CANDIDATES = 20
+
+# Resolution of tie-break scores: candidates whose dates are equally close
+# are ordered by their score rounded to 1/TIE_LEVELS
+TIE_LEVELS = 1000
+
+
+class AmountTolerance:
+    # How far apart two amounts may be and still match: absolute cents or a
+    # percentage of the amount, whichever allows more. Bank fees, FX rounding
+    # and short payments leave small differences between the ledgers. A pair
+    # may differ by the larger of its two amounts' limits, so whether two
+    # rows match never depends on which ledger is passed first.
+    def __init__(self, absolute=0, percent=0.0):
+        self.absolute = int(absolute)
+        self.percent = float(percent)
+
+    def __bool__(self):
+        return self.absolute > 0 or self.percent > 0
+
+    def __repr__(self):
+        return f'AmountTolerance(absolute={self.absolute}, percent={self.percent})'
+
+    def limits(self, amounts):
+        # Largest allowed difference, in cents, for each amount; a pair is
+        # held to the larger of its two amounts' limits
+        amounts = np.abs(np.asarray(amounts, dtype='int64'))
+        relative = np.floor(amounts * (self.percent / 100)).astype('int64')
+        return np.maximum(relative, self.absolute)
+
+
+def _bucket_rank(df, keys):
+    # Position of each row inside its (date, amount) bucket, in original row order
+    return df.groupby(keys, sort=False).cumcount()
+
+
+def _drop_positions(df, positions):
+    # Drop rows by position, so duplicate index labels cannot drop extra rows
+    keep = np.ones(len(df), dtype=bool)
+    keep[np.asarray(positions, dtype='int64')] = False
+    return df[keep]
+
+
+def match_exact(transactions_1, transactions_2, field_1, field_2, tie_break=None, amount_tolerance=None):
+    # Key both sides on (date, amount) plus the row's rank inside that bucket.
+    # The n-th row of a bucket on one side pairs with the n-th row of the same
+    # bucket on the other side, which is exactly what a row-by-row "first unused
+    # counterpart wins" scan produces. With a tie_break (see match_window) a
+    # bucket pairs its best-scoring rows first instead. With an
+    # amount_tolerance same-date rows pair on the closest amounts, and the
+    # result gains amount_difference.
+    if tie_break is not None or amount_tolerance:
+        unmatched_1, unmatched_2, matched = match_window(
+            transactions_1, transactions_2, field_1, field_2, 0, tie_break, amount_tolerance
+        )
+        columns = ['index_1', 'index_2', 'date', 'amount'] + (['amount_difference'] if amount_tolerance else [])
+        return unmatched_1, unmatched_2, matched.rename(columns={'date_1': 'date'})[columns]
+
+    keys_1 = pd.DataFrame({
+        'date': transactions_1['date'].to_numpy(),
+        'amount': transactions_1[field_1].to_numpy(),
+        'pos_1': np.arange(len(transactions_1)),
+    })
+    keys_2 = pd.DataFrame({
+        'date': transactions_2['date'].to_numpy(),
+        'amount': transactions_2[field_2].to_numpy(),
+        'pos_2': np.arange(len(transactions_2)),
+    })
+    # Missing dates or amounts never compare equal, so keep them out of the join
+    keys_1 = keys_1.dropna(subset=['date', 'amount'])
+    keys_2 = keys_2.dropna(subset=['date', 'amount'])
+    keys_1['rank'] = _bucket_rank(keys_1, ['date', 'amount'])
+    keys_2['rank'] = _bucket_rank(keys_2, ['date', 'amount'])
+
+    pairs = pd.merge(keys_1, keys_2, on=['date', 'amount', 'rank'])
+    pairs = pairs.sort_values('pos_1', kind='stable')
+    matched = pd.DataFrame({
+        'index_1': transactions_1.index[pairs['pos_1']],
+        'index_2': transactions_2.index[pairs['pos_2']],
+        'date': pairs['date'].to_numpy(),
+        'amount': pairs['amount'].to_numpy(),
+    })
+
+    # Drop the matched transactions from both dataframes
+    unmatched_1 = _drop_positions(transactions_1, pairs['pos_1'])
+    unmatched_2 = _drop_positions(transactions_2, pairs['pos_2'])
+
+    return unmatched_1, unmatched_2, matched
+
+
+def to_days(dates):
+    # Calendar day number for each date, as int64
+    return pd.to_datetime(dates).to_numpy().astype('datetime64[D]').astype('int64')
+
+
+def _window_candidates(days_1, codes_1, days_2, codes_2, days_tolerance):
+    # Sort side 2 by (amount, date) and find, for every side 1 row, the slice of
+    # side 2 rows with the same amount and a date inside the tolerance window.
+    # The composite key keeps amounts apart by a stride wider than any window.
+    offset = min(days_1.min(), days_2.min())
+    stride = max(days_1.max(), days_2.max()) - offset + 2 * days_tolerance + 1
+    key_1 = codes_1 * stride + (days_1 - offset + days_tolerance)
+    key_2 = codes_2 * stride + (days_2 - offset + days_tolerance)
+
+    order_2 = np.argsort(key_2, kind='stable')
+    sorted_key_2 = key_2[order_2]
+    lo = np.searchsorted(sorted_key_2, key_1 - days_tolerance, side='left')
+    hi = np.searchsorted(sorted_key_2, key_1 + days_tolerance, side='right')
+
+    # Expand each side 1 row into its candidate pairs; the total is the number
+    # of real candidates, never the product of the two ledger sizes
+    counts = hi - lo
+    pos_1 = np.repeat(np.arange(len(key_1)), counts)
+    starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+    pos_2 = order_2[np.arange(counts.sum()) + starts]
+    return pos_1, pos_2
+
+
+def _tolerance_candidates(days_1, amounts_1, days_2, amounts_2, days_tolerance, limits):
+    # _window_candidates for amounts that may differ by up to limits[i] cents.
+    # Side 2 is sorted once by (date, amount); for each date offset in the
+    # window, the allowed amounts of one side 1 row are a contiguous run of
+    # that order, found with two binary searches.
+    low = min((amounts_1 - limits).min(), amounts_2.min())
+    stride = max((amounts_1 + limits).max(), amounts_2.max()) - low + 1
+    offset = min(days_1.min(), days_2.min()) - days_tolerance
+    key_2 = (days_2 - offset) * stride + (amounts_2 - low)
+    order_2 = np.argsort(key_2, kind='stable')
+    sorted_key_2 = key_2[order_2]
+
+    pos_1, pos_2 = [], []
+    for shift in range(-days_tolerance, days_tolerance + 1):
+        base = (days_1 + shift - offset) * stride - low
+        lo = np.searchsorted(sorted_key_2, base + amounts_1 - limits, side='left')
+        hi = np.searchsorted(sorted_key_2, base + amounts_1 + limits, side='right')
+        counts = hi - lo
+        pos_1.append(np.repeat(np.arange(len(days_1)), counts))
+        starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+        pos_2.append(order_2[np.arange(counts.sum()) + starts])
+    return np.concatenate(pos_1), np.concatenate(pos_2)
+
+
+def _greedy_pairs(pos_1, pos_2, cost):
+    # Greedy one-to-one assignment: walk the candidates once in (cost, pos_1,
+    # pos_2) order and take every pair whose rows are both still free. The
+    # sort dominates, so the cost grows with the number of candidates however
+    # many rows share one amount.
+    empty = np.array([], dtype='int64')
+    if not len(pos_1):
+        return empty, empty
+    order = np.lexsort((pos_2, pos_1, cost))
+    pos_1, pos_2 = pos_1[order], pos_2[order]
+    used_1 = np.zeros(pos_1.max() + 1, dtype=bool)
+    used_2 = np.zeros(pos_2.max() + 1, dtype=bool)
+    # No more pairs can be taken once either side runs out of rows
+    limit = min(len(np.unique(pos_1)), len(np.unique(pos_2)))
+    taken = []
+    for i, (row_1, row_2) in enumerate(zip(pos_1.tolist(), pos_2.tolist())):
+        if used_1[row_1] or used_2[row_2]:
+            continue
+        used_1[row_1] = used_2[row_2] = True
+        taken.append(i)
+        if len(taken) == limit:
+            break
+    taken = np.array(taken, dtype='int64')
+    return pos_1[taken], pos_2[taken]
+
+
+def _window_costs(transactions_1, transactions_2, field_1, field_2, days_tolerance, tie_break=None,
+                  amount_tolerance=None):
+    # Every allowed (pos_1, pos_2) pair: equal amounts (or within
+    # amount_tolerance), dates at most days_tolerance apart. Its cost is the
+    # amount difference, then the date gap, refined by the tie_break score
+    # when one is given.
+    valid_1 = transactions_1['date'].notna().to_numpy() & transactions_1[field_1].notna().to_numpy()
+    valid_2 = transactions_2['date'].notna().to_numpy() & transactions_2[field_2].notna().to_numpy()
+    rows_1 = np.flatnonzero(valid_1)
+    rows_2 = np.flatnonzero(valid_2)
+
+    empty = np.array([], dtype='int64')
+    if not (len(rows_1) and len(rows_2)):
+        return empty, empty, empty
+    days_1 = to_days(transactions_1['date'].iloc[rows_1])
+    days_2 = to_days(transactions_2['date'].iloc[rows_2])
+    if amount_tolerance:
+        amounts_1 = transactions_1[field_1].to_numpy(dtype='int64')[rows_1]
+        amounts_2 = transactions_2[field_2].to_numpy(dtype='int64')[rows_2]
+        # Candidates within side 1's limits, and within side 2's looked up
+        # from side 2
+        forward = _tolerance_candidates(
+            days_1, amounts_1, days_2, amounts_2, days_tolerance, amount_tolerance.limits(amounts_1)
+        )
+        backward = _tolerance_candidates(
+            days_2, amounts_2, days_1, amounts_1, days_tolerance, amount_tolerance.limits(amounts_2)
+        )
+        pairs = np.unique(np.concatenate([
+            forward[0] * len(rows_2) + forward[1], backward[1] * len(rows_2) + backward[0],
+        ]))
+        cand_1, cand_2 = pairs // len(rows_2), pairs % len(rows_2)
+        difference = np.abs(amounts_2[cand_2] - amounts_1[cand_1])
+    else:
+        amounts = pd.concat([transactions_1[field_1].iloc[rows_1], transactions_2[field_2].iloc[rows_2]])
+        codes, _ = pd.factorize(amounts)
+        codes = codes.astype('int64')
+        cand_1, cand_2 = _window_candidates(
+            days_1, codes[:len(rows_1)], days_2, codes[len(rows_1):], days_tolerance
+        )
+        difference = 0
+    # Closest amounts first, so a tolerated pair never takes a row that has
+    # an exact counterpart in the window
+    cost = difference * (days_tolerance + 1) + np.abs(days_1[cand_1] - days_2[cand_2])
+    cand_1, cand_2 = rows_1[cand_1], rows_2[cand_2]
+    if tie_break is not None and len(cand_1):
+        score = np.round(tie_break(transactions_1, transactions_2, cand_1, cand_2) * TIE_LEVELS)
+        cost = cost * (TIE_LEVELS + 1) + (TIE_LEVELS - score.astype('int64'))
+    return cand_1, cand_2, cost
+
+
+def _window_result(transactions_1, transactions_2, field_1, field_2, pos_1, pos_2):
+    order = np.argsort(pos_1, kind='stable')
+    pos_1, pos_2 = pos_1[order], pos_2[order]
+    matched = pd.DataFrame({
+        'index_1': transactions_1.index[pos_1],
+        'index_2': transactions_2.index[pos_2],
+        'date_1': transactions_1['date'].to_numpy()[pos_1],
+        'date_2': transactions_2['date'].to_numpy()[pos_2],
+        'amount': transactions_1[field_1].to_numpy()[pos_1],
+    })
+    matched['gap_days'] = to_days(matched['date_2']) - to_days(matched['date_1'])
+    # Side 2 minus side 1; only an amount tolerance makes it non-zero
+    matched['amount_difference'] = transactions_2[field_2].to_numpy()[pos_2] - matched['amount'].to_numpy()
+
+    # Remove matched transactions
+    unmatched_1 = _drop_positions(transactions_1, pos_1)
+    unmatched_2 = _drop_positions(transactions_2, pos_2)
+
+    return unmatched_1, unmatched_2, matched
+
+
+def match_window(transactions_1, transactions_2, field_1, field_2, days_tolerance, tie_break=None,
+                 amount_tolerance=None):
+    # One-to-one matching on equal amounts whose dates are at most
+    # days_tolerance apart; the closest dates are paired first. tie_break,
+    # when given, is called as tie_break(transactions_1, transactions_2,
+    # pos_1, pos_2) and scores every candidate pair from 0 to 1; among
+    # equally close candidates the higher score is paired first. An
+    # amount_tolerance (see AmountTolerance) also lets amounts differ, the
+    # closest amounts being paired first.
+    cand_1, cand_2, cost = _window_costs(
+        transactions_1, transactions_2, field_1, field_2, days_tolerance, tie_break, amount_tolerance
+    )
+    pos_1, pos_2 = _greedy_pairs(cand_1, cand_2, cost)
+    return _window_result(transactions_1, transactions_2, field_1, field_2, pos_1, pos_2)
+
+
+def _bounded_subsets(amounts, max_size, limit):
+    # Every subset of at most max_size items whose sum stays <= limit, as
+    # (size, sum, positions). amounts must be sorted ascending so a branch can
+    # stop as soon as the next item would overshoot.
+    stack = [(0, 0, ())]
+    while stack:
+        start, total, picked = stack.pop()
+        yield len(picked), total, picked
+        if len(picked) == max_size:
+            continue
+        for i in range(start, len(amounts)):
+            if total + amounts[i] > limit:
+                break
+            stack.append((i + 1, total + amounts[i], picked + (i,)))
+
+
+def _find_split(target, amounts, max_parts):
+    # Meet in the middle: enumerate bounded subsets of each half of the
+    # candidates, then look up the complement of every right-hand sum in a
+    # table built from the left half. Fewest parts wins.
+    half = len(amounts) // 2
+    left, right = amounts[:half], amounts[half:]
+    left_order = np.argsort(left, kind='stable')
+    right_order = np.argsort(right, kind='stable')
+
+    left_table = {}
+    for size, total, picked in _bounded_subsets(left[left_order], max_parts, target):
+        left_table.setdefault((size, total), tuple(left_order[list(picked)]))
+    right_subsets = sorted(
+        _bounded_subsets(right[right_order], max_parts, target), key=lambda item: item[0]
+    )
+
+    best = None
+    for size, total, picked in right_subsets:
+        if best is not None and size >= len(best):
+            break
+        for left_size in range(max(0, 2 - size), max_parts - size + 1):
+            if best is not None and size + left_size >= len(best):
+                break
+            left_picked = left_table.get((left_size, target - total))
+            if left_picked is not None:
+                best = left_picked + tuple(half + right_order[list(picked)])
+                break
+    return best
+
+
+def match_subset_sum(transactions_1, transactions_2, field_1, field_2, days_tolerance,
+                     max_parts=MAX_SPLIT_PARTS, max_candidates=MAX_SPLIT_CANDIDATES):
+    # Match one transactions_1 row against 2..max_parts transactions_2 rows
+    # whose amounts (int64 cents) add up to it and whose dates are inside the window. Only
+    # the max_candidates closest-dated counterparts are searched per row, which
+    # keeps the subset search bounded however busy a month is.
+    cents_1 = transactions_1[field_1].fillna(0).to_numpy(dtype='int64')
+    cents_2 = transactions_2[field_2].fillna(0).to_numpy(dtype='int64')
+    days_1 = to_days(transactions_1['date'])
+    days_2 = to_days(transactions_2['date'])
+    valid_2 = (cents_2 > 0) & (days_2 != np.iinfo('int64').min)
+
+    order_2 = np.flatnonzero(valid_2)
+    order_2 = order_2[np.argsort(days_2[order_2], kind='stable')]
+    sorted_days_2 = days_2[order_2]
+    used_2 = np.zeros(len(transactions_2), dtype=bool)
+
+    groups = []
+    for pos_1 in range(len(transactions_1)):
+        target = cents_1[pos_1]
+        if target <= 0 or days_1[pos_1] == np.iinfo('int64').min:
+            continue
+
+        lo = np.searchsorted(sorted_days_2, days_1[pos_1] - days_tolerance, side='left')
+        hi = np.searchsorted(sorted_days_2, days_1[pos_1] + days_tolerance, side='right')
+        window = order_2[lo:hi]
+        window = window[~used_2[window] & (cents_2[window] < target)]
+        if len(window) < 2:
+            continue
+        gap = np.abs(days_2[window] - days_1[pos_1])
+        window = window[np.argsort(gap, kind='stable')[:max_candidates]]
+
+        parts = _find_split(target, cents_2[window], max_parts)
+        if parts is None:
+            continue
+        parts = window[list(parts)]
+        used_2[parts] = True
+        groups.append((pos_1, np.sort(parts)))
+
+    matched = pd.DataFrame({
+        'group': np.repeat(np.arange(len(groups)), [len(parts) for _, parts in groups]).astype('int64'),
+        'index_1': transactions_1.index[[pos_1 for pos_1, parts in groups for _ in parts]],
+        'index_2': transactions_2.index[[pos_2 for _, parts in groups for pos_2 in parts]],
+        'amount_1': np.array([cents_1[pos_1] for pos_1, parts in groups for _ in parts], dtype='int64'),
+        'amount_2': np.array([cents_2[pos_2] for _, parts in groups for pos_2 in parts], dtype='int64'),
+    })
+
+    unmatched_1 = _drop_positions(transactions_1, [pos_1 for pos_1, _ in groups])
+    unmatched_2 = _drop_positions(transactions_2, np.flatnonzero(used_2))
+
+    return unmatched_1, unmatched_2, matched
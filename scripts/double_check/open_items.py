@@ -0,0 +1,230 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .cache import arrays_to_frame, frame_to_arrays
+from .config import default_path
+from .matching import _greedy_pairs, to_days
+from .pipeline import _ledger_of
+from .statement import concat_transactions, read_transactions
+
+OPEN_ITEMS_PATH = default_path('../data/state/open_items.npz')
+
+# Open items dated more than this many days before the end of the period
+# being reconciled are dropped from the index
+HORIZON_DAYS = 90
+
+# Index keys are amount << DAY_BITS | day; 20 bits hold any day number
+# until the year 4840
+DAY_BITS = 20
+
+NOT_SETTLED = ''
+
+# Match ledger stage of the pairs settled against open items
+CARRY_STAGE = 'open_items'
+
+
+def side_pairs(names):
+    # Which side's open items each side of a new period can settle: a
+    # ledger's credits against the other ledger's debits, as in the pipeline
+    name_1, name_2 = names
+    pairs = [(f'{name_1}_credit', f'{name_2}_debit'), (f'{name_2}_credit', f'{name_1}_debit')]
+    return {side: other for pair in pairs for side, other in (pair, pair[::-1])}
+
+
+def _field(side):
+    return 'credit' if side.endswith('_credit') else 'debit'
+
+
+def _keys(amounts, days):
+    return np.asarray(amounts, dtype='int64') << DAY_BITS | np.asarray(days, dtype='int64')
+
+
+class OpenItems:
+    # Rows left unmatched at the end of earlier periods, kept so the next
+    # period's leftovers can still be paired with them: a payment booked on
+    # 31/03 by one company and on 02/04 by the other. Items are indexed by
+    # (amount, date) per side, so settling a new row is a range lookup, not
+    # a re-run of earlier months.
+    #
+    # Every item remembers the period it was left open in and, once paired,
+    # the period that settled it; running a period again first undoes that
+    # period's own additions and settlements, so re-runs do not double count.
+    def __init__(self, state_path=OPEN_ITEMS_PATH, names=('hikma', 'tawrdat'), horizon_days=HORIZON_DAYS):
+        self.state_path = state_path
+        self.names = names
+        self.horizon_days = horizon_days
+        self.counterparts = side_pairs(names)
+        self.items = pd.DataFrame({
+            'side': pd.Series(dtype=str), 'period': pd.Series(dtype=str),
+            'row': pd.Series(dtype='int64'), 'settled': pd.Series(dtype=str),
+        })
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.state_path):
+            return
+        with np.load(self.state_path, allow_pickle=False) as state:
+            meta = json.loads(str(state['meta']))
+            items = arrays_to_frame(state, meta['columns'], meta['kinds'])
+        # Items of other ledgers cannot settle anything here
+        if meta['names'] != list(self.names):
+            return
+        self.items = items
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        arrays, kinds = frame_to_arrays(self.items)
+        meta = json.dumps({'names': list(self.names), 'columns': list(self.items.columns), 'kinds': kinds})
+        partial_path = self.state_path + '.partial'
+        with open(partial_path, 'wb') as f:
+            np.savez(f, meta=np.array(meta), **arrays)
+        os.replace(partial_path, self.state_path)
+
+    def periods(self):
+        return sorted(self.items['period'].unique())
+
+    def open_items(self, side=None):
+        items = self.items[self.items['settled'] == NOT_SETTLED]
+        return items if side is None else items[items['side'] == side]
+
+    def index(self, side):
+        # Sorted (amount, day) keys of the open items of one side, and their
+        # positions in self.items
+        if not len(self.items):
+            return np.empty(0, 'int64'), np.empty(0, 'int64')
+        positions = np.flatnonzero(
+            ((self.items['side'] == side) & (self.items['settled'] == NOT_SETTLED) & self.items['date'].notna())
+            .to_numpy()
+        )
+        items = self.items.iloc[positions]
+        keys = _keys(items[_field(side)], to_days(items['date']) if len(items) else [])
+        order = np.argsort(keys, kind='stable')
+        return keys[order], positions[order]
+
+    def add(self, results, period):
+        # Unmatched rows of a period, {side: frame} as the pipeline returns
+        # them, become open items
+        frames = [self.items] if len(self.items) else []
+        for side, df in results.items():
+            frames.append(df.assign(side=side, period=period, row=df.index.to_numpy(dtype='int64'),
+                                    settled=NOT_SETTLED))
+        frames = [frame for frame in frames if len(frame)]
+        if frames:
+            items = concat_transactions(frames).reset_index(drop=True)
+            self.items = items.astype({'side': str, 'period': str, 'settled': str})
+
+    def seed(self, template):
+        # Start the index from leftovers already written by an earlier run,
+        # e.g. '../data/cleaned/old/{side}_final_unmatched.csv'; each side
+        # is filed under the month of its latest row
+        for side in self.counterparts:
+            file_path = template.format(side=side)
+            if not os.path.exists(file_path):
+                continue
+            df = read_transactions(file_path)
+            if len(df):
+                self.add({side: df}, df['date'].max().strftime('%Y-%m'))
+
+    def reset_period(self, period):
+        # Undo an earlier run of this period
+        self.items = self.items[self.items['period'] != period].reset_index(drop=True)
+        self.items.loc[self.items['settled'] == period, 'settled'] = NOT_SETTLED
+
+    def age_out(self, as_of):
+        # Drop items dated more than horizon_days before as_of, settled ones
+        # included; returns the open items that expired unmatched
+        if not len(self.items):
+            return self.items
+        cutoff = pd.Timestamp(as_of) - pd.Timedelta(days=self.horizon_days)
+        expired = (self.items['date'] < cutoff).to_numpy()
+        aged = self.items[expired & (self.items['settled'] == NOT_SETTLED).to_numpy()]
+        self.items = self.items[~expired].reset_index(drop=True)
+        return aged
+
+    def settle(self, results, period, days_tolerance, match_ledger=None):
+        # Pair this period's unmatched rows with open items of the counterpart
+        # side: equal amounts, dates at most days_tolerance apart, closest
+        # first. Paired items are marked settled by period; the rows are
+        # removed from what is returned, and recorded in match_ledger if
+        # given.
+        results = dict(results)
+        matches = []
+        for side, df in results.items():
+            other = self.counterparts.get(side)
+            rows = np.flatnonzero(df['date'].notna().to_numpy())
+            if other is None or not len(rows):
+                continue
+            keys, positions = self.index(other)
+            if not len(keys):
+                continue
+            amounts = df[_field(side)].to_numpy(dtype='int64')[rows]
+            days = to_days(df['date'].iloc[rows])
+            lo = np.searchsorted(keys, _keys(amounts, days - days_tolerance), side='left')
+            hi = np.searchsorted(keys, _keys(amounts, days + days_tolerance), side='right')
+
+            counts = hi - lo
+            cand_1 = np.repeat(np.arange(len(rows)), counts)
+            cand_2 = np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            gap = np.abs((keys[cand_2] & ((1 << DAY_BITS) - 1)) - days[cand_1])
+            pos_1, pos_2 = _greedy_pairs(cand_1, cand_2, gap)
+            if not len(pos_1):
+                continue
+
+            items = self.items.iloc[positions[pos_2]]
+            matched = df.iloc[rows[pos_1]]
+            matches.append(pd.DataFrame({
+                'side': side,
+                'row': matched.index.to_numpy(dtype='int64'),
+                'date': matched['date'].to_numpy(),
+                'amount': matched[_field(side)].to_numpy(),
+                'item_side': other,
+                'item_period': items['period'].to_numpy(),
+                'item_row': items['row'].to_numpy(),
+                'item_date': items['date'].to_numpy(),
+            }))
+            if match_ledger is not None:
+                _record(match_ledger, side, other, matched, items)
+            self.items.iloc[positions[pos_2], self.items.columns.get_loc('settled')] = period
+            keep = np.ones(len(df), dtype=bool)
+            keep[rows[pos_1]] = False
+            results[side] = df[keep]
+
+        if matches:
+            matches = pd.concat(matches, ignore_index=True)
+            matches['gap_days'] = to_days(matches['item_date']) - to_days(matches['date'])
+        else:
+            matches = pd.DataFrame(columns=[
+                'side', 'row', 'date', 'amount', 'item_side', 'item_period', 'item_row', 'item_date', 'gap_days',
+            ])
+        return results, matches
+
+    def carry(self, results, period, as_of, days_tolerance, match_ledger=None):
+        # One period end: settle what earlier periods left open, keep this
+        # period's remaining rows open, drop items past the horizon and save.
+        # Returns the rows still unmatched and the cross-period pairs.
+        self.reset_period(period)
+        results, matches = self.settle(results, period, days_tolerance, match_ledger)
+        self.add(results, period)
+        self.age_out(as_of)
+        self.save()
+        return results, matches
+
+
+def _record(match_ledger, side, other, rows, items):
+    # Pairs of this period's rows and open items, under CARRY_STAGE. An
+    # item's row is a position in the export of the period it was left open
+    # in, so its ledger is filed as '<ledger> <period>'.
+    for item_period in items['period'].unique():
+        in_period = (items['period'] == item_period).to_numpy()
+        period_rows = rows[in_period]
+        period_items = items[in_period].set_index(pd.Index(items['row'].to_numpy()[in_period]))
+        ledgers = [_ledger_of(side), f'{_ledger_of(other)} {item_period}']
+        sides = [period_rows, period_items]
+        if _field(side) == 'debit':
+            ledgers.reverse()
+            sides.reverse()
+        matched = pd.DataFrame({'index_1': sides[0].index, 'index_2': sides[1].index})
+        match_ledger.record(CARRY_STAGE, tuple(ledgers), *sides, matched)
@@ -0,0 +1,147 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .matching import _drop_positions, match_exact, match_window, to_days
+
+# Sentinel days far outside any statement period
+_NO_DAY = 10 ** 12
+
+
+def window_components(days_1, amounts_1, days_2, amounts_2, days_tolerance):
+    # Component label for every row of both sides, where two rows share a
+    # component when a chain of in-window, same-amount candidate pairs links
+    # them. For one amount a component is always a contiguous run in date
+    # order, so it can be found with one sort and a few running max/min
+    # passes instead of building the candidate graph.
+    side = np.concatenate([np.zeros(len(days_1), dtype='int8'), np.ones(len(days_2), dtype='int8')])
+    days = np.concatenate([days_1, days_2])
+    codes, _ = pd.factorize(np.concatenate([amounts_1, amounts_2]))
+    order = np.lexsort((side, days, codes))
+    side, days, codes = side[order], days[order], codes[order]
+
+    # Latest day seen so far on each side, and earliest day still to come on
+    # each side, within the same amount
+    frame = pd.DataFrame({
+        'code': codes,
+        'day_1': np.where(side == 0, days, -_NO_DAY),
+        'day_2': np.where(side == 1, days, -_NO_DAY),
+        'next_1': np.where(side == 0, days, _NO_DAY),
+        'next_2': np.where(side == 1, days, _NO_DAY),
+    })
+    grouped = frame.groupby('code', sort=False)
+    last_1 = grouped['day_1'].cummax().to_numpy()
+    last_2 = grouped['day_2'].cummax().to_numpy()
+    reverse = frame.iloc[::-1].groupby('code', sort=False)
+    next_1 = reverse['next_1'].cummin().to_numpy()[::-1]
+    next_2 = reverse['next_2'].cummin().to_numpy()[::-1]
+
+    # Rows i and i + 1 are linked when some candidate pair straddles them
+    linked = (
+        (codes[1:] == codes[:-1])
+        & ((next_2[1:] - last_1[:-1] <= days_tolerance) | (next_1[1:] - last_2[:-1] <= days_tolerance))
+    )
+    labels_sorted = np.concatenate([[0], np.cumsum(~linked)])
+    labels = np.empty_like(labels_sorted)
+    labels[order] = labels_sorted
+    return labels[:len(days_1)], labels[len(days_1):]
+
+
+def date_cuts(days, partitions):
+    # Cut dates at quantiles of the row dates, so partitions get similar row counts
+    days = days[days != np.iinfo('int64').min]
+    if len(days) == 0:
+        return np.array([], dtype='int64')
+    return np.unique(np.quantile(days, np.linspace(0, 1, partitions + 1)[1:-1]))
+
+
+def assign_partitions(days_1, labels_1, days_2, labels_2, partitions):
+    # Every component goes, whole, to the partition holding its first date.
+    # Partitions therefore overlap their right-hand neighbour by as far as a
+    # chain of candidates reaches, which is at least days_tolerance.
+    days = np.concatenate([days_1, days_2])
+    start = pd.Series(days).groupby(np.concatenate([labels_1, labels_2])).transform('min').to_numpy()
+    part = np.searchsorted(date_cuts(days, partitions), start, side='right')
+    return part[:len(days_1)], part[len(days_1):]
+
+
+def _match_window_part(args):
+    part_1, part_2, field_1, field_2, days_tolerance, tie_break = args
+    return match_window(part_1, part_2, field_1, field_2, days_tolerance, tie_break)[2]
+
+
+def _match_exact_part(args):
+    part_1, part_2, field_1, field_2, tie_break = args
+    return match_exact(part_1, part_2, field_1, field_2, tie_break)[2]
+
+
+def _run_parts(worker, tasks, max_workers):
+    if len(tasks) == 1 or max_workers == 1:
+        return [worker(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(worker, tasks))
+
+
+def _stitch(transactions_1, transactions_2, parts):
+    # Each row belongs to exactly one partition, so the partition results
+    # never conflict; stitching is a concatenation put back in row order.
+    # The matchers report index labels, so work on a positional index here.
+    matched = pd.concat(parts, ignore_index=True)
+    matched = matched.sort_values('index_1', kind='stable').reset_index(drop=True)
+    pos_1 = matched['index_1'].to_numpy()
+    pos_2 = matched['index_2'].to_numpy()
+    matched['index_1'] = transactions_1.index[pos_1]
+    matched['index_2'] = transactions_2.index[pos_2]
+    return _drop_positions(transactions_1, pos_1), _drop_positions(transactions_2, pos_2), matched
+
+
+def match_exact_partitioned(transactions_1, transactions_2, field_1, field_2, partitions=None, max_workers=None,
+                            tie_break=None):
+    # Exact buckets never span two dates, so plain date ranges partition them
+    partitions = partitions or os.cpu_count()
+    local_1 = transactions_1.reset_index(drop=True)
+    local_2 = transactions_2.reset_index(drop=True)
+    days_1 = to_days(local_1['date'])
+    days_2 = to_days(local_2['date'])
+    cuts = date_cuts(np.concatenate([days_1, days_2]), partitions)
+    part_1 = np.searchsorted(cuts, days_1, side='right')
+    part_2 = np.searchsorted(cuts, days_2, side='right')
+
+    tasks = [
+        (local_1[part_1 == part], local_2[part_2 == part], field_1, field_2, tie_break)
+        for part in np.union1d(part_1, part_2)
+    ]
+    if not tasks:
+        return match_exact(transactions_1, transactions_2, field_1, field_2, tie_break)
+    return _stitch(transactions_1, transactions_2, _run_parts(_match_exact_part, tasks, max_workers))
+
+
+def match_window_partitioned(transactions_1, transactions_2, field_1, field_2, days_tolerance,
+                             partitions=None, max_workers=None, tie_break=None):
+    # Same pairs as match_window, computed per date partition in parallel.
+    # Greedy closest-date-first pairing only ever interacts inside a
+    # component, so matching whole components independently is identical to
+    # one global pass.
+    partitions = partitions or os.cpu_count()
+    local_1 = transactions_1.reset_index(drop=True)
+    local_2 = transactions_2.reset_index(drop=True)
+    valid_1 = local_1['date'].notna().to_numpy() & local_1[field_1].notna().to_numpy()
+    valid_2 = local_2['date'].notna().to_numpy() & local_2[field_2].notna().to_numpy()
+    local_1, local_2 = local_1[valid_1], local_2[valid_2]
+
+    days_1 = to_days(local_1['date'])
+    days_2 = to_days(local_2['date'])
+    labels_1, labels_2 = window_components(
+        days_1, local_1[field_1].to_numpy(), days_2, local_2[field_2].to_numpy(), days_tolerance
+    )
+    part_1, part_2 = assign_partitions(days_1, labels_1, days_2, labels_2, partitions)
+
+    tasks = [
+        (local_1[part_1 == part], local_2[part_2 == part], field_1, field_2, days_tolerance, tie_break)
+        for part in np.union1d(part_1, part_2)
+    ]
+    if not tasks:
+        return match_window(transactions_1, transactions_2, field_1, field_2, days_tolerance, tie_break)
+    return _stitch(transactions_1, transactions_2, _run_parts(_match_window_part, tasks, max_workers))
@@ -0,0 +1,296 @@
+import functools
+import os
+
+import pandas as pd
+
+from .assignment import match_optimal
+from .daily_totals import DailyTotals
+from .descriptions import DescriptionIndex, DescriptionScorer
+from .divergence import divergent_rows
+from .instrument import Instrumentation
+from .match_ledger import MatchLedger
+from .matching import match_exact, match_subset_sum, match_window
+from .partition import match_exact_partitioned, match_window_partitioned
+from .references import match_references
+from .statement import write_transactions
+
+DAYS_TOLERANCE = 4
+
+
+def split_credit_debit(df):
+    return df[df['credit'] != 0], df[df['debit'] != 0]
+
+
+def remove_balanced_dates(df_1, df_2, totals=None):
+    # Dates where both ledgers hold rows and the credits of each side equal
+    # the debits of the other. totals are the current DailyTotals of df_1
+    # and df_2, when the caller keeps them; they are only read here.
+    if totals is None:
+        totals = DailyTotals(df_1, df_2)
+    balanced = totals.balanced()
+
+    # Remove transactions from both dataframes corresponding to balanced dates
+    df_1_filtered = df_1[~totals.rows_on(df_1, balanced)]
+    df_2_filtered = df_2[~totals.rows_on(df_2, balanced)]
+
+    return df_1_filtered, df_2_filtered, pd.DataFrame({'date': totals.dates(balanced).to_numpy()})
+
+
+def cancel_contras(credit_df, debit_df, days_tolerance):
+    # Credit and debit rows of the same ledger that offset each other (a
+    # payment and its reversal, a posting and its correction): equal amounts
+    # at most days_tolerance days apart, closest dates first
+    return match_window(credit_df, debit_df, 'credit', 'debit', days_tolerance)
+
+
+def divergence_stage(credit_df, debit_df, days_tolerance, workers=1, totals=None, tie_break=None,
+                     amount_tolerance=None):
+    # Drop the rows outside the windows where the cumulative flows of the
+    # two ledgers diverge. Nothing is paired, so the matched frame is empty;
+    # its attrs (which reach the stage report) count the windows.
+    credit_left, debit_left, windows = divergent_rows(credit_df, debit_df, days_tolerance, totals)
+    matched = pd.DataFrame({'index_1': [], 'index_2': []})
+    matched.attrs = {'windows': len(windows), 'moved_dates': int(windows['moved_dates'].sum())}
+    return credit_left, debit_left, matched
+
+
+def exact_stage(credit_df, debit_df, days_tolerance, workers=1, totals=None, tie_break=None,
+                amount_tolerance=None):
+    if workers > 1 and not amount_tolerance:
+        return match_exact_partitioned(
+            credit_df, debit_df, 'credit', 'debit', max_workers=workers, tie_break=tie_break
+        )
+    return match_exact(credit_df, debit_df, 'credit', 'debit', tie_break, amount_tolerance)
+
+
+def reference_stage(credit_df, debit_df, days_tolerance, workers=1, totals=None, tie_break=None,
+                    amount_tolerance=None, columns=()):
+    # Rows that share a reference in one of columns, an amount and the date
+    # window; one hash join, so it runs before the window and subset-sum
+    # scans (see ReconciliationPipeline's references)
+    return match_references(credit_df, debit_df, 'credit', 'debit', days_tolerance, columns)
+
+
+def window_stage(credit_df, debit_df, days_tolerance, workers=1, totals=None, tie_break=None,
+                 amount_tolerance=None):
+    if workers > 1 and not amount_tolerance:
+        return match_window_partitioned(
+            credit_df, debit_df, 'credit', 'debit', days_tolerance, max_workers=workers, tie_break=tie_break
+        )
+    return match_window(credit_df, debit_df, 'credit', 'debit', days_tolerance, tie_break, amount_tolerance)
+
+
+def optimal_window_stage(credit_df, debit_df, days_tolerance, workers=1, totals=None, tie_break=None,
+                         amount_tolerance=None):
+    # The window stage as a min-cost maximum matching per amount component;
+    # components are small, so this runs in one process whatever workers is
+    return match_optimal(credit_df, debit_df, 'credit', 'debit', days_tolerance, tie_break, amount_tolerance)
+
+
+def split_payments_stage(credit_df, debit_df, days_tolerance, workers=1, totals=None, tie_break=None,
+                         amount_tolerance=None):
+    # One credit booked against several debits on the other side, and the reverse
+    credit_df, debit_df, many_debits = match_subset_sum(
+        credit_df, debit_df, 'credit', 'debit', days_tolerance
+    )
+    debit_df, credit_df, many_credits = match_subset_sum(
+        debit_df, credit_df, 'debit', 'credit', days_tolerance
+    )
+    many_credits = many_credits.rename(columns={
+        'index_1': 'index_2', 'index_2': 'index_1', 'amount_1': 'amount_2', 'amount_2': 'amount_1',
+    })
+    many_credits['group'] += many_debits['group'].nunique()
+    matched = pd.concat([many_debits, many_credits[many_debits.columns]], ignore_index=True)
+    return credit_df, debit_df, matched
+
+
+def balanced_stage(credit_df, debit_df, days_tolerance, workers=1, totals=None, tie_break=None,
+                   amount_tolerance=None):
+    return remove_balanced_dates(credit_df, debit_df, totals)
+
+
+# Stages in the order they run after the credit/debit split. Each takes the
+# credit rows of one ledger and the debit rows of the other and returns both
+# leftovers plus a frame describing what it removed. With workers > 1 the
+# exact and window stages match date partitions in parallel processes;
+# totals, when given, are the pair's current per-date totals, tie_break
+# orders equally good candidates (see match_window) and amount_tolerance
+# lets the exact and window stages pair slightly different amounts (see
+# matching.AmountTolerance; partitioning is skipped then).
+STAGES = {
+    'exact': exact_stage,
+    'window': window_stage,
+    'split_payments': split_payments_stage,
+    'balanced': balanced_stage,
+}
+
+# Optional stages run before STAGES to shrink their input
+PREFILTER_STAGES = {
+    'divergence': divergence_stage,
+}
+
+
+class ReconciliationPipeline:
+    def __init__(self, names=('hikma', 'tawrdat'), days_tolerance=DAYS_TOLERANCE, checkpoints=None, workers=1,
+                 instrumentation=None, prefilter=False, descriptions=False, assignment='greedy', contra_days=None,
+                 amount_tolerance=None, references=None):
+        # checkpoints maps a stage name ('split' or one of STAGES) to a path
+        # template such as '../data/cleaned/{side}_final_unmatched.csv'. Only
+        # those stages are written; everything else stays in memory.
+        # instrumentation records every stage; by default nothing is reported.
+        # prefilter also runs PREFILTER_STAGES first. descriptions breaks ties
+        # between same-amount candidates by how alike their 'dis' texts are.
+        # assignment='optimal' makes the window stage match as many rows as
+        # possible instead of pairing the closest dates first. contra_days,
+        # when set, first sets aside credit/debit pairs inside each ledger
+        # that cancel out within that many days (see cancel_contras).
+        # amount_tolerance, a matching.AmountTolerance, is handed to every stage.
+        # references names columns holding a reference both ledgers share;
+        # rows agreeing on one are paired right after 'exact' (see
+        # references.py, which also explains why none is set by default).
+        self.names = names
+        self.days_tolerance = days_tolerance
+        self.checkpoints = checkpoints or {}
+        self.workers = workers
+        self.instrumentation = instrumentation or Instrumentation()
+        self.prefilter = prefilter
+        self.descriptions = descriptions
+        self.assignment = assignment
+        self.contra_days = contra_days
+        self.amount_tolerance = amount_tolerance
+        self.references = references
+        self.matches = {}
+        self.totals = {}
+        self.match_ledger = MatchLedger()
+
+    def run(self, df_1, df_2, stages=None):
+        # stages, by default self.stages(), lets an engine swap in its own
+        # implementation of a stage
+        name_1, name_2 = self.names
+        with self.instrumentation.stage('split') as record:
+            credit_1, debit_1 = split_credit_debit(df_1)
+            credit_2, debit_2 = split_credit_debit(df_2)
+            record['rows_in'] = {name_1: len(df_1), name_2: len(df_2)}
+            record['rows_out'] = {
+                f'{name_1}_credit': len(credit_1), f'{name_1}_debit': len(debit_1),
+                f'{name_2}_credit': len(credit_2), f'{name_2}_debit': len(debit_2),
+            }
+
+        if self.contra_days is not None:
+            credit_1, debit_1 = self.cancel_contras(name_1, credit_1, debit_1)
+            credit_2, debit_2 = self.cancel_contras(name_2, credit_2, debit_2)
+
+        # Each pair lines up one ledger's credits with the other ledger's debits
+        pairs = {
+            (f'{name_1}_credit', f'{name_2}_debit'): (credit_1, debit_2),
+            (f'{name_2}_credit', f'{name_1}_debit'): (credit_2, debit_1),
+        }
+        self.checkpoint('split', pairs)
+
+        # One description index per ledger, shared by both of its pairs
+        tie_breaks = dict.fromkeys(pairs)
+        if self.descriptions:
+            index_1, index_2 = DescriptionIndex(df_1['dis']), DescriptionIndex(df_2['dis'])
+            keys = list(pairs)
+            tie_breaks[keys[0]] = DescriptionScorer(index_1, index_2)
+            tie_breaks[keys[1]] = DescriptionScorer(index_2, index_1)
+
+        return self.run_stages(pairs, stages or self.stages(), tie_breaks)
+
+    def cancel_contras(self, name, credit_df, debit_df):
+        # Offsetting rows never reach the cross-ledger stages; they are kept
+        # in matches and the match ledger under the 'contra' stage
+        key = (f'{name}_credit', f'{name}_debit')
+        with self.instrumentation.stage('contra', pair='/'.join(key)) as record:
+            record['rows_in'] = dict(zip(key, (len(credit_df), len(debit_df))))
+            credit_left, debit_left, matched = cancel_contras(credit_df, debit_df, self.contra_days)
+            record['rows_out'] = dict(zip(key, (len(credit_left), len(debit_left))))
+            record['matches'] = len(matched)
+            record['rows_matched'] = _matched_rows(matched)
+        self.matches[('contra',) + key] = matched
+        self.match_ledger.record(
+            'contra', (name, name), _removed(credit_df, credit_left), _removed(debit_df, debit_left), matched
+        )
+        return credit_left, debit_left
+
+    def stages(self):
+        stages = {**PREFILTER_STAGES, **STAGES} if self.prefilter else dict(STAGES)
+        if self.assignment == 'optimal':
+            stages['window'] = optimal_window_stage
+        if self.references:
+            # Right after 'exact'
+            ordered = {}
+            for name, run_stage in stages.items():
+                ordered[name] = run_stage
+                if name == 'exact':
+                    ordered['reference'] = functools.partial(reference_stage, columns=list(self.references))
+            stages = ordered
+        return stages
+
+    def run_stages(self, pairs, stages, tie_breaks=None):
+        # The matching half of run(): pairs maps (credit side, debit side)
+        # names to already split frames, which go through the given stages
+        pairs = dict(pairs)
+        tie_breaks = tie_breaks or dict.fromkeys(pairs)
+
+        # Per-date totals of every pair, kept current as stages match rows away
+        self.totals = {key: DailyTotals(*frames) for key, frames in pairs.items()}
+
+        for stage, run_stage in stages.items():
+            for key, (credit_df, debit_df) in pairs.items():
+                totals = self.totals[key]
+                with self.instrumentation.stage(stage, pair='/'.join(key)) as record:
+                    record['rows_in'] = dict(zip(key, (len(credit_df), len(debit_df))))
+                    credit_left, debit_left, matched = run_stage(
+                        credit_df, debit_df, self.days_tolerance, self.workers, totals, tie_breaks[key],
+                        self.amount_tolerance,
+                    )
+                    record['rows_out'] = dict(zip(key, (len(credit_left), len(debit_left))))
+                    record['matches'] = len(matched)
+                    record['rows_matched'] = _matched_rows(matched)
+                    record.update(matched.attrs)
+                credit_removed = _removed(credit_df, credit_left)
+                debit_removed = _removed(debit_df, debit_left)
+                totals.remove(1, credit_removed)
+                totals.remove(2, debit_removed)
+                self.match_ledger.record(
+                    stage, tuple(_ledger_of(side) for side in key), credit_removed, debit_removed, matched
+                )
+                pairs[key] = (credit_left, debit_left)
+                self.matches[(stage,) + key] = matched
+            self.checkpoint(stage, pairs)
+
+        return _by_side(pairs)
+
+    def checkpoint(self, stage, pairs):
+        template = self.checkpoints.get(stage)
+        if template is not None:
+            write_results(_by_side(pairs), template)
+
+
+def _removed(before, after):
+    return before[~before.index.isin(after.index)]
+
+
+def _matched_rows(matched):
+    # Rows paired in a stage's matched frame; the balanced and divergence
+    # stages return no index columns, or none filled, and pair nothing
+    if 'index_1' not in matched:
+        return 0
+    return matched['index_1'].nunique() + matched['index_2'].nunique()
+
+
+def _ledger_of(side):
+    # 'hikma_credit' -> 'hikma'
+    return side.rsplit('_', 1)[0]
+
+
+def _by_side(pairs):
+    return {side: df for key, frames in pairs.items() for side, df in zip(key, frames)}
+
+
+def write_results(results, template):
+    for side, df in results.items():
+        file_path = template.format(side=side)
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        write_transactions(df, file_path)
@@ -0,0 +1,86 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from .matching import _greedy_pairs, _window_result, to_days
+
+# Only a column holding a reference both companies book on the same entry
+# (an intercompany or invoice reference) may be joined on. The statement
+# exports have none: each company numbers its JVs on its own, so a JV number
+# shared by the two ledgers is a coincidence, and their Ref column ('jv')
+# holds the entry type (Payments, Receipts, ...). The pipeline therefore
+# only runs this stage for columns named in its references option.
+
+# A value on more rows than this in one ledger (a batch or account number,
+# a placeholder) does not identify an entry and is never joined on
+MAX_KEY_ROWS = 4
+
+_DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹', '01234567890123456789')
+_NOT_KEY = re.compile('[^0-9A-Z\u0621-\u064a]+')
+_LEADING_ZEROS = re.compile('(?<![0-9])0+(?=[0-9])')
+
+
+def normalize_reference(value):
+    # " ref-00840 " and "REF ٨٤٠" both become "REF840". Values without a
+    # digit ("Payments") are labels, not references, and give None.
+    if pd.isna(value):
+        return None
+    text = _NOT_KEY.sub('', str(value).translate(_DIGITS).upper())
+    text = _LEADING_ZEROS.sub('', text)
+    return text if any(character.isdigit() for character in text) else None
+
+
+def reference_keys(values):
+    # normalize_reference for every value, computed once per distinct value
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        keys = np.array([normalize_reference(value) for value in values.cat.categories] + [None], dtype=object)
+        return pd.Series(keys[values.cat.codes.to_numpy()], index=values.index)
+    distinct = pd.unique(values.dropna())
+    return values.map(dict(zip(distinct, (normalize_reference(value) for value in distinct))))
+
+
+def _reference_candidates(transactions_1, transactions_2, field_1, field_2, days_tolerance, column, max_key_rows):
+    # (pos_1, pos_2, gap) for rows that share a reference in column and an
+    # amount, dated at most days_tolerance apart
+    keys = pd.concat([reference_keys(transactions_1[column]), reference_keys(transactions_2[column])])
+    codes, _ = pd.factorize(keys)
+    codes_1, codes_2 = codes[:len(transactions_1)], codes[len(transactions_1):]
+
+    def side(codes, transactions, field, suffix):
+        usable = (codes >= 0) & transactions['date'].notna().to_numpy()
+        usable &= np.bincount(codes[codes >= 0], minlength=codes.max() + 1)[codes.clip(min=0)] <= max_key_rows
+        rows = np.flatnonzero(usable)
+        return pd.DataFrame({
+            f'pos_{suffix}': rows,
+            'key': codes[rows],
+            'amount': transactions[field].to_numpy()[rows],
+            f'day_{suffix}': to_days(transactions['date'].iloc[rows]) if len(rows) else np.empty(0, 'int64'),
+        })
+
+    if not (len(codes_1) and len(codes_2)) or codes.max() < 0:
+        return pd.DataFrame({'pos_1': [], 'pos_2': [], 'gap': []}, dtype='int64')
+    # One hash join on (reference, amount)
+    pairs = side(codes_1, transactions_1, field_1, '1').merge(
+        side(codes_2, transactions_2, field_2, '2'), on=['key', 'amount']
+    )
+    pairs['gap'] = (pairs['day_2'] - pairs['day_1']).abs()
+    return pairs.loc[pairs['gap'] <= days_tolerance, ['pos_1', 'pos_2', 'gap']]
+
+
+def match_references(transactions_1, transactions_2, field_1, field_2, days_tolerance, columns,
+                     max_key_rows=MAX_KEY_ROWS):
+    # Pair rows that carry the same normalized reference in one of columns
+    # and the same amount, within days_tolerance days; closest dates first,
+    # as in match_window. Output has match_window's shape.
+    candidates = [
+        _reference_candidates(transactions_1, transactions_2, field_1, field_2, days_tolerance, column, max_key_rows)
+        for column in columns if column in transactions_1 and column in transactions_2
+    ]
+    candidates = pd.concat(candidates) if candidates else pd.DataFrame({'pos_1': [], 'pos_2': [], 'gap': []})
+    candidates = candidates.drop_duplicates(['pos_1', 'pos_2'])
+    pos_1, pos_2 = _greedy_pairs(
+        candidates['pos_1'].to_numpy(dtype='int64'), candidates['pos_2'].to_numpy(dtype='int64'),
+        candidates['gap'].to_numpy(dtype='int64'),
+    )
+    return _window_result(transactions_1, transactions_2, field_1, field_2, pos_1, pos_2)
@@ -0,0 +1,173 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+CHUNK_SIZE = 100_000
+
+# Transaction columns of the statement export and the names the scripts use
+COLUMNS = [27, 28, 29, 30, 32, 33]
+NAMES = ['dis', 'date', 'jv number', 'jv', 'credit', 'debit']
+
+# The same columns plus the running balance after each row, for validating
+# it (read_csv names the columns in file order)
+BALANCE_COLUMNS = [27, 28, 29, 30, 31, 32, 33]
+BALANCE_NAMES = ['dis', 'date', 'jv number', 'jv', 'balance', 'credit', 'debit']
+
+# Canonical in-memory schema shared by every stage: amounts are int64 cents so
+# joins and totals compare exactly, and text columns are categoricals. JV
+# numbers are text too: some exports carry alphanumeric ones, and numeric
+# ones can exceed any fixed integer width
+AMOUNT_COLUMNS = ['credit', 'debit', 'balance']
+CATEGORY_COLUMNS = ['dis', 'jv', 'jv number']
+
+# The export repeats the statement header block on every row; these are the
+# positions of its values (the neighbouring columns hold the labels)
+HEADER_COLUMNS = {
+    'currency': 8,
+    'from_date': 9,
+    'account_number': 11,
+    'to_date': 13,
+    'account_name': 15,
+    'opening_balance': 17,
+    'total_debit': 37,
+    'total_credit': 39,
+    'current_balance': 41,
+    'company_name': 45,
+}
+
+
+@dataclass
+class StatementHeader:
+    account_number: str
+    account_name: str
+    company_name: str
+    currency: str
+    from_date: pd.Timestamp
+    to_date: pd.Timestamp
+    opening_balance: float
+    total_debit: float
+    total_credit: float
+    current_balance: float
+
+
+def _parse_amount(value):
+    # Negative balances are exported in accounting style, "(1,002,192.62)"
+    value = str(value).replace(',', '')
+    if value.startswith('(') and value.endswith(')'):
+        return -float(value[1:-1])
+    return float(value)
+
+
+def read_statement_header(file_path):
+    # The header block is identical on every row, so the first row is enough
+    row = pd.read_csv(
+        file_path, header=None, nrows=1, dtype=str, usecols=list(HEADER_COLUMNS.values())
+    ).iloc[0]
+    values = {name: row[position] for name, position in HEADER_COLUMNS.items()}
+    return StatementHeader(
+        account_number=values['account_number'],
+        account_name=values['account_name'],
+        company_name=values['company_name'],
+        currency=values['currency'],
+        from_date=pd.to_datetime(values['from_date'], format='%d/%m/%Y'),
+        to_date=pd.to_datetime(values['to_date'], format='%d/%m/%Y'),
+        opening_balance=_parse_amount(values['opening_balance']),
+        total_debit=_parse_amount(values['total_debit']),
+        total_credit=_parse_amount(values['total_credit']),
+        current_balance=_parse_amount(values['current_balance']),
+    )
+
+
+def to_cents(values):
+    # "3,775,086.68", 3775086.68 or missing -> 377508668 as int64
+    if values.dtype == object or pd.api.types.is_string_dtype(values):
+        values = values.str.replace(',', '', regex=False).str.replace(r'^\((.*)\)$', r'-\1', regex=True)
+    amounts = pd.to_numeric(values, errors='coerce').fillna(0).to_numpy(dtype='float64')
+    return pd.Series(np.round(amounts * 100).astype('int64'), index=values.index)
+
+
+def from_cents(values):
+    return values / 100
+
+
+def display_amounts(df, columns=('credit', 'debit', 'difference')):
+    # Copy of df with its cents columns turned back into decimals for printing
+    return df.assign(**{column: from_cents(df[column]) for column in columns if column in df})
+
+
+def apply_schema(df, date_format=None):
+    for column in AMOUNT_COLUMNS:
+        if column in df and df[column].dtype != 'int64':
+            df[column] = to_cents(df[column])
+    if 'date' in df:
+        df['date'] = pd.to_datetime(df['date'], format=date_format)
+    if 'jv number' in df and not isinstance(df['jv number'].dtype, pd.CategoricalDtype):
+        text = df['jv number'].astype(str).str.strip()
+        df['jv number'] = text.mask(text == '')
+    for column in CATEGORY_COLUMNS:
+        if column in df:
+            df[column] = df[column].astype('category')
+    return df
+
+
+def clean_chunk(df):
+    return apply_schema(df, date_format='%d/%m/%Y')
+
+
+def concat_transactions(frames):
+    # Chunks carry their own category sets; give them one shared set so the
+    # result keeps categorical columns instead of falling back to object
+    frames = list(frames)
+    dtypes = {
+        column: pd.CategoricalDtype(union_categoricals([frame[column] for frame in frames]).categories)
+        for column in CATEGORY_COLUMNS if column in frames[0]
+    }
+    return pd.concat([frame.astype(dtypes) for frame in frames], ignore_index=True)
+
+
+def read_transactions(file_path):
+    # Intermediate CSVs store amounts as decimals for people to read
+    return apply_schema(pd.read_csv(file_path, dtype={**{column: str for column in AMOUNT_COLUMNS}, 'jv number': str}))
+
+
+def write_transactions(df, file_path, index=False):
+    df = df.copy()
+    for column in AMOUNT_COLUMNS:
+        if column in df:
+            df[column] = from_cents(df[column])
+    df.to_csv(file_path, index=index)
+
+
+def iter_statement(file_path, columns=COLUMNS, names=NAMES, chunk_size=CHUNK_SIZE):
+    # Read only the transaction columns, chunk_size rows at a time, so memory
+    # stays flat however large the export is. Every column is read as text
+    # and typed by clean_chunk, so a reference column keeps its leading
+    # zeros and never turns into floats.
+    reader = pd.read_csv(
+        file_path, header=None, usecols=columns, names=names, chunksize=chunk_size, dtype=str,
+    )
+    with reader:
+        for chunk in reader:
+            yield clean_chunk(chunk)
+
+
+def load_statement(file_path, columns=COLUMNS, names=NAMES, chunk_size=CHUNK_SIZE):
+    header = read_statement_header(file_path)
+    if hasattr(file_path, 'seek'):
+        # An open buffer: the header read left it somewhere past the first row
+        file_path.seek(0)
+    chunks = list(iter_statement(file_path, columns, names, chunk_size))
+    if not chunks:
+        return header, apply_schema(pd.DataFrame(columns=names))
+    return header, concat_transactions(chunks)
+
+
+def load_and_clean_data(file_path, columns=COLUMNS, names=NAMES):
+    try:
+        _, df = load_statement(file_path, columns, names)
+        return df
+    except Exception as e:
+        print(f"An error occurred while loading and cleaning data from {file_path}: {e}")
+        return pd.DataFrame()
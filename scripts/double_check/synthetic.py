@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+WRITE_CHUNK_SIZE = 500_000
+
+# One row of the 47-column statement export with the transaction slots
+# (27-34) left empty; every other column repeats the statement header block
+EXPORT_TEMPLATE = [
+    '10:57:03AM', 'Qatar-Doha / قطر-الدوحة', '0', '0', '70011911', 'accounts@example.com',
+    'Statement', 'كشف حساب', 'ريال قطرى', '01/01/2024', 'From Date - من تاريخ', '20040057',
+    'Account Number - حساب رقم', '31/12/2024', 'From Date - من تاريخ', 'Synthetic ledger',
+    'Account Name - حساب', '0.00', 'Opening Balance - الرصيد الافتتاحى', 'Dis - الشرح', 'Date-تاريخ',
+    'JV-رقم القيد', 'Ref - المرجع', 'Balance-الرصيد', 'Credit - الدائن', 'Debit - مدين', '#',
+    None, None, None, None, None, None, None, None,
+    '0.00', 'Opening Balance - الرصيد الافتتاحى', '0.00', 'Total Debit - اجمالى المدين', '0.00',
+    'Total Credit - اجمالى الدائن', '0.00', 'Current Balance - الرصيد الحالى', 'مدين',
+    'نصادق على صحة المديونية / الرصيد', 'Synthetic company', 'Page -1 of 1',
+]
+TRANSACTION_SLOTS = ['dis', 'date', 'jv number', 'jv', 'balance', 'credit', 'debit', 'line']
+
+DESCRIPTIONS = ['دفعة للتوريدات', 'دفعة من جنة بلدنا', 'رول سي ار', 'دفعه', 'دفعه بيد هشام']
+JV_TYPES = ['Payments', 'Receipts', 'G.Ledger']
+
+# Probability of a counterpart being booked 0, 1, 2, ... days apart
+SHIFT_PROBABILITIES = (0.6, 0.2, 0.1, 0.05, 0.05)
+
+
+def _amounts(rng, rows, duplicate_rate):
+    # Mostly distinct amounts, plus a share drawn from a small pool of round
+    # figures so that same-amount candidates pile up like in real months
+    cents = rng.integers(1_000, 10_000_000, rows)
+    pool = rng.integers(1, 50, 50) * 50_000
+    duplicated = rng.random(rows) < duplicate_rate
+    cents[duplicated] = rng.choice(pool, duplicated.sum())
+    return cents
+
+
+def generate_ledger_pair(rows, duplicate_rate=0.1, shift_probabilities=SHIFT_PROBABILITIES,
+                         split_rate=0.02, noise_rate=0.02, days=365, start='2024-01-01', seed=0):
+    # Two ledgers that mirror each other: each ledger 1 credit is a ledger 2
+    # debit and vice versa, booked a few days apart, sometimes split into two
+    # lines, plus a share of rows with no counterpart at all
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(start)
+
+    day_1 = rng.integers(0, days, rows)
+    cents = _amounts(rng, rows, duplicate_rate)
+    is_credit_1 = rng.random(rows) < 0.5
+
+    shift = rng.choice(len(shift_probabilities), rows, p=np.asarray(shift_probabilities) / sum(shift_probabilities))
+    day_2 = day_1 + shift * rng.choice([-1, 1], rows)
+
+    # Split a share of the ledger 2 counterparts into two lines
+    split = rng.random(rows) < split_rate
+    first_part = (cents[split] * rng.uniform(0.2, 0.8, split.sum())).astype('int64')
+    cents_2 = cents.copy()
+    cents_2[split] = first_part
+    extra_cents = cents[split] - first_part
+
+    ledger_1 = pd.DataFrame({'day': day_1, 'cents': cents, 'is_credit': is_credit_1})
+    ledger_2 = pd.DataFrame({
+        'day': np.concatenate([day_2, day_2[split]]),
+        'cents': np.concatenate([cents_2, extra_cents]),
+        'is_credit': np.concatenate([~is_credit_1, ~is_credit_1[split]]),
+    })
+
+    frames = []
+    for ledger in (ledger_1, ledger_2):
+        noise = int(len(ledger) * noise_rate)
+        ledger = pd.concat([ledger, pd.DataFrame({
+            'day': rng.integers(0, days, noise),
+            'cents': _amounts(rng, noise, duplicate_rate),
+            'is_credit': rng.random(noise) < 0.5,
+        })], ignore_index=True)
+        ledger['day'] = ledger['day'].clip(0, days - 1)
+        frames.append(ledger.sort_values('day', kind='stable').reset_index(drop=True))
+
+    return [_to_export_columns(ledger, start, rng) for ledger in frames]
+
+
+def _to_export_columns(ledger, start, rng):
+    rows = len(ledger)
+    credit = np.where(ledger['is_credit'], ledger['cents'], 0)
+    debit = np.where(ledger['is_credit'], 0, ledger['cents'])
+    return pd.DataFrame({
+        'dis': np.asarray(DESCRIPTIONS, dtype=object)[rng.integers(0, len(DESCRIPTIONS), rows)],
+        'date': start + pd.to_timedelta(ledger['day'].to_numpy(), unit='D'),
+        'jv number': 2024000 + np.arange(rows),
+        'jv': np.asarray(JV_TYPES, dtype=object)[rng.integers(0, len(JV_TYPES), rows)],
+        'balance': np.cumsum(debit - credit),
+        'credit': credit,
+        'debit': debit,
+        'line': np.arange(1, rows + 1),
+    })
+
+
+def _format_cents(cents):
+    # "1,234.50", with negatives in accounting style like the real exports
+    text = pd.Series(np.abs(cents) / 100).map('{:,.2f}'.format)
+    return text.where(cents >= 0, '(' + text + ')')
+
+
+def write_export(ledger, file_path, chunk_size=WRITE_CHUNK_SIZE):
+    # Write the ledger in the 47-column export shape, chunk by chunk
+    with open(file_path, 'w', encoding='utf-8', newline='') as f:
+        for start in range(0, len(ledger), chunk_size):
+            chunk = ledger.iloc[start:start + chunk_size]
+            export = pd.DataFrame({i: [value] * len(chunk) for i, value in enumerate(EXPORT_TEMPLATE)})
+            values = {
+                'dis': chunk['dis'].to_numpy(),
+                'date': chunk['date'].dt.strftime('%d/%m/%Y').to_numpy(),
+                'jv number': chunk['jv number'].astype(str).to_numpy(),
+                'jv': chunk['jv'].to_numpy(),
+                'balance': _format_cents(chunk['balance'].to_numpy()).to_numpy(),
+                'credit': _format_cents(chunk['credit'].to_numpy()).to_numpy(),
+                'debit': _format_cents(chunk['debit'].to_numpy()).to_numpy(),
+                'line': chunk['line'].astype(str).to_numpy(),
+            }
+            for offset, slot in enumerate(TRANSACTION_SLOTS):
+                export[27 + offset] = values[slot]
+            export.to_csv(f, header=False, index=False)
@@ -1,22 +1,19 @@
+import logging
+
 import pandas as pd
-from datetime import timedelta
-
-def load_and_clean_data(file_path, columns, names):
-    try:
-        df = pd.read_csv(file_path, header=None, usecols=columns, names=names)
-        df['credit'] = pd.to_numeric(df['credit'].replace(',', '', regex=True), errors='coerce').fillna(0)
-        df['debit'] = pd.to_numeric(df['debit'].replace(',', '', regex=True), errors='coerce').fillna(0)
-        df['date'] = pd.to_datetime(df['date'], format='%d/%m/%Y')
-        return df
-    except Exception as e:
-        print(f"An error occurred while loading and cleaning data from {file_path}: {e}")
-        return pd.DataFrame()
+
+from double_check.config import default_path
+from double_check.daily_totals import DailyTotals
+from double_check.descriptions import DescriptionIndex, DescriptionScorer
+from double_check.instrument import Instrumentation, LoggingSink
+from double_check.matching import match_window
+from double_check.statement import load_and_clean_data, read_transactions, write_transactions
 
 def split_credit_debit(df, file_base_path):
     credit_df = df[df['credit'] != 0]
     debit_df = df[df['debit'] != 0]
-    credit_df.to_csv(f'{file_base_path}_credit.csv', index=False)
-    debit_df.to_csv(f'{file_base_path}_debit.csv', index=False)
+    write_transactions(credit_df, f'{file_base_path}_credit.csv')
+    write_transactions(debit_df, f'{file_base_path}_debit.csv')
     print(f"Saved credit transactions to {file_base_path}_credit.csv")
     print(f"Saved debit transactions to {file_base_path}_debit.csv")
 
@@ -29,131 +26,104 @@ def remove_matched_transactions(hikma_df, tawrdat_df, hikma_field, tawrdat_field
     unmatched_tawrdat = tawrdat_df.drop(matched_df['index_tawrdat'])
     return unmatched_hikma.drop(columns='index'), unmatched_tawrdat.drop(columns='index')
 
-columns = [27, 28, 29, 30, 32, 33]
-names = ['dis', 'date', 'jv number', 'jv', 'credit', 'debit']
+def load_data(file_path):
+    return read_transactions(file_path)
+
+def match_and_remove(instrumentation, transactions_1, transactions_2, days_tolerance):
+    # Pair credits in transactions_1 with debits in transactions_2 one-to-one,
+    # closest date first, within days_tolerance days; same-amount candidates
+    # equally close in date go to the most similar description
+    tie_break = DescriptionScorer(DescriptionIndex(transactions_1['dis']), DescriptionIndex(transactions_2['dis']))
+    with instrumentation.stage('window', pair=f'{transactions_1.name}/{transactions_2.name}') as record:
+        record['rows_in'] = {transactions_1.name: len(transactions_1), transactions_2.name: len(transactions_2)}
+        unmatched_1, unmatched_2, matched = match_window(
+            transactions_1, transactions_2, 'credit', 'debit', days_tolerance, tie_break
+        )
+        record['rows_out'] = {transactions_1.name: len(unmatched_1), transactions_2.name: len(unmatched_2)}
+        record['matches'] = len(matched)
+        record['rows_matched'] = 2 * len(matched)
+    return unmatched_1, unmatched_2
 
-hikma_path = '../data/source/hikma.csv'
-tawrdat_path = '../data/source/tawrdat.csv'
+def main():
+    columns = [27, 28, 29, 30, 32, 33]
+    names = ['dis', 'date', 'jv number', 'jv', 'credit', 'debit']
 
-hikma_df = load_and_clean_data(hikma_path, columns, names)
-tawrdat_df = load_and_clean_data(tawrdat_path, columns, names)
+    hikma_path = default_path('../data/source/hikma.csv')
+    tawrdat_path = default_path('../data/source/tawrdat.csv')
 
-split_credit_debit(hikma_df, '../data/cleaned/split/hikma')
-split_credit_debit(tawrdat_df, '../data/cleaned/split/tawrdat')
+    hikma_df = load_and_clean_data(hikma_path, columns, names)
+    tawrdat_df = load_and_clean_data(tawrdat_path, columns, names)
 
-hikma_credit_unmatched = pd.read_csv('../data/cleaned/split/hikma_credit.csv')
-tawrdat_debit_unmatched = pd.read_csv('../data/cleaned/split/tawrdat_debit.csv')
-hikma_debit_unmatched = pd.read_csv('../data/cleaned/split/hikma_debit.csv')
-tawrdat_credit_unmatched = pd.read_csv('../data/cleaned/split/tawrdat_credit.csv')
+    split_credit_debit(hikma_df, default_path('../data/cleaned/split/hikma'))
+    split_credit_debit(tawrdat_df, default_path('../data/cleaned/split/tawrdat'))
 
-unmatched_hikma_credit, unmatched_tawrdat_debit = remove_matched_transactions(
-    hikma_credit_unmatched, tawrdat_debit_unmatched, 'credit', 'debit'
-)
-unmatched_hikma_debit, unmatched_tawrdat_credit = remove_matched_transactions(
-    hikma_debit_unmatched, tawrdat_credit_unmatched, 'debit', 'credit'
-)
+    hikma_credit_unmatched = read_transactions(default_path('../data/cleaned/split/hikma_credit.csv'))
+    tawrdat_debit_unmatched = read_transactions(default_path('../data/cleaned/split/tawrdat_debit.csv'))
+    hikma_debit_unmatched = read_transactions(default_path('../data/cleaned/split/hikma_debit.csv'))
+    tawrdat_credit_unmatched = read_transactions(default_path('../data/cleaned/split/tawrdat_credit.csv'))
 
-unmatched_hikma_credit.to_csv('../data/cleaned/hikma_credit_final_unmatched.csv', index=False)
-unmatched_tawrdat_debit.to_csv('../data/cleaned/tawrdat_debit_final_unmatched.csv', index=False)
-unmatched_hikma_debit.to_csv('../data/cleaned/hikma_debit_final_unmatched.csv', index=False)
-unmatched_tawrdat_credit.to_csv('../data/cleaned/tawrdat_credit_final_unmatched.csv', index=False)
+    unmatched_hikma_credit, unmatched_tawrdat_debit = remove_matched_transactions(
+        hikma_credit_unmatched, tawrdat_debit_unmatched, 'credit', 'debit'
+    )
+    unmatched_hikma_debit, unmatched_tawrdat_credit = remove_matched_transactions(
+        hikma_debit_unmatched, tawrdat_credit_unmatched, 'debit', 'credit'
+    )
 
-print("Updated unmatched data files have been saved.")
+    write_transactions(unmatched_hikma_credit, default_path('../data/cleaned/hikma_credit_final_unmatched.csv'))
+    write_transactions(unmatched_tawrdat_debit, default_path('../data/cleaned/tawrdat_debit_final_unmatched.csv'))
+    write_transactions(unmatched_hikma_debit, default_path('../data/cleaned/hikma_debit_final_unmatched.csv'))
+    write_transactions(unmatched_tawrdat_credit, default_path('../data/cleaned/tawrdat_credit_final_unmatched.csv'))
 
-import pandas as pd
+    print("Updated unmatched data files have been saved.")
 
-def load_data(file_path):
-    df = pd.read_csv(file_path)
-    df['date'] = pd.to_datetime(df['date'])
-    return df
-
-def summarize_transactions(file_path):
-    df = load_data(file_path)
-    summary = df.groupby('date').agg({'credit': 'sum', 'debit': 'sum'}).reset_index()
-    return summary
-
-# Paths to the final unmatched files
-hikma_credit_final = '../data/cleaned/hikma_credit_final_unmatched.csv'
-tawrdat_debit_final = '../data/cleaned/tawrdat_debit_final_unmatched.csv'
-hikma_debit_final = '../data/cleaned/hikma_debit_final_unmatched.csv'
-tawrdat_credit_final = '../data/cleaned/tawrdat_credit_final_unmatched.csv'
-
-# Summarize each file
-hikma_credit_summary = summarize_transactions(hikma_credit_final)
-tawrdat_debit_summary = summarize_transactions(tawrdat_debit_final)
-hikma_debit_summary = summarize_transactions(hikma_debit_final)
-tawrdat_credit_summary = summarize_transactions(tawrdat_credit_final)
+    # Paths to the final unmatched files
+    hikma_credit_final = default_path('../data/cleaned/hikma_credit_final_unmatched.csv')
+    tawrdat_debit_final = default_path('../data/cleaned/tawrdat_debit_final_unmatched.csv')
+    hikma_debit_final = default_path('../data/cleaned/hikma_debit_final_unmatched.csv')
+    tawrdat_credit_final = default_path('../data/cleaned/tawrdat_credit_final_unmatched.csv')
 
-def load_data(file_path):
-    df = pd.read_csv(file_path)
-    df['date'] = pd.to_datetime(df['date'])
-    return df
-
-def match_and_remove(transactions_1, transactions_2, days_tolerance):
-    # Extend the date range for matching
-    transactions_1['date_start'] = transactions_1['date'] - timedelta(days=days_tolerance)
-    transactions_1['date_end'] = transactions_1['date'] + timedelta(days=days_tolerance)
-
-    # To store indices of matched entries
-    matched_indices_1 = set()
-    matched_indices_2 = set()
-
-    print("Starting the matching process...")
-    
-    # Iterate over each transaction in transactions_1 to find matching transactions in transactions_2
-    for idx1, row1 in transactions_1.iterrows():
-        potential_matches = transactions_2[
-            (transactions_2['date'] >= row1['date_start']) &
-            (transactions_2['date'] <= row1['date_end']) &
-            (transactions_2['debit'] == row1['credit'])  # Matching debit in transactions_2 with credit in transactions_1
-        ]
-
-        print(f"Checking transaction from {transactions_1.name} at index {idx1}:")
-        print(f"Date range: {row1['date_start'].date()} to {row1['date_end'].date()}, Amount: {row1['credit']}")
-        print(f"Found {len(potential_matches)} potential matches in {transactions_2.name}")
-
-        if not potential_matches.empty:
-            matched_indices_1.add(idx1)
-            matched_indices_2.update(potential_matches.index.tolist())
-            print(f"Matched with indices in {transactions_2.name}: {list(potential_matches.index)}")
-
-    # Remove matched transactions
-    unmatched_1 = transactions_1.drop(index=list(matched_indices_1))
-    unmatched_2 = transactions_2.drop(index=list(matched_indices_2))
-
-    print("Matching process completed. Updating unmatched files...")
-    return unmatched_1, unmatched_2
+    # Summarize each pair of files by date
+    credit_summary = DailyTotals(load_data(hikma_credit_final), load_data(tawrdat_debit_final)).summary()
+    debit_summary = DailyTotals(load_data(hikma_debit_final), load_data(tawrdat_credit_final)).summary()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    instrumentation = Instrumentation(LoggingSink())
+
+    # Load data
+    tawrdat_debit_unmatched = load_data(default_path('../data/cleaned/tawrdat_debit_final_unmatched.csv'))
+    hikma_credit_unmatched = load_data(default_path('../data/cleaned/hikma_credit_final_unmatched.csv'))
+    tawrdat_debit_unmatched.name = "Tawrdat Debit"
+    hikma_credit_unmatched.name = "Hikma Credit"
+
+    # Match and filter the data
+    unmatched_hikma_credit,unmatched_tawrdat_debit = match_and_remove(
+         instrumentation, hikma_credit_unmatched,tawrdat_debit_unmatched, days_tolerance=2
+    )
 
-# Load data
-tawrdat_debit_unmatched = load_data('../data/cleaned/tawrdat_debit_final_unmatched.csv')
-hikma_credit_unmatched = load_data('../data/cleaned/hikma_credit_final_unmatched.csv')
-tawrdat_debit_unmatched.name = "Tawrdat Debit"
-hikma_credit_unmatched.name = "Hikma Credit"
+    # Save the unmatched data back to CSV files
+    write_transactions(unmatched_tawrdat_debit, default_path('../data/cleaned/final/tawrdat_debit_filtered.csv'))
+    write_transactions(unmatched_hikma_credit, default_path('../data/cleaned/final/hikma_credit_filtered.csv'))
 
-# Match and filter the data
-unmatched_hikma_credit,unmatched_tawrdat_debit = match_and_remove(
-     hikma_credit_unmatched,tawrdat_debit_unmatched, days_tolerance=2
-)
+    print("Filtered unmatched files saved.1")
 
-# Save the unmatched data back to CSV files
-unmatched_tawrdat_debit.to_csv('../data/cleaned/final/tawrdat_debit_filtered.csv', index=False)
-unmatched_hikma_credit.to_csv('../data/cleaned/final/hikma_credit_filtered.csv', index=False)
+    # Load data
+    hikma_debit_unmatched = load_data(default_path('../data/cleaned/hikma_debit_final_unmatched.csv'))
+    tawrdat_credit_unmatched = load_data(default_path('../data/cleaned/tawrdat_credit_final_unmatched.csv'))
+    hikma_debit_unmatched.name = "Hikma Debit"
+    tawrdat_credit_unmatched.name = "Tawrdat Credit"
 
-print("Filtered unmatched files saved.1")
+    # Match and filter the data
+    unmatched_tawrdat_credit ,unmatched_hikma_debit= match_and_remove(
+         instrumentation, tawrdat_credit_unmatched, hikma_debit_unmatched, days_tolerance=2
+    )
 
-# Load data
-hikma_debit_unmatched = load_data('../data/cleaned/hikma_debit_final_unmatched.csv')
-tawrdat_credit_unmatched = load_data('../data/cleaned/tawrdat_credit_final_unmatched.csv')
-hikma_debit_unmatched.name = "Hikma Debit"
-tawrdat_credit_unmatched.name = "Tawrdat Credit"
+    # Save the unmatched data back to CSV files
+    write_transactions(unmatched_tawrdat_credit, default_path('../data/cleaned/final/tawrdat_credit_filtered.csv'))
+    write_transactions(unmatched_hikma_debit, default_path('../data/cleaned/final/hikma_debit_filtered.csv'))
 
-# Match and filter the data
-unmatched_tawrdat_credit ,unmatched_hikma_debit= match_and_remove(
-     tawrdat_credit_unmatched, hikma_debit_unmatched, days_tolerance=2
-)
+    print("Filtered unmatched files saved.2")
 
-# Save the unmatched data back to CSV files
-unmatched_tawrdat_credit.to_csv('../data/cleaned/final/tawrdat_credit_filtered.csv', index=False)
-unmatched_hikma_debit.to_csv('../data/cleaned/final/hikma_debit_filtered.csv', index=False)
+    instrumentation.close()
 
-print("Filtered unmatched files saved.2")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The double_check package lives in scripts/; make it importable without
+# installing it
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
@@ -0,0 +1,84 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from double_check.assignment import MAX_EXACT_EDGES, _min_cost_matching, match_optimal, optimal_pairs
+
+
+def same_amount_rows(rows, field, days, seed):
+    # rows with one amount, spread over days days
+    offsets = np.random.default_rng(seed).integers(0, days, rows)
+    return pd.DataFrame({
+        'date': pd.Timestamp('2024-03-01') + pd.to_timedelta(offsets, 'D'),
+        field: np.full(rows, 50000, dtype='int64'),
+    })
+
+
+def brute_force(size_1, left, right, cost):
+    # (rows paired, total cost) of the best matching, over every matching
+    edges = {}
+    for u, v, c in zip(left.tolist(), right.tolist(), cost.tolist()):
+        edges.setdefault(u, []).append((v, c))
+
+    def best(u, used):
+        if u == size_1:
+            return 0, 0
+        pairs, total = best(u + 1, used)
+        found = (-pairs, total)
+        for v, c in edges.get(u, []):
+            if v not in used:
+                pairs, total = best(u + 1, used | {v})
+                found = min(found, (-(pairs + 1), total + c))
+        return -found[0], found[1]
+
+    return best(0, frozenset())
+
+
+class OptimalPairsTest(unittest.TestCase):
+    def test_least_total_cost(self):
+        # As many pairs as any matching, and among those the cheapest
+        rng = np.random.default_rng(5)
+        for _ in range(200):
+            size_1, size_2 = rng.integers(1, 7, 2)
+            pairs = pd.DataFrame({
+                'left': rng.integers(0, size_1, 15), 'right': rng.integers(0, size_2, 15),
+            }).drop_duplicates()
+            left, right = pairs['left'].to_numpy(), pairs['right'].to_numpy()
+            cost = rng.integers(0, 10, len(left))
+            matching = _min_cost_matching(size_1, size_2, left, right, cost)
+            edge_cost = dict(zip(zip(left.tolist(), right.tolist()), cost.tolist()))
+            self.assertEqual(len({u for u, _ in matching}), len({v for _, v in matching}))
+            self.assertEqual(len({u for u, _ in matching}), len(matching))
+            found = (len(matching), sum(edge_cost[u, v] for u, v in matching))
+            self.assertEqual(found, brute_force(size_1, left, right, cost))
+
+    def test_fallback_still_pairs_as_many_rows(self):
+        rng = np.random.default_rng(1)
+        for _ in range(200):
+            size_1, size_2 = rng.integers(1, 15, 2)
+            pairs = pd.DataFrame({
+                'left': rng.integers(0, size_1, 60), 'right': rng.integers(0, size_2, 60),
+            }).drop_duplicates()
+            left, right = pairs['left'].to_numpy(), pairs['right'].to_numpy()
+            cost = rng.integers(0, 5, len(left))
+            pos_1, pos_2, fallback = optimal_pairs(left, right, cost, np.zeros(size_1, dtype='int64'), 0)
+            self.assertEqual(len(pos_1), len(_min_cost_matching(size_1, size_2, left, right, cost)))
+            self.assertEqual(len(set(pos_1.tolist())), len(pos_1))
+            self.assertEqual(len(set(pos_2.tolist())), len(pos_2))
+            self.assertTrue(set(zip(pos_1.tolist(), pos_2.tolist())) <= set(zip(left.tolist(), right.tolist())))
+            self.assertEqual(fallback['components'], int(len(left) > 1))
+
+    def test_large_component_falls_back(self):
+        # Its run time is measured by bench.py's dense_optimal stage
+        credit = same_amount_rows(1000, 'credit', 30, seed=2)
+        debit = same_amount_rows(1100, 'debit', 30, seed=3)
+        _, _, matched = match_optimal(credit, debit, 'credit', 'debit', 4)
+        self.assertGreater(matched.attrs['candidates'], MAX_EXACT_EDGES)
+        self.assertEqual(matched.attrs['fallback_components'], 1)
+        self.assertEqual(matched.attrs['fallback_rows'], 2100)
+        self.assertGreaterEqual(matched.attrs['gain_over_greedy'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+import pandas as pd
+
+from double_check.daily_totals import DailyTotals
+from double_check.divergence import divergence_windows, net_flow_profile
+from double_check.instrument import Instrumentation
+from double_check.pipeline import ReconciliationPipeline, divergence_stage
+
+
+def rows(dates, field, amounts):
+    return pd.DataFrame({
+        'date': pd.to_datetime(dates),
+        'credit': amounts if field == 'credit' else [0] * len(amounts),
+        'debit': amounts if field == 'debit' else [0] * len(amounts),
+    })
+
+
+class DivergenceStageTest(unittest.TestCase):
+    def setUp(self):
+        # 01/03 and 20/03 agree day by day; 10/03 and 12/03 do not
+        self.credit = rows(['2024-03-01', '2024-03-10', '2024-03-20'], 'credit', [100, 250, 300])
+        self.debit = rows(['2024-03-01', '2024-03-12', '2024-03-20'], 'debit', [100, 250, 300])
+
+    def test_pairs_nothing_and_reports_windows(self):
+        credit_left, debit_left, matched = divergence_stage(self.credit, self.debit, 4)
+        self.assertEqual(len(matched), 0)
+        self.assertEqual(matched.attrs, {'windows': 1, 'moved_dates': 2})
+        self.assertEqual(credit_left.index.tolist(), [1])
+        self.assertEqual(debit_left.index.tolist(), [1])
+
+    def test_windows_follow_the_cumulative_profile(self):
+        totals = DailyTotals(self.credit, self.debit)
+        profile = net_flow_profile(totals)
+        self.assertEqual(profile['divergence_1'].tolist(), [0, 250, 0, 0])
+        windows = divergence_windows(totals, 1)
+        self.assertEqual(windows['start'].tolist(), [pd.Timestamp('2024-03-09')])
+        self.assertEqual(windows['end'].tolist(), [pd.Timestamp('2024-03-13')])
+
+    def test_offsetting_differences_form_one_window(self):
+        # Ledger 1 books 250 on 31/03, ledger 2 on 02/04: the divergence
+        # leaves zero and comes back, with nothing moving on 01/04
+        credit = rows(['2024-03-20', '2024-03-31', '2024-04-01'], 'credit', [100, 250, 300])
+        debit = rows(['2024-03-20', '2024-04-01', '2024-04-02'], 'debit', [100, 300, 250])
+        windows = divergence_windows(DailyTotals(credit, debit), 2)
+        self.assertEqual(windows.to_dict('list'), {
+            'start': [pd.Timestamp('2024-03-29')], 'end': [pd.Timestamp('2024-04-04')],
+            'moved_dates': [2], 'converged': [True],
+        })
+
+    def test_unmatched_row_settles(self):
+        # 10/03 never offsets: its window closes after days_tolerance days
+        # and 20/03, which reconciles, stays outside
+        credit = rows(['2024-03-10', '2024-03-20'], 'credit', [250, 300])
+        debit = rows(['2024-03-20'], 'debit', [300])
+        windows = divergence_windows(DailyTotals(credit, debit), 2)
+        self.assertEqual(windows.to_dict('list'), {
+            'start': [pd.Timestamp('2024-03-08')], 'end': [pd.Timestamp('2024-03-12')],
+            'moved_dates': [1], 'converged': [False],
+        })
+
+    def test_dropped_rows_are_not_matches(self):
+        instrumentation = Instrumentation()
+        ReconciliationPipeline(('a', 'b'), days_tolerance=4, instrumentation=instrumentation,
+                               prefilter=True).run(self.credit, self.debit)
+        divergence = [record for record in instrumentation.records if record['stage'] == 'divergence'][0]
+        self.assertEqual((divergence['matches'], divergence['match_rate'], divergence['rows_dropped']), (0, 0, 4))
+        window = [record for record in instrumentation.records if record['stage'] == 'window'][0]
+        self.assertEqual((window['match_rate'], window['rows_dropped']), (1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
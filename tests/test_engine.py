@@ -0,0 +1,64 @@
+import importlib.util
+import logging
+import os
+import tempfile
+import unittest
+
+from double_check.commands import pipeline_options
+from double_check.config import DEFAULT_CONFIG, load_config
+from double_check.engine import check_parity, get_engine
+from double_check.synthetic import generate_ledger_pair, write_export
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'source')
+
+
+@unittest.skipUnless(importlib.util.find_spec('polars'), 'polars is not installed')
+class EngineParityTest(unittest.TestCase):
+    # The polars engine must leave exactly the pandas engine's unmatched rows
+    @classmethod
+    def setUpClass(cls):
+        cls.workdir = tempfile.TemporaryDirectory()
+        ledger_1, ledger_2 = generate_ledger_pair(10_000, seed=7)
+        cls.paths = [os.path.join(cls.workdir.name, f'ledger_{i}.csv') for i in (1, 2)]
+        write_export(ledger_1, cls.paths[0])
+        write_export(ledger_2, cls.paths[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.workdir.cleanup()
+
+    def test_polars_plan(self):
+        check_parity(*self.paths, names=('ledger_1', 'ledger_2'))
+
+    def test_default_config(self):
+        # Contras, the divergence prefilter and descriptions run in pandas,
+        # the exact join still in Polars
+        options = pipeline_options(DEFAULT_CONFIG)
+        check_parity(*self.paths, names=('ledger_1', 'ledger_2'), **options)
+
+        engine = get_engine('polars', names=('ledger_1', 'ledger_2'), **options)
+        self.assertEqual(engine.pandas_only_options(), [])
+        engine.reconcile(*self.paths)
+        exact = [matched for (stage, *_), matched in engine.matches.items() if stage == 'exact']
+        self.assertEqual(len(exact), 2)
+        for matched in exact:
+            self.assertGreater(matched.attrs['polars_pairs'], 0)
+            self.assertGreater(len(matched), matched.attrs['polars_pairs'])
+
+    def test_percent_tolerance_falls_back_to_pandas(self):
+        # Only amount_tolerance_percent set: validated, then run in pandas
+        config = load_config(engine='polars', prefilter=False, descriptions=False, amount_tolerance_percent=0.5)
+        config['contra_days'] = None
+        self.assertEqual(get_engine('polars', **pipeline_options(config)).pandas_only_options(),
+                         ['amount_tolerance'])
+        with self.assertLogs('double_check', logging.WARNING):
+            check_parity(*self.paths, names=('ledger_1', 'ledger_2'), **pipeline_options(config))
+
+    def test_source_statements(self):
+        paths = os.path.join(SOURCE_DIR, 'hikma.csv'), os.path.join(SOURCE_DIR, 'tawrdat.csv')
+        check_parity(*paths)
+        check_parity(*paths, **pipeline_options(DEFAULT_CONFIG))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import os
+import unittest
+
+import pandas as pd
+
+from double_check.ingest import MIN_POOL_FILES, ingest
+from double_check.statement import load_statement
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'source')
+SOURCES = [os.path.join(SOURCE_DIR, name) for name in ('hikma.csv', 'tawrdat.csv')]
+
+
+class IngestTest(unittest.TestCase):
+    def check(self, file_paths, **options):
+        ingested = list(ingest(file_paths, **options))
+        self.assertEqual([file_path for file_path, _, _ in ingested], file_paths)
+        for file_path, header, df in ingested:
+            expected_header, expected = load_statement(file_path)
+            self.assertEqual(header, expected_header)
+            pd.testing.assert_frame_equal(df, expected)
+
+    def test_few_files_in_process(self):
+        self.check(SOURCES)
+
+    def test_pool_keeps_the_order(self):
+        file_paths = (SOURCES * MIN_POOL_FILES)[:MIN_POOL_FILES + 1]
+        self.check(file_paths, parse_workers=2, max_in_flight=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
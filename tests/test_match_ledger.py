@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from double_check.match_ledger import MatchLedger
+from double_check.open_items import CARRY_STAGE, OpenItems
+
+
+def rows(field, amounts, dates, jv_numbers, index=None):
+    return pd.DataFrame({
+        'date': pd.to_datetime(dates),
+        'jv number': pd.Series(jv_numbers, index=index, dtype='category'),
+        'credit': amounts if field == 'credit' else [0] * len(amounts),
+        'debit': amounts if field == 'debit' else [0] * len(amounts),
+    }, index=index)
+
+
+class MatchLedgerTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def test_save_creates_the_directory_and_replaces_the_file(self):
+        ledger = MatchLedger()
+        credit = rows('credit', [5000], ['2024-03-01'], ['2024654'])
+        debit = rows('debit', [5000], ['2024-03-02'], ['2024700'])
+        ledger.record('window', ('hikma', 'tawrdat'), credit, debit, pd.DataFrame({'index_1': [0], 'index_2': [0]}))
+        file_path = os.path.join(self.workdir.name, 'reports', 'match_ledger.npz')
+        ledger.save(file_path)
+        ledger.save(file_path)
+        self.assertEqual(os.listdir(os.path.dirname(file_path)), ['match_ledger.npz'])
+        self.assertEqual(len(MatchLedger.load(file_path)), 1)
+
+    def test_carried_pairs_are_recorded(self):
+        # tawrdat left a 50.00 debit open in March; hikma's April credit
+        # settles it
+        open_items = OpenItems(os.path.join(self.workdir.name, 'open_items.npz'))
+        open_items.add({'tawrdat_debit': rows('debit', [5000], ['2024-03-31'], ['2024800'], index=[41])}, '2024-03')
+        ledger = MatchLedger()
+        results = {'hikma_credit': rows('credit', [5000, 7000], ['2024-04-02', '2024-04-03'], ['2024654', '2024655'])}
+        results, carried = open_items.carry(results, '2024-04', '2024-04-30', 4, ledger)
+        self.assertEqual(len(carried), 1)
+        self.assertEqual(results['hikma_credit'].index.tolist(), [1])
+
+        found = ledger.find_jv_number('2024654')
+        self.assertEqual(found['stage'].tolist(), [CARRY_STAGE])
+        self.assertEqual(found['ledger_2'].tolist(), ['tawrdat 2024-03'])
+        self.assertEqual(found['row_2'].tolist(), [41])
+        self.assertEqual(found['gap_days'].tolist(), [-2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import itertools
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from double_check.matching import (
+    AmountTolerance, _find_split, _greedy_pairs, _window_costs, match_subset_sum, match_window,
+)
+
+
+def sequential_greedy(pos_1, pos_2, cost):
+    # The row-by-row scan _greedy_pairs must reproduce
+    used_1, used_2, pairs = set(), set(), []
+    for i in np.lexsort((pos_2, pos_1, cost)):
+        if pos_1[i] in used_1 or pos_2[i] in used_2:
+            continue
+        used_1.add(pos_1[i])
+        used_2.add(pos_2[i])
+        pairs.append((pos_1[i], pos_2[i]))
+    return sorted(pairs)
+
+
+def dense_bucket(rows, days_tolerance=10, seed=0):
+    # Every row shares one amount and falls inside one window, so each row is
+    # a candidate of every row on the other side
+    days = np.random.default_rng(seed).integers(0, days_tolerance, rows)
+    pos_1 = np.repeat(np.arange(rows), rows)
+    pos_2 = np.tile(np.arange(rows), rows)
+    return pos_1, pos_2, np.abs(days[pos_1] - days[pos_2])
+
+
+class GreedyPairsTest(unittest.TestCase):
+    def test_matches_sequential_scan(self):
+        rng = np.random.default_rng(0)
+        for _ in range(300):
+            size = rng.integers(0, 60)
+            pos_1, pos_2, cost = rng.integers(0, 20, size), rng.integers(0, 20, size), rng.integers(0, 5, size)
+            taken_1, taken_2 = _greedy_pairs(pos_1, pos_2, cost)
+            self.assertEqual(sorted(zip(taken_1, taken_2)), sequential_greedy(pos_1, pos_2, cost))
+
+    def test_dense_bucket(self):
+        # One pair per row, as the scan finds; how the time per candidate
+        # scales with the bucket is measured by bench.py's dense_window stage
+        pos_1, pos_2, cost = dense_bucket(300)
+        taken_1, taken_2 = _greedy_pairs(pos_1, pos_2, cost)
+        self.assertEqual(len(taken_1), 300)
+        self.assertEqual(sorted(zip(taken_1, taken_2)), sequential_greedy(pos_1, pos_2, cost))
+
+
+class WindowCandidatesTest(unittest.TestCase):
+    def test_only_pairs_inside_the_window(self):
+        # The sorted-window join emits exactly the same-amount pairs at most
+        # days_tolerance days apart, not a cross join of the amount buckets
+        rng = np.random.default_rng(6)
+        frames = [
+            pd.DataFrame({
+                'date': pd.Timestamp('2024-03-01') + pd.to_timedelta(rng.integers(0, 60, 400), 'D'),
+                field: rng.choice([5000, 7000, 9000], 400),
+            })
+            for field in ('credit', 'debit')
+        ]
+        cand_1, cand_2, _ = _window_costs(*frames, 'credit', 'debit', 4)
+        days = [frame['date'].to_numpy().astype('datetime64[D]').astype('int64') for frame in frames]
+        expected = (
+            (np.abs(days[0][:, None] - days[1][None, :]) <= 4)
+            & (frames[0]['credit'].to_numpy()[:, None] == frames[1]['debit'].to_numpy()[None, :])
+        )
+        self.assertEqual(sorted(zip(cand_1.tolist(), cand_2.tolist())), list(zip(*np.nonzero(expected))))
+
+
+class AmountToleranceTest(unittest.TestCase):
+    def test_symmetric_in_the_two_sides(self):
+        # 100.00 apart: more than 1% of 9,950.00 but within 1% of 10,050.00,
+        # so the pair matches whichever ledger comes first
+        tolerance = AmountTolerance(percent=1)
+        credit = pd.DataFrame({'date': pd.to_datetime(['2024-03-01']), 'credit': [995000]})
+        debit = pd.DataFrame({'date': pd.to_datetime(['2024-03-01']), 'debit': [1005000]})
+        for args in [(credit, debit, 'credit', 'debit'), (debit, credit, 'debit', 'credit')]:
+            _, _, matched = match_window(*args, 0, amount_tolerance=tolerance)
+            self.assertEqual(len(matched), 1)
+
+
+class SubsetSumTest(unittest.TestCase):
+    def test_find_split_takes_the_fewest_parts(self):
+        # Against every combination of 2..max_parts candidates
+        rng = np.random.default_rng(4)
+        for _ in range(300):
+            amounts = rng.integers(1, 30, rng.integers(2, 11))
+            target = int(rng.integers(2, 60))
+            parts = _find_split(target, amounts, 3)
+            fewest = next((
+                size for size in (2, 3)
+                if any(sum(combination) == target for combination in itertools.combinations(amounts.tolist(), size))
+            ), None)
+            if fewest is None:
+                self.assertIsNone(parts)
+                continue
+            self.assertEqual(len(parts), fewest)
+            self.assertEqual(len(set(parts)), len(parts))
+            self.assertEqual(amounts[list(parts)].sum(), target)
+
+    def test_split_payment_inside_the_window(self):
+        # 100.00 paid as 60.00 + 40.00; the 40.00 outside the window and the
+        # rows already used by the first group are not candidates
+        credit = pd.DataFrame({'date': pd.to_datetime(['2024-03-10', '2024-03-11']), 'credit': [10000, 10000]})
+        debit = pd.DataFrame({
+            'date': pd.to_datetime(['2024-03-09', '2024-03-11', '2024-03-20', '2024-03-12']),
+            'debit': [6000, 4000, 4000, 6000],
+        })
+        credit_left, debit_left, matched = match_subset_sum(credit, debit, 'credit', 'debit', 2)
+        self.assertEqual(matched[['group', 'index_1', 'index_2']].values.tolist(), [[0, 0, 0], [0, 0, 1]])
+        self.assertEqual(credit_left.index.tolist(), [1])
+        self.assertEqual(debit_left.index.tolist(), [2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
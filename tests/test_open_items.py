@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from double_check.open_items import NOT_SETTLED, OpenItems
+
+
+def rows(field, amounts, dates):
+    return pd.DataFrame({
+        'date': pd.to_datetime(dates),
+        'jv number': pd.Series([str(2024600 + i) for i in range(len(amounts))], dtype='category'),
+        'credit': amounts if field == 'credit' else [0] * len(amounts),
+        'debit': amounts if field == 'debit' else [0] * len(amounts),
+    })
+
+
+class OpenItemsTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.state_path = os.path.join(self.workdir.name, 'state', 'open_items.npz')
+        # March left two tawrdat debits and a hikma debit open
+        self.march = {
+            'tawrdat_debit': rows('debit', [5000, 5000], ['2024-03-27', '2024-03-30']),
+            'hikma_debit': rows('debit', [7000], ['2024-03-31']),
+        }
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def open_items(self):
+        open_items = OpenItems(self.state_path)
+        open_items.add(self.march, '2024-03')
+        return open_items
+
+    def test_settle_closest_date_of_the_counterpart_side(self):
+        april = {
+            'hikma_credit': rows('credit', [5000, 7000], ['2024-04-01', '2024-04-02']),
+            'tawrdat_credit': rows('credit', [7000], ['2024-04-20']),
+        }
+        open_items = self.open_items()
+        results, matches = open_items.settle(april, '2024-04', 4)
+        # 30/03 is closer than 27/03; hikma's 70.00 credit has no open
+        # tawrdat debit, and tawrdat's is too late for hikma's open debit
+        self.assertEqual(matches[['side', 'row', 'item_side', 'item_row', 'gap_days']].values.tolist(),
+                         [['hikma_credit', 0, 'tawrdat_debit', 1, -2]])
+        self.assertEqual(results['hikma_credit'].index.tolist(), [1])
+        self.assertEqual(results['tawrdat_credit'].index.tolist(), [0])
+        self.assertEqual(open_items.items['settled'].tolist(), [NOT_SETTLED, '2024-04', NOT_SETTLED])
+
+    def test_rerunning_a_period_does_not_double_count(self):
+        april = {'hikma_credit': rows('credit', [5000, 9000], ['2024-04-01', '2024-04-02'])}
+        self.open_items().carry(april, '2024-04', '2024-04-30', 4)
+        first = OpenItems(self.state_path).items
+        open_items = OpenItems(self.state_path)
+        results, matches = open_items.carry(april, '2024-04', '2024-04-30', 4)
+        self.assertEqual(len(matches), 1)
+        self.assertEqual(results['hikma_credit'].index.tolist(), [1])
+        pd.testing.assert_frame_equal(open_items.items, first)
+        self.assertEqual(open_items.periods(), ['2024-03', '2024-04'])
+
+    def test_age_out(self):
+        open_items = self.open_items()
+        open_items.horizon_days = 2
+        aged = open_items.age_out('2024-03-31')
+        self.assertEqual(aged['date'].tolist(), [pd.Timestamp('2024-03-27')])
+        self.assertEqual(open_items.items['date'].tolist(), [pd.Timestamp('2024-03-30'), pd.Timestamp('2024-03-31')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from double_check.incremental import IncrementalReconciliation
+from double_check.matching import match_exact, match_window
+from double_check.partition import match_exact_partitioned, match_window_partitioned
+from double_check.pipeline import ReconciliationPipeline, cancel_contras, split_credit_debit
+from double_check.synthetic import generate_ledger_pair
+
+
+def pairs(matched):
+    return sorted(zip(matched['index_1'].tolist(), matched['index_2'].tolist()))
+
+
+class PartitionedMatchingTest(unittest.TestCase):
+    # Matching per date partition must pair exactly what one pass pairs
+    def setUp(self):
+        ledger_1, ledger_2 = generate_ledger_pair(3000, duplicate_rate=0.3, seed=5)
+        self.credit, _ = split_credit_debit(ledger_1)
+        _, self.debit = split_credit_debit(ledger_2)
+
+    def test_exact(self):
+        expected = match_exact(self.credit, self.debit, 'credit', 'debit')
+        for max_workers in (1, 2):
+            found = match_exact_partitioned(self.credit, self.debit, 'credit', 'debit', partitions=6,
+                                            max_workers=max_workers)
+            self.assertEqual(pairs(found[2]), pairs(expected[2]))
+            self.assertEqual(found[0].index.tolist(), expected[0].index.tolist())
+            self.assertEqual(found[1].index.tolist(), expected[1].index.tolist())
+
+    def test_window(self):
+        expected = match_window(self.credit, self.debit, 'credit', 'debit', 4)
+        self.assertGreater(len(expected[2]), 0)
+        for max_workers in (1, 2):
+            found = match_window_partitioned(self.credit, self.debit, 'credit', 'debit', 4, partitions=6,
+                                             max_workers=max_workers)
+            self.assertEqual(pairs(found[2]), pairs(expected[2]))
+            self.assertEqual(found[0].index.tolist(), expected[0].index.tolist())
+            self.assertEqual(found[1].index.tolist(), expected[1].index.tolist())
+
+
+class ContraTest(unittest.TestCase):
+    def ledger(self, dates, credits, debits):
+        return pd.DataFrame({
+            'date': pd.to_datetime(dates), 'jv number': pd.Series(range(len(dates)), dtype='category'),
+            'credit': credits, 'debit': debits,
+        })
+
+    def test_cancel_contras(self):
+        # A payment reversed two days later, and one reversed too late
+        ledger = self.ledger(['2024-03-01', '2024-03-03', '2024-03-05', '2024-03-15'],
+                             [5000, 0, 7000, 0], [0, 5000, 0, 7000])
+        credit, debit = split_credit_debit(ledger)
+        credit_left, debit_left, matched = cancel_contras(credit, debit, 4)
+        self.assertEqual(pairs(matched), [(0, 1)])
+        self.assertEqual(credit_left.index.tolist(), [2])
+        self.assertEqual(debit_left.index.tolist(), [3])
+
+    def test_contras_never_reach_the_other_ledger(self):
+        # Without contra_days, ledger a's reversal pairs with ledger b's row
+        ledger_a = self.ledger(['2024-03-01', '2024-03-02'], [5000, 0], [0, 5000])
+        ledger_b = self.ledger(['2024-03-01'], [0], [5000])
+        pipeline = ReconciliationPipeline(('a', 'b'), days_tolerance=4, contra_days=4)
+        results = pipeline.run(ledger_a, ledger_b)
+        self.assertEqual(pairs(pipeline.matches[('contra', 'a_credit', 'a_debit')]), [(0, 1)])
+        self.assertEqual(results['b_debit'].index.tolist(), [0])
+        results = ReconciliationPipeline(('a', 'b'), days_tolerance=4).run(ledger_a, ledger_b)
+        self.assertEqual(results['b_debit'].index.tolist(), [])
+
+
+class IncrementalTest(unittest.TestCase):
+    # Appending to the exports and updating must leave what a rebuild from
+    # an empty state leaves
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.ledger_1, self.ledger_2 = generate_ledger_pair(4000, duplicate_rate=0.3, seed=8)
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def reconcile(self, name, ledger_1, ledger_2):
+        results = IncrementalReconciliation(os.path.join(self.workdir.name, name)).update(ledger_1, ledger_2)
+        return {side: df.index.tolist() for side, df in results.items()}
+
+    def test_appended_rows(self):
+        for share in (0.5, 0.9):
+            state = f'{share}.npz'
+            self.reconcile(state, self.ledger_1.iloc[:int(share * len(self.ledger_1))],
+                           self.ledger_2.iloc[:int(share * len(self.ledger_2))])
+            self.assertEqual(self.reconcile(state, self.ledger_1, self.ledger_2),
+                             self.reconcile(f'full_{share}.npz', self.ledger_1, self.ledger_2))
+
+    def test_edited_rows_rebuild(self):
+        self.reconcile('state.npz', self.ledger_1, self.ledger_2)
+        edited = self.ledger_1.copy()
+        edited.loc[10, ['credit', 'debit']] = [123456, 0]
+        self.assertEqual(self.reconcile('state.npz', edited, self.ledger_2),
+                         self.reconcile('full.npz', edited, self.ledger_2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+import pandas as pd
+
+from double_check.pipeline import ReconciliationPipeline
+from double_check.references import match_references, normalize_reference
+
+
+def rows(field, references, jv_types, amounts, dates, jv_numbers=None):
+    return pd.DataFrame({
+        'date': pd.to_datetime(dates),
+        'jv number': pd.Series(jv_numbers or [None] * len(amounts), dtype='category'),
+        'jv': pd.Series(jv_types, dtype='category'),
+        'ref': references,
+        'credit': amounts if field == 'credit' else [0] * len(amounts),
+        'debit': amounts if field == 'debit' else [0] * len(amounts),
+    })
+
+
+class MatchReferencesTest(unittest.TestCase):
+    def test_normalize_reference(self):
+        self.assertEqual(normalize_reference(' ref-00840 '), 'REF840')
+        self.assertEqual(normalize_reference('REF ٨٤٠'), 'REF840')
+        self.assertIsNone(normalize_reference('Payments'))
+
+    def test_pairs_on_reference_and_amount(self):
+        credit = rows('credit', ['INV-0017', 'INV-300'], ['Payments', 'Payments'], [5000, 7000],
+                      ['2024-03-01', '2024-03-01'])
+        debit = rows('debit', ['inv 17', 'INV-300'], ['Payments', 'Payments'], [5000, 7100],
+                     ['2024-03-03', '2024-03-01'])
+        _, _, matched = match_references(credit, debit, 'credit', 'debit', 4, ['ref'])
+        # The second reference is shared but the amounts differ
+        self.assertEqual(list(zip(matched['index_1'], matched['index_2'])), [(0, 0)])
+
+    def test_only_configured_columns_are_keys(self):
+        credit = rows('credit', [None], ['G.Ledger 7'], [5000], ['2024-03-01'], ['2024654'])
+        debit = rows('debit', [None], ['G.Ledger 7'], [5000], ['2024-03-01'], ['2024654'])
+        _, _, matched = match_references(credit, debit, 'credit', 'debit', 4, ['ref'])
+        self.assertEqual(len(matched), 0)
+
+
+class ReferenceStageTest(unittest.TestCase):
+    # Ledger 'a' pays 50.00 on 01/03 as JV 2024654. Ledger 'b' books 50.00
+    # on 02/03 and, unrelated, on 04/03 under its own JV 2024654.
+    def ledgers(self):
+        ledger_a = rows('credit', ['INV-9'], ['Payments'], [5000], ['2024-03-01'], ['2024654'])
+        ledger_b = rows('debit', [None, 'INV-9'], ['Receipts', 'Receipts'], [5000, 5000],
+                        ['2024-03-02', '2024-03-04'], ['2024700', '2024654'])
+        return ledger_a, ledger_b
+
+    def test_shared_jv_number_leaves_the_closest_date_to_the_window(self):
+        pipeline = ReconciliationPipeline(('a', 'b'), days_tolerance=4, assignment='optimal')
+        self.assertNotIn('reference', pipeline.stages())
+        pipeline.run(*self.ledgers())
+        matched = pipeline.matches[('window', 'a_credit', 'b_debit')]
+        self.assertEqual(list(zip(matched['index_1'], matched['index_2'])), [(0, 0)])
+
+    def test_configured_reference_pairs_first(self):
+        pipeline = ReconciliationPipeline(('a', 'b'), days_tolerance=4, references=['ref'])
+        self.assertEqual(list(pipeline.stages())[:2], ['exact', 'reference'])
+        pipeline.run(*self.ledgers())
+        matched = pipeline.matches[('reference', 'a_credit', 'b_debit')]
+        self.assertEqual(list(zip(matched['index_1'], matched['index_2'])), [(0, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,17 @@
+import unittest
+
+import pandas as pd
+
+from double_check.statement import apply_schema
+
+
+class ApplySchemaTest(unittest.TestCase):
+    def test_jv_numbers_are_kept_as_text(self):
+        df = apply_schema(pd.DataFrame({'jv number': ['2024226', ' JV-17A ', '98765432109', '', None]}))
+        self.assertIsInstance(df['jv number'].dtype, pd.CategoricalDtype)
+        self.assertEqual(df['jv number'].tolist()[:3], ['2024226', 'JV-17A', '98765432109'])
+        self.assertEqual(df['jv number'].isna().tolist(), [False, False, False, True, True])
+
+
+if __name__ == '__main__':
+    unittest.main()